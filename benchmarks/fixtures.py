@@ -0,0 +1,169 @@
+"""
+Fixtures for the benchmarks: the responses recorded in the tests cassettes,
+and synthetic responses of configurable size.
+"""
+import datetime as dt
+import gzip
+import json
+import os
+import numpy as np
+import yaml
+
+CASSETTES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'cassettes')
+
+
+def cassetteResponses(cassetteName):
+    """
+    Returns a dictionary with the uris and decoded responses bodies of a
+    recorded cassette of the tests.
+    """
+    with open(os.path.join(CASSETTES_DIR, cassetteName + '.yaml')) as f:
+        cassette = yaml.safe_load(f)
+    responses = {}
+    for interaction in cassette['interactions']:
+        body = interaction['response']['body']['string']
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        if 'gzip' in interaction['response']['headers'].get('Content-Encoding', []):
+            body = gzip.decompress(body)
+        responses[interaction['request']['uri']] = body.decode('utf-8')
+    return responses
+
+
+def cassetteResponse(cassetteName, uriContains):
+    """
+    Returns the first response of a cassette whose uri contains the string.
+    """
+    for uri, body in cassetteResponses(cassetteName).items():
+        if uriContains in uri:
+            return body
+    raise Exception("No response in cassette {} for {}".format(cassetteName, uriContains))
+
+
+def syntheticInfo(dimensions={}, nVariables=100, nAttributes=20):
+    """
+    Returns a info/index.json response dictionary, of a griddap dataset if
+    dimensions (dictionary of names and sizes) are given, otherwise of a tabledap
+    dataset with a time variable.
+    """
+    rows = [ ['attribute', 'NC_GLOBAL', 'title', 'String', 'Synthetic dataset'],
+             ['attribute', 'NC_GLOBAL', 'date_created', 'String', '2021-01-01T00:00:00Z'],
+             ['attribute', 'NC_GLOBAL', 'Westernmost_Easting', 'double', '-180.0'] ]
+    for dimName, size in dimensions.items():
+        rows.append(['dimension', dimName, '', 'double', 'nValues={}, evenlySpaced=true, averageSpacing=1.0'.format(size)])
+        if dimName == 'time':
+            rows.append(['attribute', dimName, 'actual_range', 'double', '0.0, {:.1f}'.format((size - 1) * 86400.0)])
+            rows.append(['attribute', dimName, 'units', 'String', 'seconds since 1970-01-01T00:00:00Z'])
+            rows.append(['attribute', dimName, '_CoordinateAxisType', 'String', 'Time'])
+        else:
+            rows.append(['attribute', dimName, 'actual_range', 'double', '0.0, {:.1f}'.format(size - 1)])
+    if not dimensions:
+        rows.append(['variable', 'time', '', 'double', ''])
+        rows.append(['attribute', 'time', 'actual_range', 'double', '0.0, 1.6E9'])
+        rows.append(['attribute', 'time', 'units', 'String', 'seconds since 1970-01-01T00:00:00Z'])
+        rows.append(['attribute', 'time', '_CoordinateAxisType', 'String', 'Time'])
+    for varIdx in range(nVariables):
+        varName = 'var{}'.format(varIdx)
+        rows.append(['variable', varName, '', 'float', ', '.join(dimensions.keys())])
+        for attIdx in range(nAttributes):
+            if attIdx % 3 == 0:
+                rows.append(['attribute', varName, 'att{}'.format(attIdx), 'float', '{}.5, {}.5'.format(attIdx, attIdx + 1)])
+            elif attIdx % 3 == 1:
+                rows.append(['attribute', varName, 'att{}'.format(attIdx), 'int', str(attIdx)])
+            else:
+                rows.append(['attribute', varName, 'att{}'.format(attIdx), 'String', 'Attribute value {}'.format(attIdx)])
+    return { 'table' : { 'columnNames' : ['Row Type', 'Variable Name', 'Attribute Name', 'Data Type', 'Value'],
+                         'columnTypes' : ['String', 'String', 'String', 'String', 'String'],
+                         'rows' : rows } }
+
+
+def syntheticDimensionsCSV(dimensions):
+    """
+    Returns the csvp response of the dimensions values request of a griddap
+    dataset, the columns of the shorter dimensions are padded with empty values.
+    """
+    size = max(dimensions.values())
+    columns = []
+    for dimName, dimSize in dimensions.items():
+        if dimName == 'time':
+            startTime = dt.datetime(1970, 1, 1)
+            values = [ (startTime + dt.timedelta(days=idx)).strftime('%Y-%m-%dT%H:%M:%SZ') for idx in range(dimSize) ]
+        else:
+            values = [ '{:.1f}'.format(value) for value in np.arange(dimSize, dtype=float) ]
+        columns.append(values + [''] * (size - dimSize))
+    header = ','.join('{} ({})'.format(dimName, 'UTC' if dimName == 'time' else 'm') for dimName in dimensions)
+    return header + '\n' + '\n'.join(','.join(row) for row in zip(*columns)) + '\n'
+
+
+def syntheticTableCSV(nRows, nStations=50):
+    """
+    Returns a tabledap csvp response with station, time, position and measurements columns.
+    """
+    rng = np.random.default_rng(0)
+    lines = ['station,time (UTC),latitude (degrees_north),longitude (degrees_east),wtmp (degree_C),wspd (m s-1)']
+    startTime = dt.datetime(2020, 1, 1)
+    for idx in range(nRows):
+        lines.append('{},{},{:.3f},{:.3f},{:.2f},{:.2f}'.format(
+            'st{:03d}'.format(idx % nStations),
+            (startTime + dt.timedelta(minutes=10 * idx)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            rng.uniform(10, 40), rng.uniform(-100, -60), rng.uniform(10, 30), rng.uniform(0, 20)))
+    return '\n'.join(lines) + '\n'
+
+
+def syntheticTableResponse(nRows, filetype, nStations=50):
+    """
+    Returns the `syntheticTableCSV` table as a tabledap csv or json response
+    text, or as a nc response bytes.
+    """
+    import io
+    import pandas as pd
+    table = pd.read_csv(io.StringIO(syntheticTableCSV(nRows, nStations)))
+    names = [ column.split(' (')[0] for column in table.columns ]
+    units = [ column.split(' (')[1].rstrip(')') if ' (' in column else '' for column in table.columns ]
+    table.columns = names
+    if filetype == 'csv':
+        return ','.join(names) + '\n' + ','.join(units) + '\n' + table.to_csv(index=False, header=False)
+    elif filetype == 'json':
+        return json.dumps({ 'table' : { 'columnNames' : names,
+                                        'columnTypes' : [ 'String' if table[name].dtype == object else 'float' for name in names ],
+                                        'columnUnits' : [ unit or None for unit in units ],
+                                        'rows' : table.values.tolist() } })
+    elif filetype == 'nc':
+        dataset = table.rename_axis('row').to_xarray().drop_vars('row')
+        for name, unit in zip(names, units):
+            if unit:
+                dataset[name].attrs['units'] = unit
+        return bytes(dataset.to_netcdf())
+    raise Exception("No synthetic table response for filetype {}".format(filetype))
+
+
+class FakeResponse:
+    """
+    Response object with the attributes of requests.Response used by erddapClient.
+    """
+    status_code = 200
+
+    def __init__(self, body):
+        self.content = body if isinstance(body, bytes) else body.encode('utf-8')
+        self.headers = {}
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def fakeUrlread(responses):
+    """
+    Returns a replacement of remote_requests.urlread that answers from a
+    dictionary of url substrings and responses texts or bytes.
+    """
+    def urlread(url, auth=None, **kwargs):
+        for urlPart, text in responses.items():
+            if urlPart in url:
+                return FakeResponse(text)
+        raise Exception("No fixture for url {}".format(url))
+    urlread.__wrapped__ = urlread
+    return urlread
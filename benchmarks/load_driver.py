@@ -0,0 +1,205 @@
+"""
+Load driver of the erddapClient requests, runs concurrent workloads against
+a local ERDDAP stand-in server (benchmarks/mock_erddap.py) or a given ERDDAP
+server url, and reports the throughput and latency percentiles of each workload.
+
+Usage:
+
+    python benchmarks/load_driver.py --workers 16 --duration 10
+    python benchmarks/load_driver.py --latency 0.05 --error-rate 0.02 --workloads search,griddap
+    python benchmarks/load_driver.py --url http://localhost:8080/erddap --iterations 500 --json results.json
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+
+from erddapClient import ERDDAP_Server, ERDDAP_Griddap, ERDDAP_Tabledap
+from erddapClient.remote_requests import urlread
+from mock_erddap import addServerArguments, serverFromArguments
+
+WORKLOADS = OrderedDict()
+
+
+def workload(name):
+    """
+    Registers a workload, a function called with the server url, the datasets
+    ids and a random generator, that makes the requests of one operation.
+    """
+    def register(function):
+        WORKLOADS[name] = function
+        return function
+    return register
+
+
+@workload('search')
+def searchWorkload(url, datasets, rng):
+    ERDDAP_Server(url).search(searchFor=rng.choice(datasets['words']))
+
+
+@workload('metadata')
+def metadataWorkload(url, datasets, rng):
+    ERDDAP_Tabledap(url, rng.choice(datasets['tabledap'])).loadMetadata(force=True)
+
+
+@workload('tabledap')
+def tabledapWorkload(url, datasets, rng):
+    remote = ERDDAP_Tabledap(url, rng.choice(datasets['tabledap']))
+    remote.setResultVariables(['station', 'time', 'wtmp'])
+    remote.addConstraint({ 'time>=' : dt.datetime(2000, 1, 1) + dt.timedelta(days=rng.randint(0, 30)) })
+    remote.getDataFrame()
+
+
+@workload('griddap')
+def griddapWorkload(url, datasets, rng):
+    remote = ERDDAP_Griddap(url, rng.choice(datasets['griddap']))
+    timeSize = remote.dimensions['time'].size
+    start = rng.randint(0, max(timeSize - 5, 0))
+    remote.setResultVariables(['sst'])
+    remote.setSubsetI(time=slice(start, min(start + 4, timeSize - 1)), latitude=slice(0, 19), longitude=slice(0, 19))
+    remote.getData('nc')
+
+
+@workload('status')
+def statusWorkload(url, datasets, rng):
+    ERDDAP_Server(url).parseStatusPage(force=True)
+
+
+def listDatasets(url):
+    """
+    Returns the griddap and tabledap datasets ids of the server, and the
+    words of their titles, used as search terms.
+    """
+    datasets = { 'griddap' : [], 'tabledap' : [], 'words' : set() }
+    for result in ERDDAP_Server(url).search(searchFor='').results:
+        if result.protocol in datasets:
+            datasets[result.protocol].append(result.datasetid)
+        datasets['words'].update( word for word in result.title.lower().split() if len(word) > 3 )
+    datasets['words'] = sorted(datasets['words'])
+    return datasets
+
+
+def runLoad(url, workloads, workers=8, duration=10.0, iterations=None, cache=False, seed=0):
+    """
+    Runs the workloads from `workers` threads, picking a random workload on
+    each operation, during `duration` seconds or for a total number of
+    `iterations` operations. Returns the dictionary of the workloads names
+    and the list of (latency, error) of their operations, and the elapsed time.
+    """
+    datasets = listDatasets(url)
+    records = OrderedDict( (name, []) for name in workloads )
+    lock = threading.Lock()
+    counter = iter(range(iterations)) if iterations else None
+    stopTime = time.perf_counter() + duration
+
+    def worker(workerIdx):
+        rng = random.Random(seed + workerIdx)
+        while True:
+            if counter is not None:
+                with lock:
+                    if next(counter, None) is None:
+                        return
+            elif time.perf_counter() >= stopTime:
+                return
+            name = rng.choice(workloads)
+            if not cache:
+                urlread.cache_clear()
+            startTime = time.perf_counter()
+            try:
+                WORKLOADS[name](url, datasets, rng)
+                error = None
+            except Exception as e:
+                error = "{}: {}".format(type(e).__name__, str(e).splitlines()[0] if str(e) else '')
+            latency = time.perf_counter() - startTime
+            with lock:
+                records[name].append((latency, error))
+
+    startTime = time.perf_counter()
+    threads = [ threading.Thread(target=worker, args=(idx,), daemon=True) for idx in range(workers) ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records, time.perf_counter() - startTime
+
+
+def summarize(records, elapsed):
+    summary = OrderedDict()
+    for name, operations in records.items():
+        latencies = np.array([ latency for latency, _ in operations ]) * 1000
+        errors = [ error for _, error in operations if error ]
+        summary[name] = OrderedDict([ ('count', len(operations)), ('errors', len(errors)),
+                                      ('ops_per_second', len(operations) / elapsed if elapsed else 0.0) ])
+        for percentile in [50, 90, 99]:
+            summary[name]['p{}_ms'.format(percentile)] = float(np.percentile(latencies, percentile)) if operations else None
+        summary[name]['max_ms'] = float(latencies.max()) if operations else None
+        summary[name]['first_error'] = errors[0] if errors else None
+    return summary
+
+
+def printSummary(summary, elapsed):
+    print("{:10s} {:>7s} {:>7s} {:>9s} {:>9s} {:>9s} {:>9s} {:>9s}".format(
+          'workload', 'count', 'errors', 'ops/s', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+    formatMs = lambda value: '-' if value is None else '{:.1f}'.format(value)
+    for name, result in summary.items():
+        print("{:10s} {:>7d} {:>7d} {:>9.1f} {:>9s} {:>9s} {:>9s} {:>9s}".format(
+              name, result['count'], result['errors'], result['ops_per_second'], formatMs(result['p50_ms']),
+              formatMs(result['p90_ms']), formatMs(result['p99_ms']), formatMs(result['max_ms'])))
+    total = sum(result['count'] for result in summary.values())
+    print("\n{} operations in {:.1f} s, {:.1f} ops/s".format(total, elapsed, total / elapsed if elapsed else 0.0))
+    for name, result in summary.items():
+        if result['first_error']:
+            print("{} first error: {}".format(name, result['first_error']))
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="erddapClient load driver")
+    parser.add_argument('--url', help="ERDDAP server url, by default a local mock server is started")
+    parser.add_argument('--workloads', default=','.join(WORKLOADS.keys()),
+                        help="Comma separated workloads names: {}".format(', '.join(WORKLOADS.keys())))
+    parser.add_argument('--workers', type=int, default=8, help="Number of concurrent workers")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds of load")
+    parser.add_argument('--iterations', type=int, default=None, help="Total number of operations, instead of a duration")
+    parser.add_argument('--cache', action='store_true', help="Keep the responses cache of urlread between operations")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="Path of the json file to store the summary")
+    addServerArguments(parser)
+    arguments = parser.parse_args(arguments)
+
+    workloads = [ name.strip() for name in arguments.workloads.split(',') if name.strip() ]
+    for name in workloads:
+        if name not in WORKLOADS:
+            parser.error("Unknown workload {}".format(name))
+
+    server = None
+    url = arguments.url
+    if url is None:
+        server = serverFromArguments(arguments).start()
+        url = server.url
+    try:
+        records, elapsed = runLoad(url, workloads, arguments.workers, arguments.duration,
+                                   arguments.iterations, arguments.cache, arguments.seed)
+    finally:
+        if server is not None:
+            server.stop()
+
+    summary = summarize(records, elapsed)
+    printSummary(summary, elapsed)
+    if arguments.json:
+        with open(arguments.json, 'w') as f:
+            json.dump(OrderedDict([ ('url', url), ('workers', arguments.workers), ('elapsed', elapsed),
+                                    ('workloads', summary) ]), f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,557 @@
+"""
+Local ERDDAP stand-in server, for load testing the client without requesting
+real ERDDAP servers. Serves synthetic griddap and tabledap datasets.
+
+Endpoints:
+
+    /erddap/version
+    /erddap/status.html
+    /erddap/info/<datasetID>/index.json
+    /erddap/search/index.json, /erddap/search/advanced.json
+    /erddap/tabledap/allDatasets.json, .csvp
+    /erddap/tabledap/<datasetID>.csvp
+    /erddap/griddap/<datasetID>.csvp, .nc, .dods, .dds, .das (OPeNDAP)
+
+The latency, bandwidth, error rate and payload sizes are configurable.
+
+Usage:
+
+    python benchmarks/mock_erddap.py --port 8080 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import random
+import re
+import struct
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# The netCDF4/HDF5 library is not thread safe, the lock is shared with the client in the same process
+from erddapClient.erddap_griddap import NETCDF_LOCK
+
+ERDDAP_VERSION = 2.11
+SEARCH_COLUMNS = [ 'griddap', 'Subset', 'tabledap', 'Make A Graph', 'wms', 'files', 'Accessible', 'Title',
+                   'Summary', 'FGDC', 'ISO 19115', 'Info', 'Background Info', 'RSS', 'Email', 'Institution', 'Dataset ID' ]
+ALLDATASETS_COLUMNS = [ 'datasetID', 'accessible', 'institution', 'dataStructure', 'cdm_data_type', 'class', 'title',
+                        'minLongitude', 'maxLongitude', 'longitudeSpacing', 'minLatitude', 'maxLatitude', 'latitudeSpacing',
+                        'minAltitude', 'maxAltitude', 'minTime', 'maxTime', 'timeSpacing', 'griddap', 'subset', 'tabledap',
+                        'MakeAGraph', 'sos', 'wcs', 'wms', 'files', 'fgdc', 'iso19115', 'metadata', 'sourceUrl', 'infoUrl',
+                        'rss', 'email', 'testOutOfDate', 'outOfDate', 'summary' ]
+TIME_UNITS = 'seconds since 1970-01-01T00:00:00Z'
+START_TIME = 946684800.0   # 2000-01-01T00:00:00Z
+GRID_VARIABLES = ['sst', 'chlor']
+TABLE_VARIABLES = OrderedDict([ ('station', 'String'), ('time', 'double'), ('latitude', 'float'),
+                                ('longitude', 'float'), ('wtmp', 'float'), ('wspd', 'float') ])
+TABLE_UNITS = { 'time' : 'UTC', 'latitude' : 'degrees_north', 'longitude' : 'degrees_east', 'wtmp' : 'degree_C', 'wspd' : 'm s-1' }
+SUBJECTS = ['sea surface temperature', 'chlorophyll', 'wind speed', 'ocean currents', 'salinity', 'buoy observations']
+
+
+class MockERDDAPError(Exception):
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def isoTime(seconds):
+    return dt.datetime.utcfromtimestamp(seconds).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def parseTime(value):
+    return (dt.datetime.strptime(value.rstrip('Z')[:19], '%Y-%m-%dT%H:%M:%S') - dt.datetime(1970, 1, 1)).total_seconds()
+
+
+class MockGriddap:
+    """
+    Synthetic griddap dataset, with time, latitude and longitude dimensions
+    and the variables values calculated from the dimensions indexes.
+    """
+    protocol = 'griddap'
+
+    def __init__(self, datasetid, title, shape):
+        self.datasetid = datasetid
+        self.title = title
+        nTime, nLat, nLon = shape
+        self.dimensions = OrderedDict([ ('time', START_TIME + 86400.0 * np.arange(nTime)),
+                                        ('latitude', np.linspace(-89.5, 89.5, nLat)),
+                                        ('longitude', np.linspace(-179.5, 179.5, nLon)) ])
+
+    def info(self):
+        rows = globalAttributes(self)
+        for dimName, values in self.dimensions.items():
+            rows.append(['dimension', dimName, '', 'double', 'nValues={}, evenlySpaced=true, averageSpacing={}'.format(values.size, values[1] - values[0] if values.size > 1 else 0)])
+            rows.append(['attribute', dimName, 'actual_range', 'double', '{}, {}'.format(values[0], values[-1])])
+            rows.append(['attribute', dimName, 'units', 'String', TIME_UNITS if dimName == 'time' else 'degrees'])
+            if dimName == 'time':
+                rows.append(['attribute', dimName, '_CoordinateAxisType', 'String', 'Time'])
+        for varName in GRID_VARIABLES:
+            rows.append(['variable', varName, '', 'float', ', '.join(self.dimensions.keys())])
+            rows.append(['attribute', varName, '_FillValue', 'float', '-999.0'])
+            rows.append(['attribute', varName, 'units', 'String', 'degree_C' if varName == 'sst' else 'mg m-3'])
+        return rows
+
+    def timeRange(self):
+        return self.dimensions['time'][0], self.dimensions['time'][-1]
+
+    def appendTimeSteps(self, nSteps=1):
+        """
+        Appends daily time steps, like a near real time dataset.
+        """
+        timeValues = self.dimensions['time']
+        self.dimensions['time'] = np.concatenate([ timeValues, timeValues[-1] + 86400.0 * np.arange(1, nSteps + 1) ])
+
+    def parseQuery(self, query):
+        """
+        Returns the list of (name, indexes arrays) of the griddap query.
+        """
+        items = []
+        for item in [ item for item in query.split('&')[0].split(',') if item ]:
+            # The OPeNDAP clients project the array of a grid as grid.array, answered with the whole grid
+            name = item.split('[')[0].split('.')[-1]
+            slices = re.findall(r'\[([^\]]*)\]', item)
+            if name in self.dimensions:
+                items.append((name, [ self.parseSlice(name, slices[0]) if slices else np.arange(self.dimensions[name].size) ]))
+            elif name in GRID_VARIABLES:
+                if slices and len(slices) != len(self.dimensions):
+                    raise MockERDDAPError(400, "Query error: {} has {} dimensions".format(name, len(self.dimensions)))
+                items.append((name, [ self.parseSlice(dimName, slices[idx]) if slices else np.arange(values.size)
+                                      for idx, (dimName, values) in enumerate(self.dimensions.items()) ]))
+            else:
+                raise MockERDDAPError(404, "Resource not found: variable {}".format(name))
+        return items
+
+    def parseSlice(self, dimName, sliceText):
+        values = self.dimensions[dimName]
+        def parseIndex(element):
+            element = element.strip()
+            if element.startswith('(') and element.endswith(')'):
+                element = element[1:-1]
+                value = values[-1] if element == 'last' else parseTime(element) if dimName == 'time' else float(element)
+                return int(np.abs(values - value).argmin())
+            if element.startswith('last'):
+                return values.size - 1 + int(element[4:] or 0)
+            return int(element)
+        elements = re.findall(r'\([^)]*\)|[^:]+', sliceText)
+        start = parseIndex(elements[0])
+        stop = parseIndex(elements[-1])
+        stride = int(elements[1]) if len(elements) == 3 else 1
+        if not 0 <= start <= stop < values.size:
+            raise MockERDDAPError(400, "Query error: {} index out of range".format(dimName))
+        return np.arange(start, stop + 1, stride)
+
+    def values(self, varName, indexes):
+        timeIdx, latIdx, lonIdx = np.ix_(*indexes)
+        latitude = self.dimensions['latitude'][latIdx]
+        longitude = self.dimensions['longitude'][lonIdx]
+        if varName == 'sst':
+            values = 28.0 - 25.0 * np.abs(np.sin(np.radians(latitude))) + 0.5 * np.sin(timeIdx / 58.0) + 0.0 * longitude
+        else:
+            values = 0.2 + 0.1 * np.cos(np.radians(longitude)) + 0.05 * np.cos(np.radians(latitude)) + 0.001 * timeIdx
+        return values.astype('float32')
+
+    def csvp(self, query):
+        items = self.parseQuery(query)
+        if all(name in self.dimensions for name, _ in items):
+            # Dimensions values request, the shorter columns are padded
+            columns = [ [ isoTime(v) if name == 'time' else repr(float(v)) for v in self.dimensions[name][indexes[0]] ]
+                        for name, indexes in items ]
+            size = max(len(column) for column in columns)
+            columns = [ column + [''] * (size - len(column)) for column in columns ]
+            header = ','.join('{} ({})'.format(name, 'UTC' if name == 'time' else 'degrees') for name, _ in items)
+            return header + '\n' + '\n'.join(','.join(row) for row in zip(*columns)) + '\n'
+        indexes = items[0][1]
+        grids = np.meshgrid(*[ values[idx] for values, idx in zip(self.dimensions.values(), indexes) ], indexing='ij')
+        columns = [ [ isoTime(v) for v in grids[0].ravel() ] ] + [ grid.ravel().astype(str) for grid in grids[1:] ]
+        columns += [ self.values(name, indexes).ravel().astype(str) for name, _ in items if name in GRID_VARIABLES ]
+        header = ['time (UTC)', 'latitude (degrees_north)', 'longitude (degrees_east)'] + [ name for name, _ in items if name in GRID_VARIABLES ]
+        return ','.join(header) + '\n' + '\n'.join(','.join(row) for row in zip(*columns)) + '\n'
+
+    def netcdf(self, query):
+        import netCDF4
+        items = self.parseQuery(query)
+        indexes = items[0][1] if items[0][0] in GRID_VARIABLES else [ np.arange(v.size) for v in self.dimensions.values() ]
+        fd, path = tempfile.mkstemp(suffix='.nc')
+        os.close(fd)
+        try:
+            with NETCDF_LOCK, netCDF4.Dataset(path, 'w') as ncfile:
+                ncfile.title = self.title
+                for (dimName, values), idx in zip(self.dimensions.items(), indexes):
+                    ncfile.createDimension(dimName, idx.size)
+                    dimVar = ncfile.createVariable(dimName, 'f8', (dimName,))
+                    dimVar[:] = values[idx]
+                    dimVar.units = TIME_UNITS if dimName == 'time' else 'degrees'
+                for name, varIndexes in items:
+                    if name in GRID_VARIABLES:
+                        variable = ncfile.createVariable(name, 'f4', tuple(self.dimensions.keys()), fill_value=-999.0)
+                        variable[:] = self.values(name, varIndexes)
+            with open(path, 'rb') as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+    def dds(self, query=''):
+        items = self.parseQuery(query) if query else \
+                [ (name, [ np.arange(v.size) ]) for name, v in self.dimensions.items() ] + \
+                [ (name, [ np.arange(v.size) for v in self.dimensions.values() ]) for name in GRID_VARIABLES ]
+        lines = ['Dataset {']
+        for name, indexes in items:
+            if name in self.dimensions:
+                lines.append('  Float64 {0}[{0} = {1}];'.format(name, indexes[0].size))
+            else:
+                shape = ''.join('[{} = {}]'.format(dimName, idx.size) for dimName, idx in zip(self.dimensions, indexes))
+                lines.append('  GRID {')
+                lines.append('    ARRAY:')
+                lines.append('      Float32 {}{};'.format(name, shape))
+                lines.append('    MAPS:')
+                for dimName, idx in zip(self.dimensions, indexes):
+                    lines.append('      Float64 {0}[{0} = {1}];'.format(dimName, idx.size))
+                lines.append('  }} {};'.format(name))
+        lines.append('}} {};'.format(self.datasetid))
+        return '\n'.join(lines) + '\n', items
+
+    def das(self):
+        lines = ['Attributes {']
+        for dimName in self.dimensions:
+            lines.append('  {} {{'.format(dimName))
+            lines.append('    String units "{}";'.format(TIME_UNITS if dimName == 'time' else 'degrees'))
+            lines.append('  }')
+        for varName in GRID_VARIABLES:
+            lines.append('  {} {{'.format(varName))
+            lines.append('    Float32 _FillValue -999.0;')
+            lines.append('  }')
+        lines.append('  NC_GLOBAL {')
+        lines.append('    String title "{}";'.format(self.title))
+        lines.append('  }')
+        lines.append('}')
+        return '\n'.join(lines) + '\n'
+
+    def dods(self, query):
+        """
+        Returns the DAP2 binary response: the DDS, and the XDR encoded arrays.
+        """
+        dds, items = self.dds(query)
+        chunks = [ dds.encode('utf-8'), b'\nData:\n' ]
+        def xdrArray(values, dtype):
+            values = np.ascontiguousarray(values, dtype=dtype)
+            chunks.append(struct.pack('>II', values.size, values.size))
+            chunks.append(values.tobytes())
+        for name, indexes in items:
+            if name in self.dimensions:
+                xdrArray(self.dimensions[name][indexes[0]], '>f8')
+            else:
+                xdrArray(self.values(name, indexes), '>f4')
+                for values, idx in zip(self.dimensions.values(), indexes):
+                    xdrArray(values[idx], '>f8')
+        return b''.join(chunks)
+
+
+class MockTabledap:
+    """
+    Synthetic tabledap dataset of stations timeseries.
+    """
+    protocol = 'tabledap'
+
+    def __init__(self, datasetid, title, nRows, nStations=20):
+        self.datasetid = datasetid
+        self.title = title
+        self.nRows = nRows
+        self.nStations = nStations
+
+    def info(self):
+        rows = globalAttributes(self)
+        rows.append(['attribute', 'NC_GLOBAL', 'subsetVariables', 'String', 'station'])
+        for varName, dataType in TABLE_VARIABLES.items():
+            rows.append(['variable', varName, '', dataType, ''])
+            if varName == 'time':
+                rows.append(['attribute', varName, 'actual_range', 'double', '{}, {}'.format(*self.timeRange())])
+                rows.append(['attribute', varName, 'units', 'String', TIME_UNITS])
+                rows.append(['attribute', varName, '_CoordinateAxisType', 'String', 'Time'])
+            elif varName in TABLE_UNITS:
+                rows.append(['attribute', varName, 'units', 'String', TABLE_UNITS[varName]])
+        return rows
+
+    def timeRange(self):
+        return START_TIME, START_TIME + 600.0 * max(self.nRows - 1, 0)
+
+    def csvp(self, query):
+        resultVariables = [ v for v in query.split('&')[0].split(',') if v ] or list(TABLE_VARIABLES.keys())
+        for varName in resultVariables:
+            if varName not in TABLE_VARIABLES:
+                raise MockERDDAPError(404, "Resource not found: variable {}".format(varName))
+        idx = np.arange(self.nRows)
+        columns = { 'station' : np.char.add('st', (idx % self.nStations).astype(str)),
+                    'time' : [ isoTime(t) for t in START_TIME + 600.0 * idx ],
+                    'latitude' : np.round(10 + (idx % self.nStations) * 1.5, 3).astype(str),
+                    'longitude' : np.round(-100 + (idx % self.nStations) * 2.0, 3).astype(str),
+                    'wtmp' : np.round(20 + 5 * np.sin(idx / 100.0), 2).astype(str),
+                    'wspd' : np.round(8 + 4 * np.cos(idx / 37.0), 2).astype(str) }
+        header = ','.join('{} ({})'.format(v, TABLE_UNITS[v]) if v in TABLE_UNITS else v for v in resultVariables)
+        return header + '\n' + '\n'.join(','.join(row) for row in zip(*[ columns[v] for v in resultVariables ])) + '\n'
+
+
+def globalAttributes(dataset):
+    return [ ['attribute', 'NC_GLOBAL', 'title', 'String', dataset.title],
+             ['attribute', 'NC_GLOBAL', 'summary', 'String', 'Synthetic {} dataset of {}'.format(dataset.protocol, dataset.title)],
+             ['attribute', 'NC_GLOBAL', 'institution', 'String', 'Mock ERDDAP'],
+             ['attribute', 'NC_GLOBAL', 'date_created', 'String', '2021-01-01T00:00:00Z'],
+             ['attribute', 'NC_GLOBAL', 'time_coverage_end', 'String', isoTime(dataset.timeRange()[1])] ]
+
+
+class MockERDDAPServer:
+    """
+    Local ERDDAP stand-in HTTP server.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, bandwidth=None, errorRate=0.0,
+                 nGriddap=2, nTabledap=2, gridShape=(365, 180, 360), tableRows=10000, seed=0):
+        """
+        Arguments:
+
+        `port` : The port of the server, 0 chooses a free port.
+
+        `latency`, `jitter` : Seconds added to every response, plus a uniform random jitter.
+
+        `bandwidth` : Bytes per second of the responses, None is unlimited.
+
+        `errorRate` : Fraction of the requests answered with an ERDDAP error 500.
+
+        `nGriddap`, `nTabledap` : Number of synthetic datasets.
+
+        `gridShape` : Size of the time, latitude and longitude dimensions of the griddap datasets.
+
+        `tableRows` : Number of rows of the tabledap responses.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.errorRate = errorRate
+        self.random = random.Random(seed)
+        self.datasets = OrderedDict()
+        for idx in range(nGriddap):
+            dataset = MockGriddap('mockGrid{:03d}'.format(idx), 'Mock {} grid {}'.format(SUBJECTS[idx % len(SUBJECTS)], idx), gridShape)
+            self.datasets[dataset.datasetid] = dataset
+        for idx in range(nTabledap):
+            dataset = MockTabledap('mockTable{:03d}'.format(idx), 'Mock {} table {}'.format(SUBJECTS[-1 - idx % len(SUBJECTS)], idx), tableRows)
+            self.datasets[dataset.datasetid] = dataset
+        self.startupTime = time.time()
+        self.counters = { 'succeeded' : 0, 'failed' : 0 }
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handlerClass())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://{}:{}/erddap'.format(host, port)
+
+    def start(self):
+        """
+        Starts serving in a background thread, returns the server.
+        """
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _handlerClass(self):
+        mockServer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                mockServer.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def handle(self, request):
+        path, _, query = request.path.partition('?')
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        try:
+            if self.errorRate and self.random.random() < self.errorRate:
+                raise MockERDDAPError(500, "Internal Server Error: mock error")
+            contentType, body = self.route(unquote(path), query)
+            status = 200
+        except Exception as e:
+            error = e if isinstance(e, MockERDDAPError) else MockERDDAPError(500, "Internal Server Error: {}".format(e))
+            status, contentType = error.code, 'text/plain'
+            body = 'Error {{\n    code={};\n    message="{}";\n}}\n'.format(error.code, str(error))
+        with self.lock:
+            self.counters['succeeded' if status == 200 else 'failed'] += 1
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+
+        request.send_response(status)
+        request.send_header('Content-Type', contentType)
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        chunkSize = 65536
+        for start in range(0, len(body), chunkSize):
+            chunk = body[start:start + chunkSize]
+            request.wfile.write(chunk)
+            if self.bandwidth:
+                time.sleep(len(chunk) / self.bandwidth)
+
+    def route(self, path, query):
+        if not path.startswith('/erddap/'):
+            raise MockERDDAPError(404, "Resource not found: {}".format(path))
+        path = path[len('/erddap/'):]
+        if path == 'version':
+            return 'text/plain', 'ERDDAP_version={}\n'.format(ERDDAP_VERSION)
+        if path == 'status.html':
+            return 'text/html', self.statusPage()
+        if path in ['search/index.json', 'search/advanced.json']:
+            return 'application/json', self.search(parse_qs(query))
+        match = re.match(r'info/([^/]+)/index\.json$', path)
+        if match:
+            return 'application/json', json.dumps(tableResponse(['Row Type', 'Variable Name', 'Attribute Name', 'Data Type', 'Value'],
+                                                                 self.dataset(match.group(1)).info()))
+        match = re.match(r'(griddap|tabledap)/([^/.]+)(?:\.(\w+))?$', path)
+        if match is None:
+            raise MockERDDAPError(404, "Resource not found: {}".format(path))
+        protocol, datasetid, filetype = match.groups()
+        query = unquote(query)
+        if protocol == 'tabledap' and datasetid == 'allDatasets':
+            return self.allDatasets(filetype)
+        dataset = self.dataset(datasetid)
+        if dataset.protocol != protocol:
+            raise MockERDDAPError(404, "Resource not found: {}/{}".format(protocol, datasetid))
+        if filetype == 'csvp':
+            return 'text/csv', dataset.csvp(query)
+        if protocol == 'griddap':
+            if filetype == 'nc':
+                return 'application/x-netcdf', dataset.netcdf(query)
+            if filetype == 'dods':
+                return 'application/octet-stream', dataset.dods(query)
+            if filetype == 'dds':
+                return 'text/plain', dataset.dds(query)[0]
+            if filetype == 'das':
+                return 'text/plain', dataset.das()
+        raise MockERDDAPError(400, "Query error: fileType {} is not supported".format(filetype))
+
+    def dataset(self, datasetid):
+        if datasetid not in self.datasets:
+            raise MockERDDAPError(404, "Resource not found: datasetID={}".format(datasetid))
+        return self.datasets[datasetid]
+
+    def search(self, params):
+        words = [ w.lower() for w in params.get('searchFor', [''])[0].replace('"', '').split() ]
+        protocol = params.get('protocol', ['(ANY)'])[0]
+        page = int(params.get('page', ['1'])[0])
+        itemsPerPage = int(params.get('itemsPerPage', ['1000'])[0])
+        rows = []
+        for dataset in self.datasets.values():
+            text = ' '.join([dataset.datasetid, dataset.title, 'mock erddap']).lower()
+            if all(w in text for w in words) and protocol in ['(ANY)', dataset.protocol]:
+                rows.append(self.searchRow(dataset))
+        rows = rows[(page - 1) * itemsPerPage:page * itemsPerPage]
+        if not rows:
+            raise MockERDDAPError(404, "Resource not found: Your query produced no matching results. (nRows = 0)")
+        return json.dumps(tableResponse(SEARCH_COLUMNS, rows))
+
+    def searchRow(self, dataset):
+        datasetURL = '{}/{}/{}'.format(self.url, dataset.protocol, dataset.datasetid)
+        return [ datasetURL if dataset.protocol == 'griddap' else '', '',
+                 datasetURL if dataset.protocol == 'tabledap' else '', '', '', '', '', dataset.title,
+                 'Synthetic {} dataset'.format(dataset.protocol), '', '', '{}/info/{}/index.json'.format(self.url, dataset.datasetid),
+                 '', '', '', 'Mock ERDDAP', dataset.datasetid ]
+
+    def allDatasets(self, filetype):
+        rows = []
+        for dataset in self.datasets.values():
+            row = dict.fromkeys(ALLDATASETS_COLUMNS, '')
+            minTime, maxTime = dataset.timeRange()
+            row.update({ 'datasetID' : dataset.datasetid, 'accessible' : 'public', 'institution' : 'Mock ERDDAP',
+                         'dataStructure' : 'grid' if dataset.protocol == 'griddap' else 'table', 'title' : dataset.title,
+                         'minLongitude' : -179.5, 'maxLongitude' : 179.5, 'minLatitude' : -89.5, 'maxLatitude' : 89.5,
+                         'minTime' : isoTime(minTime), 'maxTime' : isoTime(maxTime), 'summary' : 'Synthetic {} dataset'.format(dataset.protocol),
+                         dataset.protocol : '{}/{}/{}'.format(self.url, dataset.protocol, dataset.datasetid) })
+            rows.append([ row[column] for column in ALLDATASETS_COLUMNS ])
+        if filetype == 'json':
+            return 'application/json', json.dumps(tableResponse(ALLDATASETS_COLUMNS, rows))
+        if filetype == 'csvp':
+            return 'text/csv', ','.join(ALLDATASETS_COLUMNS) + '\n' + '\n'.join(','.join(str(v) for v in row) for row in rows) + '\n'
+        raise MockERDDAPError(400, "Query error: fileType {} is not supported".format(filetype))
+
+    def statusPage(self):
+        with self.lock:
+            succeeded, failed = self.counters['succeeded'], self.counters['failed']
+        now = time.time()
+        nGrid = sum(1 for d in self.datasets.values() if d.protocol == 'griddap')
+        lines = [ 'Current time is {}'.format(isoTime(now).replace('Z', '+00:00')),
+                  'Startup was at  {}'.format(isoTime(self.startupTime).replace('Z', '+00:00')),
+                  'nGridDatasets  = {}'.format(nGrid),
+                  'nTableDatasets = {}'.format(len(self.datasets) - nGrid),
+                  'nTotalDatasets = {}'.format(len(self.datasets)),
+                  'n Datasets Failed To Load (in the last major LoadDatasets) = 0',
+                  '    (end)' ]
+        for since in ['since last major LoadDatasets', 'since last Daily Report', 'since startup']:
+            lines.append('Response Failed    Time ({}) n = {:8d},  median ~= {:8d} ms'.format(since, failed, 5))
+        for since in ['since last major LoadDatasets', 'since last Daily Report', 'since startup']:
+            lines.append('Response Succeeded Time ({}) n = {:8d},  median ~= {:8d} ms'.format(since, succeeded, int(self.latency * 1000)))
+        lines.append('Number of threads: Tomcat-waiting={}, inotify=0, other=10'.format(threading.active_count()))
+        lines.append('MemoryInUse=   100 MB (highWaterMark=   200 MB) (Xmx ~=  1000 MB)')
+        lines.append('')
+        return '<html><body><pre>\n' + '\n'.join(lines) + '\n</pre></body></html>\n'
+
+
+def tableResponse(columnNames, rows):
+    return { 'table' : { 'columnNames' : columnNames,
+                         'columnTypes' : ['String'] * len(columnNames),
+                         'rows' : rows } }
+
+
+def addServerArguments(parser):
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Maximum random seconds added to the latency")
+    parser.add_argument('--bandwidth', type=float, default=None, help="Bytes per second of the responses")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with an error")
+    parser.add_argument('--griddap', type=int, default=2, help="Number of griddap datasets")
+    parser.add_argument('--tabledap', type=int, default=2, help="Number of tabledap datasets")
+    parser.add_argument('--grid-shape', type=int, nargs=3, default=[365, 180, 360], help="Time, latitude and longitude sizes")
+    parser.add_argument('--table-rows', type=int, default=10000, help="Rows of the tabledap responses")
+
+
+def serverFromArguments(arguments, port=0):
+    return MockERDDAPServer(port=port, latency=arguments.latency, jitter=arguments.jitter, bandwidth=arguments.bandwidth,
+                            errorRate=arguments.error_rate, nGriddap=arguments.griddap, nTabledap=arguments.tabledap,
+                            gridShape=tuple(arguments.grid_shape), tableRows=arguments.table_rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local ERDDAP stand-in server")
+    parser.add_argument('--port', type=int, default=8080)
+    addServerArguments(parser)
+    arguments = parser.parse_args()
+    server = serverFromArguments(arguments, arguments.port)
+    print("Serving {}".format(server.url), flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,333 @@
+"""
+Benchmarks of the erddapClient hot paths, using the responses recorded in the
+tests cassettes and synthetic responses, no requests are made to ERDDAP servers.
+
+Usage:
+
+    python benchmarks/run_benchmarks.py                          # run and print the results
+    python benchmarks/run_benchmarks.py --save baseline.json     # store the results as a baseline
+    python benchmarks/run_benchmarks.py --compare baseline.json  # flag the regressions against a baseline
+    python benchmarks/run_benchmarks.py --filter metadata        # run the benchmarks that match a pattern
+
+In compare mode the exit status is 1 if any benchmark median time is more than
+`--threshold` times the baseline median time.
+"""
+import argparse
+import contextlib
+import datetime as dt
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import erddapClient
+import erddapClient.erddap_dataset
+from erddapClient import ERDDAP_Griddap, ERDDAP_Tabledap
+from erddapClient.parse_utils import parseDictMetadata, parseERDDAPStatusPage
+from fixtures import cassetteResponse, syntheticInfo, syntheticDimensionsCSV, syntheticTableCSV, syntheticTableResponse, fakeUrlread
+
+ERDDAP_URL = 'https://coastwatch.pfeg.noaa.gov/erddap'
+LARGE_DIMENSIONS = OrderedDict([ ('time', 20000), ('depth', 40), ('latitude', 2000), ('longitude', 4000) ])
+DEFAULT_THRESHOLD = 1.25
+MIN_REPEAT_TIME = 0.2
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name):
+    """
+    Registers a benchmark, the decorated function makes the setup and returns
+    the function to time. If the timed function returns a float, it's used as
+    the measured time instead of the call time.
+    """
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+@contextlib.contextmanager
+def fakeResponses(responses):
+    """
+    Replaces the urlread function of the dataset module, answering the
+    requests from a dictionary of url substrings and responses texts or bytes.
+    """
+    _urlread = erddapClient.erddap_dataset.urlread
+    erddapClient.erddap_dataset.urlread = fakeUrlread(responses)
+    try:
+        yield
+    finally:
+        erddapClient.erddap_dataset.urlread = _urlread
+
+
+def largeGriddap():
+    remote = ERDDAP_Griddap(ERDDAP_URL, 'largeGrid')
+    remote.loadMetadata(rawMetadata=syntheticInfo(LARGE_DIMENSIONS, nVariables=10))
+    with fakeResponses({ '.csvp' : syntheticDimensionsCSV(LARGE_DIMENSIONS) }):
+        remote.loadDimensionValues()
+    return remote
+
+
+# Metadata
+
+@benchmark('parseDictMetadata_cassette')
+def benchParseDictMetadataCassette():
+    rawMetadata = json.loads(cassetteResponse('test_remote_connection', 'info/cwwcNDBCMet'))
+    return lambda: parseDictMetadata(rawMetadata)
+
+
+@benchmark('parseDictMetadata_large')
+def benchParseDictMetadataLarge():
+    rawMetadata = syntheticInfo(nVariables=1000, nAttributes=30)
+    return lambda: parseDictMetadata(rawMetadata)
+
+
+# Griddap dimensions
+
+@benchmark('loadDimensionValues_large')
+def benchLoadDimensionValues():
+    remote = ERDDAP_Griddap(ERDDAP_URL, 'largeGrid')
+    remote.loadMetadata(rawMetadata=syntheticInfo(LARGE_DIMENSIONS, nVariables=10))
+    dimensionsCSV = syntheticDimensionsCSV(LARGE_DIMENSIONS)
+    def run():
+        with fakeResponses({ '.csvp' : dimensionsCSV }):
+            remote.loadDimensionValues(force=True)
+    return run
+
+
+@benchmark('closestIdx_1000_lookups')
+def benchClosestIdx():
+    dimension = largeGriddap().dimensions['longitude']
+    values = [ float(v) for v in range(0, 4000, 4) ]
+    return lambda: [ dimension.closestIdx(v) for v in values ]
+
+
+@benchmark('subset_values')
+def benchSubset():
+    dimensions = largeGriddap().dimensions
+    return lambda: dimensions.subset(time=slice('1990-01-01T00:00:00Z', '2000-01-01T00:00:00Z'), depth=0.0,
+                                     latitude=slice(100.0, 1500.0), longitude=slice(200.0, 3500.0))
+
+
+@benchmark('parseResultVariablesExtendedDapQuery')
+def benchParseExtendedDapQuery():
+    remote = largeGriddap()
+    resultVariables = [ 'var{}[(1990-01-01T00:00:00Z):1:(2000-01-01T00:00:00Z)][(0.0)][(100.0):(1500.0)][(200.0):last]'.format(idx)
+                        for idx in range(5) ]
+    return lambda: remote._parseResultVariablesExtendedDapQueryToValidDap(resultVariables)
+
+
+# Requests urls
+
+@benchmark('getDataRequestURL_tabledap')
+def benchTabledapURL():
+    remote = ERDDAP_Tabledap(ERDDAP_URL, 'cwwcNDBCMet')
+    remote.setResultVariables(['station', 'time', 'latitude', 'longitude', 'wtmp', 'wspd'])
+    remote.setConstraints({ 'time>=' : dt.datetime(2020, 1, 1), 'time<=' : 'max(time)', 'wtmp>' : 20.5, 'station=~' : '(41001|41002|41004)' })
+    remote.orderByClosest(['station', 'time/1day'])
+    return lambda: remote.getDataRequestURL()
+
+
+@benchmark('getDataRequestURL_griddap_subset')
+def benchGriddapURL():
+    remote = largeGriddap()
+    remote.setResultVariables(['var0', 'var1', 'var2'])
+    remote.setSubsetI(time=slice(-100, -1), depth=0, latitude=slice(100, 1500), longitude=slice(200, 3500))
+    return lambda: remote.getDataRequestURL(filetype='nc')
+
+
+# Data parsing
+
+@benchmark('getDataFrame_csvp_100k_rows')
+def benchGetDataFrameCSVP():
+    remote = ERDDAP_Tabledap(ERDDAP_URL, 'syntheticTable')
+    responses = { '.csvp' : syntheticTableCSV(100000) }
+    def run():
+        with fakeResponses(responses):
+            remote.getDataFrame()
+    return run
+
+
+@benchmark('getDataFrame_csvp_100k_rows_parse_dates')
+def benchGetDataFrameCSVPDates():
+    remote = ERDDAP_Tabledap(ERDDAP_URL, 'syntheticTable')
+    responses = { '.csvp' : syntheticTableCSV(100000) }
+    def run():
+        with fakeResponses(responses):
+            remote.getDataFrame(parse_dates=['time (UTC)'])
+    return run
+
+
+# The other tabledap formats, the request and the conversion of the response to a DataFrame
+
+@benchmark('getDataFrame_csv_100k_rows')
+def benchGetDataFrameCSV():
+    import pandas as pd
+    from io import StringIO
+    remote = ERDDAP_Tabledap(ERDDAP_URL, 'syntheticTable')
+    responses = { '.csv' : syntheticTableResponse(100000, 'csv') }
+    def run():
+        with fakeResponses(responses):
+            pd.read_csv(StringIO(remote.getData('csv')), skiprows=[1])
+    return run
+
+
+@benchmark('getDataFrame_json_100k_rows')
+def benchGetDataFrameJSON():
+    import pandas as pd
+    remote = ERDDAP_Tabledap(ERDDAP_URL, 'syntheticTable')
+    responses = { '.json' : syntheticTableResponse(100000, 'json') }
+    def run():
+        with fakeResponses(responses):
+            table = json.loads(remote.getData('json'))['table']
+            pd.DataFrame(table['rows'], columns=table['columnNames'])
+    return run
+
+
+@benchmark('getDataFrame_nc_100k_rows')
+def benchGetDataFrameNC():
+    import netCDF4
+    import xarray as xr
+    remote = ERDDAP_Tabledap(ERDDAP_URL, 'syntheticTable')
+    responses = { '.nc' : syntheticTableResponse(100000, 'nc') }
+    def run():
+        with fakeResponses(responses):
+            with netCDF4.Dataset('syntheticTable.nc', memory=remote.getData('nc')) as ncDataset:
+                xr.open_dataset(xr.backends.NetCDF4DataStore(ncDataset)).to_dataframe()
+    return run
+
+
+@benchmark('decodeDods_grid_10MB')
+def benchDecodeDods():
+    import numpy as np
+    from erddapClient.dap_utils import decodeDods
+    shape = (10, 500, 500)
+    dds = ("Dataset {{\n  GRID {{\n    ARRAY:\n      Float32 sst[time = {0}][latitude = {1}][longitude = {2}];\n    MAPS:\n"
+           "      Float64 time[time = {0}];\n      Float64 latitude[latitude = {1}];\n      Float64 longitude[longitude = {2}];\n"
+           "  }} sst;\n}} largeGrid;\n").format(*shape)
+    arrays = [ np.arange(np.prod(shape), dtype='>f4') ] + [ np.arange(size, dtype='>f8') for size in shape ]
+    content = dds.encode('utf-8') + b'\nData:\n' + b''.join( np.array([a.size, a.size], '>u4').tobytes() + a.tobytes() for a in arrays )
+    return lambda: decodeDods(content)
+
+
+# Status page
+
+@benchmark('parseERDDAPStatusPage_cassette')
+def benchParseStatusPage():
+    statusPage = cassetteResponse('test_parsestatus', 'coastwatch.pfeg.noaa.gov/erddap/status.html')
+    return lambda: parseERDDAPStatusPage(statusPage, 2.11)
+
+
+# Import time
+
+@benchmark('import_erddapClient')
+def benchImportTime():
+    code = "import time; t = time.perf_counter(); import erddapClient; print(time.perf_counter() - t)"
+    packageDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    return lambda: float(subprocess.run([sys.executable, '-c', code], cwd=packageDir, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, universal_newlines=True, check=True).stdout)
+
+
+def timeCall(function):
+    startTime = time.perf_counter()
+    measured = function()
+    elapsed = time.perf_counter() - startTime
+    return measured if isinstance(measured, float) else elapsed
+
+
+def runBenchmark(setup, repeat=5):
+    """
+    Runs a benchmark, the number of calls of each repeat is calibrated so each
+    repeat takes at least MIN_REPEAT_TIME seconds. Returns the min and median
+    time per call of the repeats.
+    """
+    function = setup()
+    firstTime = timeCall(function)
+    number = max(1, int(MIN_REPEAT_TIME / max(firstTime, 1e-9)))
+    repeatsTimes = [ sum(timeCall(function) for _ in range(number)) / number for _ in range(repeat) ]
+    return OrderedDict([ ('median', statistics.median(repeatsTimes)), ('min', min(repeatsTimes)),
+                         ('repeat', repeat), ('number', number) ])
+
+
+def runBenchmarks(pattern=None, repeat=5):
+    results = OrderedDict()
+    for name, setup in BENCHMARKS.items():
+        if pattern and not re.search(pattern, name):
+            continue
+        results[name] = runBenchmark(setup, repeat)
+        print("{:45s} {:>12s}".format(name, formatTime(results[name]['median'])), flush=True)
+    return OrderedDict([ ('meta', OrderedDict([ ('date', dt.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')),
+                                                ('python', platform.python_version()),
+                                                ('platform', platform.platform()),
+                                                ('erddapClient', erddapClient.__version__) ])),
+                         ('results', results) ])
+
+
+def compareResults(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Prints the comparison of the current results against the baseline.
+    Returns the list of benchmarks names that regressed.
+    """
+    regressions = []
+    print("\n{:45s} {:>12s} {:>12s} {:>8s}".format('benchmark', 'baseline', 'current', 'ratio'))
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            print("{:45s} {:>12s} {:>12s} {:>8s}".format(name, '-', formatTime(result['median']), 'new'))
+            continue
+        ratio = result['median'] / baseline['results'][name]['median']
+        status = ''
+        if ratio > threshold:
+            status = 'REGRESSION'
+            regressions.append(name)
+        elif ratio < 1.0 / threshold:
+            status = 'improved'
+        print("{:45s} {:>12s} {:>12s} {:>8.2f} {}".format(name, formatTime(baseline['results'][name]['median']),
+                                                          formatTime(result['median']), ratio, status))
+    return regressions
+
+
+def formatTime(seconds):
+    for unit, scale in [ ('s', 1.0), ('ms', 1e-3), ('us', 1e-6) ]:
+        if seconds >= scale:
+            return "{:.3f} {}".format(seconds / scale, unit)
+    return "{:.1f} ns".format(seconds / 1e-9)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="erddapClient benchmarks")
+    parser.add_argument('--filter', help="Regular expression of the benchmarks names to run")
+    parser.add_argument('--repeat', type=int, default=5, help="Number of repeats of each benchmark")
+    parser.add_argument('--save', help="Path of the json file to store the results")
+    parser.add_argument('--compare', help="Path of the json file of the baseline results")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Ratio of the median times considered a regression")
+    parser.add_argument('--list', action='store_true', help="List the benchmarks names")
+    arguments = parser.parse_args(arguments)
+
+    if arguments.list:
+        print("\n".join(BENCHMARKS.keys()))
+        return 0
+
+    results = runBenchmarks(arguments.filter, arguments.repeat)
+    if arguments.save:
+        with open(arguments.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if arguments.compare:
+        with open(arguments.compare) as f:
+            baseline = json.load(f)
+        regressions = compareResults(baseline, results, arguments.threshold)
+        if regressions:
+            print("\n{} regressions: {}".format(len(regressions), ", ".join(regressions)))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
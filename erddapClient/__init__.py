@@ -3,7 +3,11 @@ from erddapClient.erddap_dataset import ERDDAP_Dataset
 from erddapClient.erddap_tabledap import ERDDAP_Tabledap
 from erddapClient.erddap_griddap import ERDDAP_Griddap
 from erddapClient.erddap_griddap_dimensions import ERDDAP_Griddap_dimensions, ERDDAP_Griddap_dimension
+from erddapClient.erddap_catalog import ERDDAP_LocalCatalog
+from erddapClient.erddap_federation import ERDDAP_Federation
+from erddapClient.erddap_status import ERDDAP_StatusPoller
+from erddapClient.erddap_follower import ERDDAP_GriddapFollower
 
-__all__ = ["ERDDAP_Server", "ERDDAP_Dataset", "ERDDAP_Tabledap", "ERDDAP_Griddap", "ERDDAP_Griddap_dimensions", "ERDDAP_Griddap_dimension"]
+__all__ = ["ERDDAP_Server", "ERDDAP_Dataset", "ERDDAP_Tabledap", "ERDDAP_Griddap", "ERDDAP_Griddap_dimensions", "ERDDAP_Griddap_dimension", "ERDDAP_LocalCatalog", "ERDDAP_Federation", "ERDDAP_StatusPoller", "ERDDAP_GriddapFollower"]
 
 __version__ = "1.0.0"
\ No newline at end of file
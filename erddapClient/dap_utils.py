@@ -0,0 +1,54 @@
+from erddapClient.lazy_imports import lazyImport
+import re
+
+np = lazyImport('numpy')
+
+
+DODS_DATA_SEPARATOR = b'\nData:\n'
+# XDR encoding of the DAP2 types, the 16 bits integers are sent as 32 bits
+DAP_XDR_TYPES = { 'Byte' : '>u1', 'Int16' : '>i4', 'UInt16' : '>u4', 'Int32' : '>i4', 'UInt32' : '>u4',
+                  'Float32' : '>f4', 'Float64' : '>f8' }
+DAP_NATIVE_TYPES = { 'Byte' : 'uint8', 'Int16' : 'int16', 'UInt16' : 'uint16', 'Int32' : 'int32', 'UInt32' : 'uint32',
+                     'Float32' : 'float32', 'Float64' : 'float64' }
+DDS_DECLARATION = re.compile(r'\b(Byte|Int16|UInt16|Int32|UInt32|Float32|Float64|String|Url)\s+([\w.-]+)((?:\s*\[[^\]]*\])*)\s*;')
+DDS_DIMENSION = re.compile(r'\[\s*(?:[\w.-]+\s*=\s*)?(\d+)\s*\]')
+
+
+def parseDDS(ddsText):
+    """
+     Returns the list of the arrays declared in a DAP2 DDS, in the order of the
+     .dods response data, as (data type, name, shape) tuples. The array and the
+     maps of a Grid are listed in order, the maps with the dimensions names.
+    """
+    return [ (dataType, name, tuple( int(size) for size in DDS_DIMENSION.findall(dimensions) ))
+             for dataType, name, dimensions in DDS_DECLARATION.findall(ddsText) ]
+
+
+def decodeDods(content):
+    """
+     Decodes a DAP2 .dods binary response, the DDS text followed by the XDR
+     encoded values of the arrays. Returns the list of (name, array) of the
+     declared arrays, in order, converted to the native byte order.
+    """
+    separatorIdx = content.find(DODS_DATA_SEPARATOR)
+    if separatorIdx < 0:
+        raise Exception("Invalid .dods response: {}".format(content[:200].decode('utf-8', 'replace')))
+    offset = separatorIdx + len(DODS_DATA_SEPARATOR)
+    arrays = []
+    for dataType, name, shape in parseDDS(content[:separatorIdx].decode('utf-8')):
+        if dataType not in DAP_XDR_TYPES:
+            raise Exception("The .dods decoding of {} variables is not supported ({})".format(dataType, name))
+        size = int(np.prod(shape)) if shape else 1
+        if shape:
+            # The arrays length is sent twice, by DAP and by XDR
+            length = int(np.frombuffer(content, '>u4', count=1, offset=offset)[0])
+            if length != size:
+                raise Exception("Invalid .dods response, {} has {} values, {} expected".format(name, length, size))
+            offset += 8
+        xdrType = np.dtype(DAP_XDR_TYPES[dataType])
+        values = np.frombuffer(content, xdrType, count=size, offset=offset)
+        offset += size * xdrType.itemsize
+        if dataType == 'Byte':
+            offset += -size % 4
+        arrays.append((name, values.astype(DAP_NATIVE_TYPES[dataType]).reshape(shape)))
+    return arrays
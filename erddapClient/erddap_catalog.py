@@ -0,0 +1,266 @@
+from erddapClient.remote_requests import urlreadIfModified, responseValidators
+from erddapClient.erddap_server import ERDDAP_SearchResult, ERDDAP_SearchResults
+from erddapClient.erddap_constants import ERDDAP_Search_Results_Rows
+from erddapClient.parse_utils import parseConstraintDateTime, iso8601STRtoNum
+from erddapClient.lazy_imports import lazyImport
+from io import StringIO
+import datetime as dt
+import hashlib
+import bisect
+import re
+
+np = lazyImport('numpy')
+pd = lazyImport('pandas')
+
+
+class ERDDAP_LocalCatalog:
+    """
+    Class with a local searchable copy of the datasets catalog of a ERDDAP server,
+    built from a single download of the allDatasets table.
+
+    The catalog has an inverted index of the words of the title, summary, institution
+    and datasetID of each dataset, and sorted indexes of the time, altitude and
+    latitude ranges. Search queries are answered locally without requesting the server.
+    """
+
+    TEXT_COLUMNS = ['datasetID', 'title', 'summary', 'institution']
+    RANGE_COLUMNS = { 'time'      : ('minTime', 'maxTime'),
+                      'altitude'  : ('minAltitude', 'maxAltitude'),
+                      'latitude'  : ('minLatitude', 'maxLatitude'),
+                      'longitude' : ('minLongitude', 'maxLongitude') }
+    ATTRIBUTE_FILTERS = ['protocol', 'cdm_data_type', 'institution', 'datasetID', 'dataStructure', 'class']
+
+    def __init__(self, server):
+        """
+        Constructs the local catalog, and downloads the allDatasets table.
+
+        Arguments:
+
+        `server` : The `erddapClient.ERDDAP_Server` object.
+        """
+        self.server = server
+        self.catalog = None
+        """ DataFrame with the allDatasets table """
+        self.__validators = {}
+        self.__rowsHash = None
+        self.refresh()
+
+    def __len__(self):
+        return 0 if self.catalog is None else len(self.catalog)
+
+    def __repr__(self):
+        return "<erddapClient.{}>\nServer: {}\nDatasets: {}".format(type(self).__name__, self.server.serverURL, len(self))
+
+
+    def refresh(self):
+        """
+        Requests the allDatasets table again, using the ETag and Last-Modified
+        validators of the previous response, if the server responds that the table
+        didn't change, or its content is the same, the indexes are not rebuilt.
+
+        Returns True if the catalog changed.
+        """
+        requestURL = self.server.getQueryAllDatasetsURL(filetype='csvp')
+        response = urlreadIfModified(requestURL, self.__validators, auth=self.server.auth)
+        if response is None:
+            return False
+        self.__validators = responseValidators(response)
+
+        rowsHash = hashlib.sha1(response.content).hexdigest()
+        if rowsHash == self.__rowsHash:
+            return False
+        self.__rowsHash = rowsHash
+
+        catalog = pd.read_csv(StringIO(response.text))
+        catalog.columns = [ column.split(' (')[0] for column in catalog.columns ]
+        self._buildIndexes(catalog[catalog['datasetID'] != 'allDatasets'].reset_index(drop=True))
+        return True
+
+
+    def _buildIndexes(self, catalog):
+        self.catalog = catalog
+
+        # Inverted index, word -> sorted array of row numbers
+        wordRows = {}
+        for column in self.TEXT_COLUMNS:
+            for rowNumber, text in enumerate(catalog[column].fillna('').astype(str)):
+                for word in set(tokenize(text)):
+                    wordRows.setdefault(word, set()).add(rowNumber)
+        self.__wordIndex = { word : np.fromiter(sorted(rows), dtype=np.int32, count=len(rows)) for word, rows in wordRows.items() }
+        self.__words = sorted(self.__wordIndex.keys())
+        self.__texts = catalog[self.TEXT_COLUMNS].fillna('').astype(str).agg(' '.join, axis=1).str.lower()
+
+        # Range indexes, the rows sorted by the range minimum, and the range maximum in that order
+        self.__rangeIndexes = {}
+        for rangeName, (minColumn, maxColumn) in self.RANGE_COLUMNS.items():
+            rangeMin = self._numericColumn(minColumn)
+            rangeMax = self._numericColumn(maxColumn)
+            order = np.argsort(rangeMin, kind='stable')
+            self.__rangeIndexes[rangeName] = ( rangeMin[order], rangeMax[order], order )
+
+        self.__protocols = np.where(catalog['griddap'].notna(), 'griddap',
+                                    np.where(catalog['tabledap'].notna(), 'tabledap', ''))
+
+
+    def _numericColumn(self, column):
+        if column not in self.catalog:
+            return np.full(len(self.catalog), np.nan)
+        values = self.catalog[column]
+        if not pd.api.types.is_numeric_dtype(values):
+            # Time columns, ISO 8601 strings to seconds since 1970
+            values = (pd.to_datetime(values, utc=True, errors='coerce') - pd.Timestamp(0, tz='UTC')).dt.total_seconds()
+        return values.astype(float).values
+
+
+    def search(self, searchFor=None, **filters):
+        """
+        Search the local catalog, the filters are equivalent to the filters of
+        `erddapClient.ERDDAP_Server.advancedSearch`.
+
+        Arguments:
+
+        `searchFor` : Words to search in the title, summary, institution and datasetID.
+                      Each word must match the beginning of a word of the dataset,
+                      phrases are searched between double quotes "sea surface",
+                      and words or phrases with a - before are excluded.
+                      `attName=attValue` terms filter the attributes: protocol,
+                      cdm_data_type, institution, datasetID (prefix), dataStructure, class.
+
+        `protocol`, `cdm_data_type`, `institution` : Attributes filters.
+
+        `minLon`, `maxLon`, `minLat`, `maxLat` : Bounding box the datasets must intersect,
+                                                 if minLon > maxLon the box crosses the antimeridian.
+
+        `minTime`, `maxTime` : Datetime or ISO 8601 strings, time range the datasets must intersect.
+
+        `minAltitude`, `maxAltitude` : Altitude range the datasets must intersect.
+
+        Returns a `erddapClient.ERDDAP_SearchResults` object.
+        """
+        searchResults = ERDDAP_SearchResults()
+        for rowNumber in self.searchRows(searchFor, **filters):
+            searchResults.append(self._searchResult(rowNumber))
+        return searchResults
+
+
+    def datasetIDs(self, searchFor=None, **filters):
+        """
+        Returns the list of the datasetIDs that match the search, with the same
+        arguments of `erddapClient.ERDDAP_LocalCatalog.search`.
+        """
+        return list(self.catalog['datasetID'].values[self.searchRows(searchFor, **filters)])
+
+
+    def searchRows(self, searchFor=None, **filters):
+        """
+        Returns the sorted array of the catalog rows numbers that match the search.
+        """
+        mask = np.ones(len(self.catalog), dtype=bool)
+
+        if searchFor:
+            for term in re.findall(r'-?"[^"]*"|\S+', searchFor):
+                exclude = term.startswith('-') and len(term) > 1
+                term = (term[1:] if exclude else term).strip('"')
+                if '=' in term:
+                    attName, attValue = term.split('=', 1)
+                    termMask = self._attributeMask(attName, attValue)
+                elif ' ' in term.strip():
+                    termMask = self.__texts.str.contains(term.lower(), regex=False).values
+                else:
+                    termMask = np.ones(len(self.catalog), dtype=bool)
+                    for word in tokenize(term):
+                        wordMask = np.zeros(len(self.catalog), dtype=bool)
+                        wordMask[self._prefixRows(word)] = True
+                        termMask &= wordMask
+                mask &= ~termMask if exclude else termMask
+
+        for attName in self.ATTRIBUTE_FILTERS:
+            if filters.get(attName) not in [None, '(ANY)']:
+                mask &= self._attributeMask(attName, filters[attName])
+
+        timeRange = [ filters.get(k) for k in ['minTime', 'maxTime'] ]
+        timeRange = [ None if t is None else iso8601STRtoNum(parseConstraintDateTime(t)) if isinstance(t, (str, dt.datetime)) else float(t) for t in timeRange ]
+        for rangeName, queryRange in [ ('time', timeRange),
+                                       ('altitude', [ filters.get('minAltitude'), filters.get('maxAltitude') ]),
+                                       ('latitude', [ filters.get('minLat'), filters.get('maxLat') ]) ]:
+            if any(v is not None for v in queryRange):
+                mask &= self._rangeMask(rangeName, *queryRange)
+
+        minLon, maxLon = filters.get('minLon'), filters.get('maxLon')
+        if minLon is not None or maxLon is not None:
+            lonRanges = [ (minLon, maxLon) ]
+            if minLon is not None and maxLon is not None and minLon > maxLon:
+                # The bounding box crosses the antimeridian (or 0 in the 0..360 convention)
+                wrapLon = 180 if minLon <= 180 else 360
+                lonRanges = [ (minLon, wrapLon), (wrapLon - 360, maxLon) ]
+            # Compare the ranges in both -180..180 and 0..360 longitude conventions
+            lonMask = np.zeros(len(self.catalog), dtype=bool)
+            for lonRange in lonRanges:
+                for shift in [-360, 0, 360]:
+                    lonMask |= self._rangeMask('longitude', *[ None if v is None else v + shift for v in lonRange ])
+            mask &= lonMask
+
+        return np.flatnonzero(mask)
+
+
+    def _prefixRows(self, prefix):
+        """
+        Returns the rows of the datasets with a word that starts with prefix.
+        """
+        rows = []
+        position = bisect.bisect_left(self.__words, prefix)
+        while position < len(self.__words) and self.__words[position].startswith(prefix):
+            rows.append(self.__wordIndex[self.__words[position]])
+            position += 1
+        return np.concatenate(rows) if rows else np.array([], dtype=np.int32)
+
+
+    def _rangeMask(self, rangeName, queryMin=None, queryMax=None):
+        """
+        Returns a boolean mask of the datasets whose range intersects [queryMin, queryMax].
+        Datasets without range values don't match.
+        """
+        rangeMin, rangeMax, order = self.__rangeIndexes[rangeName]
+        # Rows sorted by rangeMin, only the first `candidates` have rangeMin <= queryMax
+        candidates = len(rangeMin) if queryMax is None else np.searchsorted(rangeMin, queryMax, side='right')
+        candidateMask = ~np.isnan(rangeMax[:candidates])
+        if queryMin is not None:
+            candidateMask &= rangeMax[:candidates] >= queryMin
+        mask = np.zeros(len(self.catalog), dtype=bool)
+        mask[order[:candidates][candidateMask]] = True
+        return mask
+
+
+    def _attributeMask(self, attName, attValue):
+        attValue = str(attValue).strip('"').lower()
+        if attName == 'protocol':
+            return self.__protocols == attValue
+        if attName not in self.catalog:
+            raise Exception("The attribute {} is not available in the local catalog".format(attName))
+        values = self.catalog[attName].fillna('').astype(str).str.lower()
+        if attName == 'datasetID':
+            return values.str.startswith(attValue).values
+        return (values == attValue).values
+
+
+    def _searchResult(self, rowNumber):
+        """
+        Returns a `erddapClient.ERDDAP_SearchResult` object from a catalog row.
+        """
+        row = self.catalog.iloc[rowNumber]
+        searchRow = [''] * (ERDDAP_Search_Results_Rows.DATASETID + 1)
+        for column, position in [ ('griddap', ERDDAP_Search_Results_Rows.GRIDDAP),
+                                  ('tabledap', ERDDAP_Search_Results_Rows.TABLEDAP),
+                                  ('title', ERDDAP_Search_Results_Rows.TITLE),
+                                  ('summary', ERDDAP_Search_Results_Rows.SUMMARY),
+                                  ('institution', ERDDAP_Search_Results_Rows.INSTITUTION),
+                                  ('datasetID', ERDDAP_Search_Results_Rows.DATASETID) ]:
+            searchRow[position] = '' if pd.isna(row[column]) else row[column]
+        return ERDDAP_SearchResult(self.server.serverURL, searchRow, auth=self.server.auth)
+
+
+def tokenize(text):
+    """
+    Returns the list of lowercase words of a text.
+    """
+    return re.findall(r'[a-z0-9]+', text.lower())
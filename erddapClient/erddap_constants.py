@@ -3,6 +3,17 @@ ERDDAP_TIME_UNITS = 'seconds since 1970-01-01T00:00:00Z'
 
 ERDDAP_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
 
+# Pandas data types equivalent to the ERDDAP variables data types
+ERDDAP_PANDAS_DATATYPES = { 'String' : 'string', 'char' : 'string', 
+                            'float' : 'float32', 'double' : 'float64',
+                            'byte' : 'Int8', 'ubyte' : 'UInt8', 'short' : 'Int16', 'ushort' : 'UInt16',
+                            'int' : 'Int32', 'uint' : 'UInt32', 'long' : 'Int64', 'ulong' : 'UInt64' }
+
+# Size in bytes of the ERDDAP variables data types, used to estimate the size of the griddap subsets
+ERDDAP_DATATYPE_SIZES = { 'byte' : 1, 'ubyte' : 1, 'char' : 2, 'short' : 2, 'ushort' : 2,
+                          'int' : 4, 'uint' : 4, 'float' : 4, 'long' : 8, 'ulong' : 8, 'double' : 8,
+                          'String' : 8 }
+
 class ERDDAP_Metadata_Rows:
     ROW_TYPE       = 0
     VARIABLE_NAME  = 1
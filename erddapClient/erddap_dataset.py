@@ -3,10 +3,14 @@ from erddapClient import url_operations
 from erddapClient.remote_requests import urlread
 from erddapClient.parse_utils import parseDictMetadata, parseConstraintValue
 from erddapClient.formatting import dataset_str, simple_dataset_repr
+from erddapClient.snapshots import snapshotPath, metadataToken, writeSnapshot, readSnapshot
+from erddapClient.lazy_imports import lazyImport
 import datetime as dt
-import pandas as pd
+import threading
 from io import StringIO
 
+pd = lazyImport('pandas')
+
 
 class ERDDAP_Dataset:
   """
@@ -27,6 +31,9 @@ class ERDDAP_Dataset:
     self.erddapauth = auth
 
     self.__metadata = None
+    self.snapshotToken = None
+    self.snapshotStale = None
+    """ True if the background revalidation found that the loaded snapshot is outdated, None if unknown """
 
     self.resultVariables = []
     self.constraints = []
@@ -150,6 +157,14 @@ class ERDDAP_Dataset:
 
 
   def getDataRequestURL(self, filetype=DEFAULT_FILETYPE, useSafeURL=True):
+    self.lastRequestURL = self._buildDataRequestURL(filetype, useSafeURL)
+    return self.lastRequestURL
+
+
+  def _buildDataRequestURL(self, filetype=DEFAULT_FILETYPE, useSafeURL=True):
+    """
+    Returns the data request url, without storing it in the lastRequestURL property.
+    """
     requestURL = self.getBaseURL(filetype)
     query = ""
 
@@ -162,10 +177,7 @@ class ERDDAP_Dataset:
     if len(self.serverSideFunctions) > 0:
       query += '&' + url_operations.parseQueryItems(self.serverSideFunctions, useSafeURL, safe='=!()&/')
 
-    requestURL = url_operations.joinURLElements(requestURL, query)
-
-    self.lastRequestURL = requestURL
-    return self.lastRequestURL
+    return url_operations.joinURLElements(requestURL, query)
   
   
   def getURL(self, filetype=DEFAULT_FILETYPE, useSafeURL=True):
@@ -201,7 +213,7 @@ class ERDDAP_Dataset:
             return vd[variableName][attribute]
 
 
-  def loadMetadata(self, force=False):
+  def loadMetadata(self, force=False, rawMetadata=None):
     """
     Loads in to memory the metadata atributes and values available in the info
     page of the dataset.
@@ -210,13 +222,89 @@ class ERDDAP_Dataset:
 
     `force` : If true, this method will reload the metadata attributes
     even if the information where already downloaded.    
+
+    `rawMetadata` : Optional dictionary with the info page json response, already
+    requested, in that case the request is not made.
     """
-    if self.__metadata is None or force:
-      rawRequest = urlread(self.getMetadataURL(), auth=self.erddapauth)
-      rawRequestJson = rawRequest.json()
-      self.__metadata = parseDictMetadata(rawRequestJson)
+    if self.__metadata is None or force or rawMetadata is not None:
+      if rawMetadata is None:
+        rawRequest = urlread(self.getMetadataURL(), auth=self.erddapauth)
+        rawMetadata = rawRequest.json()
+      self.__metadata = parseDictMetadata(rawMetadata)
       return True
       
+  def saveSnapshot(self, snapshotDir=None):
+    """
+    Saves the dataset metadata, and the dimensions values for griddap datasets,
+    in a local snapshot that can be loaded by `erddapClient.ERDDAP_Dataset.loadSnapshot`
+    without requesting the server.
+
+    Arguments:
+
+    `snapshotDir` : Directory of the snapshots, defaults to the ERDDAP_SNAPSHOT_DIR
+    environment variable or ~/.cache/erddapClient/snapshots
+
+    Returns the path of the dataset snapshot.
+    """
+    rawMetadata = urlread(self.getMetadataURL(), auth=self.erddapauth).json()
+    self.loadMetadata()
+    path = snapshotPath(snapshotDir, self.erddapurl, self.datasetid)
+    self.snapshotToken = metadataToken(rawMetadata)
+    writeSnapshot(path, { 'erddapurl' : self.erddapurl,
+                          'datasetid' : self.datasetid,
+                          'protocol'  : self.protocol,
+                          'token'     : self.snapshotToken }, rawMetadata, self._snapshotArrays())
+    return path
+
+
+  def loadSnapshot(self, snapshotDir=None, revalidate=True):
+    """
+    Loads the dataset metadata, and the dimensions values for griddap datasets,
+    from the local snapshot saved by `erddapClient.ERDDAP_Dataset.saveSnapshot`.
+    The dimensions values are memory mapped.
+
+    Arguments:
+
+    `snapshotDir` : Directory of the snapshots.
+
+    `revalidate` : If True, the metadata is requested in a background thread,
+    and the `snapshotStale` property is set to True if the dataset changed
+    (date_created, history or time_coverage_end attributes) since the snapshot.
+
+    Returns False if there is no snapshot of the dataset.
+    """
+    snapshot = readSnapshot(snapshotPath(snapshotDir, self.erddapurl, self.datasetid))
+    if snapshot is None:
+      return False
+    manifest, rawMetadata, arrays = snapshot
+    self.loadMetadata(rawMetadata=rawMetadata)
+    self._loadSnapshotArrays(arrays)
+    self.snapshotToken = manifest['token']
+    self.snapshotStale = None
+    if revalidate:
+      threading.Thread(target=self._revalidateSnapshot, daemon=True).start()
+    return True
+
+
+  def _revalidateSnapshot(self):
+    try:
+      rawMetadata = urlread.__wrapped__(self.getMetadataURL(), auth=self.erddapauth).json()
+    except Exception:
+      return
+    self.snapshotStale = metadataToken(rawMetadata) != self.snapshotToken
+
+
+  def _snapshotArrays(self):
+    """
+    Returns the dictionary of arrays to save in the snapshot.
+    """
+    return {}
+
+
+  def _loadSnapshotArrays(self, arrays):
+    pass
+
+
   @property
   def variables(self):
     """
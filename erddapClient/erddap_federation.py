@@ -0,0 +1,160 @@
+from erddapClient.erddap_server import ERDDAP_Server, ERDDAP_SearchResults
+from erddapClient.remote_requests import isEmptyResultError, isTimeoutError
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError
+from collections import OrderedDict
+import itertools
+
+
+class ERDDAP_Federation:
+    """
+    Class to search a group of ERDDAP servers at the same time.
+    """
+
+    DEFAULT_TIMEOUT = 30
+
+    def __init__(self, servers, auth=None, timeout=DEFAULT_TIMEOUT):
+        """
+        Constructs the federation of ERDDAP servers.
+
+        Arguments:
+
+        `servers` : List of ERDDAP server urls or `erddapClient.ERDDAP_Server` objects.
+
+        `auth` : Tupple with username and password, used for the servers given as urls.
+
+        `timeout` : Seconds to wait for the servers responses, the servers that
+                    don't respond in time are left out of the results. It's also
+                    the timeout of each server request, so the requests of the
+                    servers that didn't respond are not left running.
+        """
+        self.servers = [ server if isinstance(server, ERDDAP_Server) else ERDDAP_Server(server, auth=auth)
+                         for server in servers ]
+        self.timeout = timeout
+        self.lastErrors = OrderedDict()
+        """ Dictionary with the servers urls and the error of the last search, for the servers that failed or timed out """
+        self.lastTimeouts = []
+        """ List with the urls of the servers that timed out in the last search """
+        self.lastMirrors = OrderedDict()
+        """ Dictionary with the datasetIDs found in more than one server of the last search, and the servers urls """
+
+    def __repr__(self):
+        summary = ["<erddapClient.{}>".format(type(self).__name__), "Servers:"]
+        summary.extend([ "  {}".format(server.serverURL) for server in self.servers ])
+        return "\n".join(summary)
+
+
+    def search(self, timeout=None, **filters):
+        """
+        Makes a search request to all the servers concurrently, the filters are
+        the same of `erddapClient.ERDDAP_Server.search`.
+
+        The results are merged by its rank in each server (the first result of
+        every server, then the second ones, etc.), the datasets available in more
+        than one server are included once, from the first server in the list that
+        has it, at its rank in that server. The server of each result is in its `url`
+        attribute.
+
+        Arguments:
+
+        `timeout` : Seconds to wait for the servers, defaults to the federation timeout.
+
+        Returns a `erddapClient.ERDDAP_SearchResults` object.
+        """
+        return self._mergeRanked(self._searchServers('search', timeout, filters))
+
+
+    def advancedSearch(self, timeout=None, **filters):
+        """
+        Makes a advanced search request to all the servers concurrently, the filters
+        are the same of `erddapClient.ERDDAP_Server.advancedSearch`. The results
+        are merged like in `erddapClient.ERDDAP_Federation.search`.
+
+        Returns a `erddapClient.ERDDAP_SearchResults` object.
+        """
+        return self._mergeRanked(self._searchServers('advancedSearch', timeout, filters))
+
+
+    def iterSearch(self, timeout=None, **filters):
+        """
+        Generator that yields the search results of each server as soon as
+        it responds, without the datasets already yield from other servers.
+
+        Yields `erddapClient.ERDDAP_SearchResult` objects.
+        """
+        seenDatasetIDs = set()
+        for server, searchResults in self._iterSearchServers('search', timeout, filters):
+            for searchResult in searchResults.results:
+                if searchResult.datasetid not in seenDatasetIDs:
+                    seenDatasetIDs.add(searchResult.datasetid)
+                    yield searchResult
+
+
+    def _searchServers(self, searchMethod, timeout, filters):
+        """
+        Returns a dictionary with the search results of each server, in the same
+        order of the servers list.
+        """
+        serversResults = dict(self._iterSearchServers(searchMethod, timeout, filters))
+        return OrderedDict( (server.serverURL, serversResults[server.serverURL])
+                            for server in self.servers if server.serverURL in serversResults )
+
+
+    def _iterSearchServers(self, searchMethod, timeout, filters):
+        timeout = self.timeout if timeout is None else timeout
+        self.lastErrors = OrderedDict()
+        self.lastTimeouts = []
+
+        def serverSearch(server):
+            try:
+                return getattr(server, searchMethod)(request_kwargs={ 'timeout' : timeout }, **filters)
+            except Exception as e:
+                if isEmptyResultError(e):
+                    return ERDDAP_SearchResults(server.serverURL)
+                raise
+
+        executor = ThreadPoolExecutor(max_workers=max(len(self.servers), 1))
+        futures = { executor.submit(serverSearch, server) : server for server in self.servers }
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                server = futures[future]
+                try:
+                    yield server.serverURL, future.result()
+                except Exception as e:
+                    self.lastErrors[server.serverURL] = e
+                    if isTimeoutError(e):
+                        self.lastTimeouts.append(server.serverURL)
+        except TimeoutError:
+            for future, server in futures.items():
+                if not future.done():
+                    self.lastErrors[server.serverURL] = TimeoutError("The server {} didn't respond in {} seconds".format(server.serverURL, timeout))
+                    self.lastTimeouts.append(server.serverURL)
+        finally:
+            # Don't wait for the servers that timed out
+            executor.shutdown(wait=False)
+
+
+    def _mergeRanked(self, serversResults):
+        mergedResults = ERDDAP_SearchResults()
+        # The servers of each dataset, in the order of the servers list
+        datasetServers = OrderedDict()
+        for serverURL, searchResults in serversResults.items():
+            for searchResult in searchResults.results:
+                servers = datasetServers.setdefault(searchResult.datasetid, [])
+                if serverURL not in servers:
+                    servers.append(serverURL)
+
+        # A dataset is included at its rank in the first server that has it
+        mergedDatasetIDs = set()
+        rankedResults = itertools.zip_longest(*[ [ (serverURL, searchResult) for searchResult in searchResults.results ]
+                                                 for serverURL, searchResults in serversResults.items() ])
+        for rankResults in rankedResults:
+            for serverResult in rankResults:
+                if serverResult is None:
+                    continue
+                serverURL, searchResult = serverResult
+                if datasetServers[searchResult.datasetid][0] == serverURL and searchResult.datasetid not in mergedDatasetIDs:
+                    mergedDatasetIDs.add(searchResult.datasetid)
+                    mergedResults.append(searchResult)
+
+        self.lastMirrors = OrderedDict( (datasetid, servers) for datasetid, servers in datasetServers.items() if len(servers) > 1 )
+        return mergedResults
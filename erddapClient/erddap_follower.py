@@ -0,0 +1,151 @@
+from erddapClient.parse_utils import datesToNumArray
+from erddapClient.lazy_imports import lazyImport
+import threading
+import time
+
+np = lazyImport('numpy')
+
+
+class ERDDAP_GriddapFollower:
+    """
+    Class to follow a near real time griddap dataset. Polls the tail of the
+    time dimension on an interval, extends the time dimension of the griddap
+    object in place, and requests only the time steps appended since the last
+    poll. The new time steps are passed to a callback, or yielded by the async
+    iterator of the follower:
+
+    ```
+    follower = ERDDAP_GriddapFollower(remote, ['analysed_sst'], interval=600,
+                                      latitude=slice(20, 30), longitude=slice(-120, -110))
+    async for newSteps in follower:
+        process(newSteps)
+    ```
+    """
+
+    DEFAULT_INTERVAL = 300
+    DEFAULT_MAX_STEPS = 24
+
+    def __init__(self, griddap, variables=None, callback=None, interval=DEFAULT_INTERVAL, since=None,
+                 maxSteps=DEFAULT_MAX_STEPS, **kwdims):
+        """
+        Constructs the follower, the polling starts with
+        `erddapClient.ERDDAP_GriddapFollower.start`, or a single poll is made
+        with `erddapClient.ERDDAP_GriddapFollower.poll`.
+
+        Arguments:
+
+        `griddap` : `erddapClient.ERDDAP_Griddap` object of the dataset.
+
+        `variables` : List of variables names, by default all the variables.
+
+        `callback` : Optional function called with a xarray.Dataset of each group of new time steps.
+
+        `interval` : Seconds between polls.
+
+        `since` : Time of the last time step already processed (datetime, ISO 8601 string
+        or seconds since 1970), the steps after it are requested in the first poll. By
+        default the last time step of the dataset, only the steps appended later are requested.
+
+        `maxSteps` : Maximum number of time steps of each request, a backlog of new steps
+        is requested and emitted in groups.
+
+        `kwdims` : Subset of the other dimensions, the same arguments of `setSubset`.
+        """
+        self.griddap = griddap
+        self.variables = variables
+        self.callback = callback
+        self.interval = interval
+        self.maxSteps = maxSteps
+        self.subset = kwdims
+        timeDimension = griddap.dimensions.timeDimension
+        if timeDimension is None:
+            raise Exception("The dataset {} doesn't have a time dimension".format(griddap.datasetid))
+        self.lastTime = float(timeDimension.data[-1]) if since is None else float(datesToNumArray([since])[0])
+        """ Time of the last time step emitted, in seconds since 1970 """
+        self.lastError = None
+        """ The error of the last poll of the background thread, None if it succeeded """
+        self.__lock = threading.Lock()
+        self.__stopEvent = threading.Event()
+        self.__thread = None
+
+    def __repr__(self):
+        return "\n".join(["<erddapClient.{}>".format(type(self).__name__),
+                          "Dataset: {}".format(self.griddap.datasetid),
+                          "Interval: {} s".format(self.interval)])
+
+    def __aiter__(self):
+        return self._follow()
+
+
+    def poll(self):
+        """
+        Checks for new time steps, requests the new steps after `lastTime` in groups
+        of `maxSteps`, and calls the callback with each group, as soon as it's received.
+
+        Returns the list of xarray.Dataset of the new time steps, empty if there are
+        no new steps.
+        """
+        with self.__lock:
+            griddap = self.griddap
+            griddap.updateTimeDimension()
+            timeDimension = griddap.dimensions.timeDimension
+            timeValues = np.asarray(timeDimension.data, dtype='float64')
+            variables = self.variables or list(griddap.variables.keys())
+            positionalIndexes = griddap._filledPositionalIndexes(griddap.dimensions.subset(**self.subset))
+
+            newSteps = []
+            firstNew = int(np.searchsorted(timeValues, self.lastTime, side='right'))
+            for stepsStart in range(firstNew, timeValues.size, self.maxSteps):
+                stepsStop = min(stepsStart + self.maxSteps, timeValues.size)
+                positionalIndexes[timeDimension.name] = slice(stepsStart, stepsStop)
+                variablesValues = griddap._fetchWrappedSubsets(variables, [ positionalIndexes ])[0]
+                stepsData = griddap._subsetxArray(variablesValues, griddap._subsetCoordinates(positionalIndexes))
+                self.lastTime = float(timeValues[stepsStop - 1])
+                if self.callback is not None:
+                    self.callback(stepsData)
+                newSteps.append(stepsData)
+            return newSteps
+
+
+    async def _follow(self):
+        import asyncio
+        loop = asyncio.get_event_loop()
+        while True:
+            startTime = time.time()
+            for stepsData in await loop.run_in_executor(None, self.poll):
+                yield stepsData
+            await asyncio.sleep(max(self.interval - (time.time() - startTime), 0))
+
+
+    def start(self):
+        """
+        Starts polling the dataset every `interval` seconds in a background thread,
+        the new time steps are passed to the callback.
+        """
+        if self.__thread is not None and self.__thread.is_alive():
+            return self
+        self.__stopEvent.clear()
+        self.__thread = threading.Thread(target=self._pollLoop, daemon=True)
+        self.__thread.start()
+        return self
+
+
+    def stop(self):
+        """
+        Stops the background polling.
+        """
+        self.__stopEvent.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+
+    def _pollLoop(self):
+        while not self.__stopEvent.is_set():
+            startTime = time.time()
+            try:
+                self.poll()
+                self.lastError = None
+            except Exception as e:
+                self.lastError = e
+            self.__stopEvent.wait(max(self.interval - (time.time() - startTime), 0))
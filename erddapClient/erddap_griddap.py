@@ -2,15 +2,33 @@ from erddapClient.erddap_dataset import ERDDAP_Dataset
 from erddapClient.erddap_griddap_dimensions import ERDDAP_Griddap_dimensions, ERDDAP_Griddap_dimension
 from erddapClient import url_operations
 from erddapClient.formatting import griddap_str
-from erddapClient.parse_utils import parseTimeRangeAttributes, parse_griddap_resultvariables_slices, is_slice_element_opendap_extended, get_value_from_opendap_extended_slice_element, validate_iso8601, validate_float, validate_int, validate_last_keyword, iso8601STRtoNum, extractVariableName
-from erddapClient.erddap_constants import ERDDAP_TIME_UNITS, ERDDAP_DATETIME_FORMAT
+from erddapClient.parse_utils import parseTimeRangeAttributes, parse_griddap_resultvariables_slices, is_slice_element_opendap_extended, get_value_from_opendap_extended_slice_element, validate_iso8601, validate_float, validate_int, validate_last_keyword, iso8601STRtoNum, extractVariableName, datesToNumArray
+from erddapClient.erddap_constants import ERDDAP_TIME_UNITS, ERDDAP_DATETIME_FORMAT, ERDDAP_DATATYPE_SIZES
+from erddapClient.remote_requests import urlread, mapConcurrently, mapPrefetched, DEFAULT_WORKERS
+from erddapClient.reductions import RunningStatistics, REDUCE_OPERATIONS
+from erddapClient.dap_utils import decodeDods
+from erddapClient.transport_selector import DEFAULT_SELECTOR
+from erddapClient.polygon_utils import polygonRings, rasterizePolygon, polygonTiles, seamShift
+from erddapClient.index_utils import indexRuns
+from erddapClient.snapshots import attributesToken, overviewsPath, writeOverviewLevel, listOverviewLevels, readOverviewLevel, TOKEN_ATTRIBUTES
+from erddapClient.lazy_imports import lazyImport
 from collections import OrderedDict 
-from netCDF4 import Dataset, date2num 
 import datetime as dt
-import numpy as np
-import pandas as pd
-import xarray as xr 
-import requests
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+
+netCDF4 = lazyImport('netCDF4')
+np = lazyImport('numpy')
+pd = lazyImport('pandas')
+xr = lazyImport('xarray')
+requests = lazyImport('requests')
+
+# The netCDF4 library is not thread safe, the in memory .nc responses are read one at a time
+NETCDF_LOCK = threading.Lock()
 
 
 class ERDDAP_Griddap(ERDDAP_Dataset):
@@ -20,6 +38,15 @@ class ERDDAP_Griddap(ERDDAP_Dataset):
   """
 
   DEFAULT_FILETYPE = 'nc'
+  DEFAULT_TRANSPORT = 'opendap'
+  TRANSPORTS = ['opendap', 'nc', 'dods', 'auto']
+  SMALL_SUBSET_BYTES = 1024 * 1024
+  REQUEST_OVERHEAD_BYTES = 256 * 1024
+  DEFAULT_MATCHUP_BYTES = 32 * 1024 * 1024
+  DEFAULT_OVERVIEW_CELLS = 1000 * 1000
+  DEFAULT_CHUNK_BYTES = 32 * 1024 * 1024
+  CELL_METHODS = { 'sum' : 'sum', 'mean' : 'mean', 'var' : 'variance', 'std' : 'standard_deviation',
+                   'min' : 'minimum', 'max' : 'maximum' }
 
   def __init__(self, url, datasetid, auth=None, lazyload=True):
     super().__init__(url, datasetid, 'griddap', auth, lazyload=lazyload)
@@ -29,13 +56,24 @@ class ERDDAP_Griddap(ERDDAP_Dataset):
     This property stores the last dimensions slices that builds the subset query. Its used to build opendap
     compatible queryes, and to get the dimensions values of the subset.
     """
+    self.__polygon_subset = None
+    self.__sparse_subset = None
+    self.transport = self.DEFAULT_TRANSPORT
+    """
+    Transport of the subsets requests, see `erddapClient.ERDDAP_Griddap.getxArray`.
+    """
+    self.transportSelector = DEFAULT_SELECTOR
+    self.variablesPerRequest = None
+    """
+    Splits the variables of the subsets requests in concurrent requests, see `erddapClient.ERDDAP_Griddap.getxArray`.
+    """
 
   def __str__(self):
     dst_repr_ = super().__str__()
     return dst_repr_ + griddap_str(self)
 
 
-  def loadMetadata(self, force=False):
+  def loadMetadata(self, force=False, rawMetadata=None):
     """
     Loads in to memory the metadata atributes and values available in the info
     page of the dataset.
@@ -44,8 +82,11 @@ class ERDDAP_Griddap(ERDDAP_Dataset):
 
     `force` : If true, this method will reload the metadata attributes
     even if the information where already downloaded.   
+
+    `rawMetadata` : Optional dictionary with the info page json response, already
+    requested, in that case the request is not made.
     """    
-    if super().loadMetadata(force):
+    if super().loadMetadata(force, rawMetadata):
       parseTimeRangeAttributes(self._ERDDAP_Dataset__metadata['dimensions'].items())
 
 
@@ -58,6 +99,8 @@ class ERDDAP_Griddap(ERDDAP_Dataset):
   def clearQuery(self):
     super().clearQuery()
     self.__positional_indexes = None
+    self.__polygon_subset = None
+    self.__sparse_subset = None
 
 
   def loadDimensionValues(self, force=False):
@@ -76,17 +119,21 @@ class ERDDAP_Griddap(ERDDAP_Dataset):
       self.loadMetadata()
       dimensionVariableNames = list(self._ERDDAP_Dataset__metadata['dimensions'].keys())
 
-      _resultVars = self.resultVariables
-      dimensionsData = ( self.setResultVariables(dimensionVariableNames)
-                             .getDataFrame(header=0, names=dimensionVariableNames)  )
-      self.resultVariables = _resultVars
+      # The dimensions values are requested without the current subset
+      _resultVars, _positionalIndexes = self.resultVariables, self.__positional_indexes
+      self.__positional_indexes = None
+      try:
+        dimensionsData = ( self.setResultVariables(dimensionVariableNames)
+                               .getDataFrame(header=0, names=dimensionVariableNames)  )
+      finally:
+        self.resultVariables, self.__positional_indexes = _resultVars, _positionalIndexes
       
       self.__dimensions = ERDDAP_Griddap_dimensions()
       for dimName in dimensionVariableNames:
         
         dimDatadroppedNaNs = dimensionsData[dimName].dropna()
         if dimName == 'time':
-          numericDates = np.array([ date2num(dt.datetime.strptime(_dt, ERDDAP_DATETIME_FORMAT), ERDDAP_TIME_UNITS) if (isinstance(_dt,str)) else _dt for _dt in dimDatadroppedNaNs] )
+          numericDates = np.array([ netCDF4.date2num(dt.datetime.strptime(_dt, ERDDAP_DATETIME_FORMAT), ERDDAP_TIME_UNITS) if (isinstance(_dt,str)) else _dt for _dt in dimDatadroppedNaNs] )
           dimensionSeries = pd.Series( data = np.arange(numericDates.size), index = numericDates)   
         else:
           dimensionSeries = pd.Series( data = dimDatadroppedNaNs.index.values, index = dimDatadroppedNaNs.values) 
@@ -95,13 +142,131 @@ class ERDDAP_Griddap(ERDDAP_Dataset):
         self.__dimensions[dimName] = ERDDAP_Griddap_dimension(dimName, dimensionSeries, metadata=dimMeta)       
 
 
-  def getxArray(self, **kwargs_od):
+  def updateTimeDimension(self):
+    """
+    Checks the tail of the time dimension in the server, requesting the time values
+    from the last known one, and appends the new time steps to the time dimension
+    in place, instead of reloading all the dimensions values. The cost of the request
+    depends on the number of new time steps, not on the length of the dataset. If the
+    last known time value changed in the server, all the dimensions values are reloaded.
+
+    Returns the number of new time steps.
+    """
+    timeDimension = self.dimensions.timeDimension
+    if timeDimension is None:
+      raise Exception("The dataset {} doesn't have a time dimension".format(self.datasetid))
+    knownSize = timeDimension.size
+    query = url_operations.parseQueryItems([ '{}[{}:last]'.format(timeDimension.name, knownSize - 1) ], True, safe='', item_separator=',')
+    # Not cached by urlread, the tail changes between calls
+    rawResponse = urlread.__wrapped__(url_operations.joinURLElements(self.getBaseURL('csvp'), query), auth=self.erddapauth)
+    tailValues = datesToNumArray([ line.strip() for line in rawResponse.text.splitlines()[1:] if line.strip() ])
+    if tailValues.size == 0 or abs(tailValues[0] - timeDimension.data[-1]) > 1e-3:
+      self.loadMetadata(force=True)
+      self.loadDimensionValues(force=True)
+      return max(self.dimensions.timeDimension.size - knownSize, 0)
+    timeDimension.extend(tailValues[1:])
+    return tailValues.size - 1
+
+
+  def _snapshotArrays(self):
+    self.loadDimensionValues()
+    return OrderedDict( (dimName, np.asarray(dObj.data)) for dimName, dObj in self.__dimensions.items() )
+
+
+  def _loadSnapshotArrays(self, arrays):
+    if not arrays:
+      return
+    self.__dimensions = ERDDAP_Griddap_dimensions()
+    for dimName, dimValues in arrays.items():
+      dimensionSeries = pd.Series( data = np.arange(dimValues.size), index = dimValues)
+      dimMeta = self._ERDDAP_Dataset__metadata['dimensions'][dimName]
+      self.__dimensions[dimName] = ERDDAP_Griddap_dimension(dimName, dimensionSeries, metadata=dimMeta)
+
+
+  def getxArray(self, transport=None, variablesPerRequest=None, **kwargs_od):
     """
     Returns an xarray object subset of the ERDDAP dataset current selection query
 
     Arguments:
 
+    `transport` : How the subset is requested, by default the `transport` property
+    of the object ('opendap' unless it's changed):
+
+      - 'opendap' : xarray.open_dataset of the OPeNDAP url, the values are read on demand.
+      - 'nc' : Requests the subset in the .nc format, read in memory.
+      - 'dods' : Requests the subset in the DAP2 .dods binary format, decoded in memory.
+      - 'auto' : Chooses the fastest transport by the estimated size of the subset and
+        the times measured in the previous requests to the server (see
+        `erddapClient.transport_selector.TransportSelector`), the subset is loaded in memory.
+
+    With 'nc', 'dods' and 'auto' the variables values are float, with NaN in the missing values.
+
+    `variablesPerRequest` : Splits the result variables in groups requested concurrently
+    over the same subset, by default the `variablesPerRequest` property of the object
+    (None, a single request). The number of variables of each group, or a list of lists
+    of variables names, the variables not listed are requested alone. The responses
+    are decoded in parallel and merged in a single xarray.Dataset, a wide set of variables
+    takes about the time of its largest group, and each response is smaller than the
+    size limit of the server. The groups are always requested as .dods, whatever the
+    transport, and the values are loaded in memory: the .nc responses are read with
+    the netCDF library under a global lock, that would decode the groups one at a time.
+    If the `transport` property is 'dods' or 'auto', the same transport is used by the
+    requests of `matchup`, `reduce`, the exports and the polygon and wrapped longitude subsets,
+    instead of .nc.
+
     This method will pass all kwargs to the xarray.open_dataset method.
+
+    If the subset was set with `erddapClient.ERDDAP_Griddap.setSubsetPolygon`, the
+    polygon tiles are requested concurrently, and the kwargs are not used. The same
+    for a longitude subset that crosses the longitude boundary of the dataset, the
+    two sides are requested concurrently and stitched with monotonic longitudes, and
+    for the index arrays of `erddapClient.ERDDAP_Griddap.setSubsetI` that need several
+    requests.
+    """
+    transport = transport or self.transport
+    if transport not in self.TRANSPORTS:
+      raise Exception("Invalid transport {}, valid transports: {}".format(transport, ", ".join(self.TRANSPORTS)))
+    if self.__polygon_subset is not None:
+      return self._getPolygonxArray()
+    if self.__sparse_subset is not None:
+      return self._getSparsexArray()
+    if self.__positional_indexes and self._isWrappedSubset(self.__positional_indexes):
+      return self._getWrappedxArray()
+    if self.resultVariables:
+      variables = [ extractVariableName(varName) for varName in self.resultVariables ]
+    else:
+      variables = list(self.variables.keys())
+    variablesGroups = self._variablesGroups(variables, variablesPerRequest or self.variablesPerRequest)
+    if transport == 'opendap' and len(variablesGroups) == 1:
+      return self._getOpendapxArray(**kwargs_od)
+
+    positionalIndexes = self._filledPositionalIndexes(self.__positional_indexes)
+    if len(variablesGroups) > 1:
+      transport = 'dods'
+      _xarray = self._subsetxArray(self._fetchSubset(variables, positionalIndexes, transport, variablesGroups),
+                                   self._subsetCoordinates(positionalIndexes))
+      _xarray.attrs['variable_requests'] = len(variablesGroups)
+    elif transport == 'auto':
+      nBytes = self._estimatedSubsetBytes(variables, positionalIndexes)
+      transport = self.transportSelector.choose(self.erddapurl, nBytes, self._transportCandidates(nBytes, ['nc', 'dods', 'opendap']))
+      startTime = time.perf_counter()
+      if transport == 'opendap':
+        _xarray = self._getOpendapxArray(**kwargs_od).load()
+      else:
+        _xarray = self._subsetxArray(self._fetchSubsetTransport(transport, variables, positionalIndexes),
+                                     self._subsetCoordinates(positionalIndexes))
+      self.transportSelector.record(self.erddapurl, nBytes, transport, time.perf_counter() - startTime)
+    else:
+      _xarray = self._subsetxArray(self._fetchSubsetTransport(transport, variables, positionalIndexes),
+                                   self._subsetCoordinates(positionalIndexes))
+    _xarray.attrs['transport'] = transport
+    return _xarray
+
+
+  def _getOpendapxArray(self, **kwargs_od):
+    """
+    Returns the xarray object of the current subset OPeNDAP url, opened with
+    xarray.open_dataset.
     """
     open_dataset_kwparams = { 'mask_and_scale' : True } # Accept _FillValue, scale_value and add_offset attribute functionality
     open_dataset_kwparams.update(kwargs_od)
@@ -139,9 +304,9 @@ class ERDDAP_Griddap(ERDDAP_Dataset):
     subsetURL = (self.getDataRequestURL(filetype='opendap', useSafeURL=False))
     if self.erddapauth:
       # TODO Add user, password in URL
-      _netcdf4Dataset = Dataset(subsetURL, **kwargs)
+      _netcdf4Dataset = netCDF4.Dataset(subsetURL, **kwargs)
     else:
-      _netcdf4Dataset = Dataset(subsetURL, **kwargs)
+      _netcdf4Dataset = netCDF4.Dataset(subsetURL, **kwargs)
     return _netcdf4Dataset 
 
 
@@ -164,6 +329,11 @@ class ERDDAP_Griddap(ERDDAP_Dataset):
     if resultVariables is None:
       resultVariables = self.resultVariables
 
+    if self.__positional_indexes and self._isWrappedSubset(self.__positional_indexes):
+      raise Exception("The longitude subset crosses the longitude boundary of the dataset, it can't be requested in a single url, use getxArray to request and stitch the two sides")
+    if self.__sparse_subset is not None:
+      raise Exception("The indexes subset needs {} requests, it can't be requested in a single url, use getxArray to request and reassemble them".format(self._sparseRequestsCount()))
+
     if filetype == 'opendap':
       self.loadDimensionValues()
       if self.__positional_indexes:
@@ -201,9 +371,247 @@ class ERDDAP_Griddap(ERDDAP_Dataset):
     ```
     """
     self.__positional_indexes = self.dimensions.subset(*pdims, **kwdims)
+    self.__polygon_subset = None
+    self.__sparse_subset = None
     return self
 
 
+  def setSubsetPolygon(self, geom, maxWaste=0.25, maxTiles=32, minTileCells=4096, **kwdims):
+    """
+    Sets a query subset for griddap request, of the grid cells inside a polygon.
+    The polygon is rasterized on the latitude and longitude values of the dataset,
+    and the cells inside are split in rectangular tiles, that are requested
+    concurrently by `erddapClient.ERDDAP_Griddap.getxArray`, which returns the
+    values outside the polygon masked. The bytes requested of long narrow or
+    irregular regions are close to the polygon area, instead of its bounding box.
+
+    Usage example:
+
+    ```
+    gulf = [(-97.5, 18.0), (-81.0, 23.0), (-82.5, 30.5), (-98.0, 30.0)]
+    dsub = ( remote.setResultVariables(['analysed_sst'])
+                   .setSubsetPolygon(gulf, time="2021-05-20")
+                   .getxArray() )
+    ```
+
+    Arguments:
+
+    `geom` : The polygon, a list of (longitude, latitude) vertices, a list of
+    polygons, a GeoJSON like Polygon or MultiPolygon dictionary, or an object
+    with the `__geo_interface__` property, like the shapely geometries. The
+    longitudes must use the same convention of the dataset (-180 to 180 or 0 to 360).
+
+    `maxWaste` : Maximum fraction of the cells of a tile outside the polygon.
+
+    `maxTiles` : Maximum number of tiles requested.
+
+    `minTileCells` : The tiles with less cells are not split.
+
+    `kwdims` : The subset of the other dimensions, like in `erddapClient.ERDDAP_Griddap.setSubset`.
+    """
+    latName, lonName = self._latLonDimensionNames()
+    if latName in kwdims or lonName in kwdims:
+      raise Exception("The {} and {} subset is defined by the polygon".format(latName, lonName))
+
+    rings = polygonRings(geom)
+    lonDimension, latValues = self.dimensions[lonName], self.dimensions[latName].data
+    lonValues = np.asarray(lonDimension.data, dtype='float64')
+    mask = rasterizePolygon(rings, lonValues, latValues)
+    shift = 0
+    if lonDimension.isGlobalLongitude:
+      # The polygon longitudes can use the other convention, or cross the longitude
+      # boundary of the dataset, the mask is rolled to make the polygon contiguous
+      for lonOffset in [-360, 360]:
+        mask |= rasterizePolygon(rings, lonValues + lonOffset, latValues)
+      shift = seamShift(mask)
+      mask = np.roll(mask, -shift, axis=1)
+    tiles = polygonTiles(mask, maxWaste, maxTiles, minTileCells)
+    if not tiles:
+      raise Exception("The polygon doesn't contain any grid cell of the dataset {}".format(self.datasetid))
+
+    rowStart, rowStop = min(tile[0] for tile in tiles), max(tile[1] for tile in tiles)
+    colStart, colStop = min(tile[2] for tile in tiles), max(tile[3] for tile in tiles)
+    # The longitude slice stop is beyond the dimension size if the polygon wraps around
+    lonStart = (colStart + shift) % lonValues.size
+    # The dimensions not in kwdims are requested whole
+    positionalIndexes = self._filledPositionalIndexes(self.dimensions.subset(**kwdims))
+    positionalIndexes[latName] = slice(rowStart, rowStop)
+    positionalIndexes[lonName] = slice(lonStart, lonStart + colStop - colStart)
+    self.__positional_indexes = positionalIndexes
+    self.__sparse_subset = None
+    self.__polygon_subset = { 'mask' : mask[rowStart:rowStop, colStart:colStop],
+                              'tiles' : [ (r0 - rowStart, r1 - rowStart, c0 - colStart, c1 - colStart) for r0, r1, c0, c1 in tiles ] }
+    return self
+
+
+  def _latLonDimensionNames(self):
+    """
+    Returns the names of the latitude and longitude dimensions, by its
+    _CoordinateAxisType attribute or its name.
+    """
+    latName, lonName = None, None
+    for dimName, dObj in self.dimensions.items():
+      axisType = dObj.metadata.get('_CoordinateAxisType', '')
+      if axisType == 'Lat' or (axisType == '' and dimName in ('latitude', 'lat')):
+        latName = dimName
+      elif axisType == 'Lon' or (axisType == '' and dimName in ('longitude', 'lon')):
+        lonName = dimName
+    if latName is None or lonName is None:
+      raise Exception("The dataset {} doesn't have latitude and longitude dimensions".format(self.datasetid))
+    return latName, lonName
+
+
+  def _getPolygonxArray(self, workers=DEFAULT_WORKERS):
+    """
+    Requests the tiles of the polygon subset concurrently, and returns the
+    xarray.Dataset of the bounding box of the polygon, with the values outside
+    the polygon as NaN, and the `polygon_mask` coordinate.
+    """
+    latName, lonName = self._latLonDimensionNames()
+    if self.resultVariables:
+      variables = [ extractVariableName(varName) for varName in self.resultVariables ]
+    else:
+      variables = list(self.variables.keys())
+    dimNames = list(self.dimensions.keys())
+    boxIndexes = self.__positional_indexes
+    polygonMask, tiles = self.__polygon_subset['mask'], self.__polygon_subset['tiles']
+    boxStart = { latName : boxIndexes[latName].start, lonName : boxIndexes[lonName].start }
+
+    tilesIndexes = []
+    for r0, r1, c0, c1 in tiles:
+      tileIndexes = OrderedDict(boxIndexes)
+      tileIndexes[latName] = slice(boxStart[latName] + r0, boxStart[latName] + r1)
+      tileIndexes[lonName] = slice(boxStart[lonName] + c0, boxStart[lonName] + c1)
+      tilesIndexes.append(tileIndexes)
+    tilesValues = self._fetchWrappedSubsets(variables, tilesIndexes, workers)
+
+    # Place the tiles in the bounding box arrays
+    boxCoords = self._subsetCoordinates(boxIndexes)
+    boxShape = tuple( boxCoords[dimName].size for dimName in dimNames )
+    maskShape = tuple( polygonMask.shape[[latName, lonName].index(dimName)] if dimName in (latName, lonName) else 1 for dimName in dimNames )
+    fullMask = (polygonMask if dimNames.index(latName) < dimNames.index(lonName) else polygonMask.T).reshape(maskShape)
+    dataVars = OrderedDict()
+    for varName in variables:
+      boxValues = np.full(boxShape, np.nan)
+      for (r0, r1, c0, c1), tileValues in zip(tiles, tilesValues):
+        tileSlices = tuple( slice(r0, r1) if dimName == latName else slice(c0, c1) if dimName == lonName else slice(None)
+                            for dimName in dimNames )
+        boxValues[tileSlices] = tileValues[varName]
+      dataVars[varName] = np.where(fullMask, boxValues, np.nan)
+
+    _xarray = self._subsetxArray(dataVars, boxCoords)
+    _xarray = _xarray.assign_coords(polygon_mask=((latName, lonName), polygonMask))
+    _xarray.attrs['tile_requests'] = len(tiles)
+    return _xarray
+
+
+  def _getWrappedxArray(self, workers=DEFAULT_WORKERS):
+    """
+    Requests the two sides of a longitude subset that crosses the longitude
+    boundary of the dataset concurrently, and returns the stitched xarray.Dataset.
+    """
+    if self.resultVariables:
+      variables = [ extractVariableName(varName) for varName in self.resultVariables ]
+    else:
+      variables = list(self.variables.keys())
+    subsetValues = self._fetchWrappedSubsets(variables, [ self.__positional_indexes ], workers)[0]
+    return self._subsetxArray(subsetValues, self._subsetCoordinates(self.__positional_indexes))
+
+
+  def _isWrappedSubset(self, positionalIndexes):
+    """
+    Returns True if a longitude slice of the positional indexes wraps around
+    the longitude boundary, its stop is beyond the dimension size.
+    """
+    return any( dimSlice is not None and dimSlice.stop is not None and dimSlice.stop > self.dimensions[dimName].size
+                for dimName, dimSlice in positionalIndexes.items() )
+
+
+  def _splitWrappedIndexes(self, positionalIndexes):
+    """
+    Returns the list of positional indexes of the parts of a subset, a single
+    part, or two parts if a longitude slice wraps around the longitude boundary.
+    The stride of the slice continues across the boundary.
+    """
+    for dimName, dimSlice in positionalIndexes.items():
+      dimSize = self.dimensions[dimName].size
+      if dimSlice is not None and dimSlice.stop is not None and dimSlice.stop > dimSize:
+        wrappedIdx = np.arange(dimSlice.start, dimSlice.stop, dimSlice.step or 1)
+        parts = []
+        for partIdx in [ wrappedIdx[wrappedIdx < dimSize], wrappedIdx[wrappedIdx >= dimSize] - dimSize ]:
+          if partIdx.size:
+            partIndexes = OrderedDict(positionalIndexes)
+            partIndexes[dimName] = slice(int(partIdx[0]), int(partIdx[-1]) + 1, dimSlice.step)
+            parts.append(partIndexes)
+        return parts
+    return [ positionalIndexes ]
+
+
+  def _fetchWrappedSubsets(self, variables, positionalIndexesList, workers=DEFAULT_WORKERS):
+    """
+    Requests the subsets of a list of dictionaries of dimensions slices concurrently,
+    the subsets that wrap around the longitude boundary are requested in two parts,
+    and stitched.
+    """
+    lonNames = [ dimName for dimName, dObj in self.dimensions.items() if dObj.isLongitude ]
+    lonAxis = list(self.dimensions.keys()).index(lonNames[0]) if lonNames else 0
+    subsetsParts = [ self._splitWrappedIndexes(positionalIndexes) for positionalIndexes in positionalIndexesList ]
+    partsValues = iter(self._fetchSubsets(variables, [ part for parts in subsetsParts for part in parts ], workers))
+    subsetsValues = []
+    for parts in subsetsParts:
+      values = [ next(partsValues) for _ in parts ]
+      subsetsValues.append(OrderedDict( (varName, np.concatenate([ partValues[varName] for partValues in values ], axis=lonAxis))
+                                        for varName in variables ))
+    return subsetsValues
+
+
+  def _subsetCoordinates(self, positionalIndexes):
+    """
+    Returns the dimensions values of a subset. The longitudes of a subset that
+    wraps around the longitude boundary are made monotonic, adding 360 to the
+    values after the boundary, or subtracting 360 to the values before it.
+    """
+    coords = OrderedDict()
+    for dimName, dObj in self.dimensions.items():
+      dimValues = np.asarray(dObj.data)
+      dimSlice = positionalIndexes[dimName]
+      if dimSlice.stop is not None and dimSlice.stop > dObj.size:
+        wrappedIdx = np.arange(dimSlice.start, dimSlice.stop, dimSlice.step or 1)
+        subsetValues = dimValues[wrappedIdx % dObj.size] + 360.0 * (wrappedIdx // dObj.size)
+        if subsetValues.min() >= 180:
+          subsetValues = subsetValues - 360.0
+        coords[dimName] = subsetValues
+      else:
+        coords[dimName] = dimValues[dimSlice]
+    return coords
+
+
+  def _subsetxArray(self, variablesValues, coordsValues):
+    """
+    Returns a xarray.Dataset with the arrays of the variables values and the
+    dimensions values of a subset, with the variables and dimensions attributes.
+    """
+    dimNames = list(self.dimensions.keys())
+    dataVars = OrderedDict()
+    for varName, values in variablesValues.items():
+      varAttributes = { attName : attValue for attName, attValue in self.variables[varName].items() if not attName.startswith('_') }
+      dataVars[varName] = (dimNames, values, varAttributes)
+    return xr.Dataset(dataVars, coords=self._subsetxArrayCoords(coordsValues))
+
+
+  def _subsetxArrayCoords(self, coordsValues):
+    """
+    Returns the xarray coordinates of a dictionary of dimensions values, with
+    the dimensions attributes and the time values as datetime64.
+    """
+    coords = OrderedDict()
+    for dimName, values in coordsValues.items():
+      dimValues = pd.to_datetime(values, unit='s').values if self.dimensions[dimName].isTime else values
+      dimAttributes = { attName : attValue for attName, attValue in self.dimensions[dimName].metadata.items() if not attName.startswith('_') }
+      coords[dimName] = (dimName, dimValues, dimAttributes)
+    return coords
+
+
   def setSubsetI(self, *pdims, **kwdims):
     """
     Sets a query subset for griddap request, by using its positional
@@ -219,11 +627,788 @@ class ERDDAP_Griddap(ERDDAP_Dataset):
                                 longitude=slice(20, 100) )
                    .getxArray() )
     ```
+
+    The index of a dimension can also be a list or array of indexes, or a boolean
+    mask with the size of the dimension, to select non contiguous values, like the
+    12Z step of every day of an hourly dataset, some months of every year, or a list
+    of depth levels. The indexes are compiled to the fewest strided requests (see
+    `erddapClient.index_utils.indexRuns`), a regular pattern is a single request with
+    a stride. If more than one request is needed, or the indexes are not increasing,
+    `erddapClient.ERDDAP_Griddap.getxArray` requests them concurrently, and the
+    values are reassembled in the order of the indexes.
+
+    ```
+    noon = ( remote.setResultVariables(['sst'])
+                   .setSubsetI( time=np.arange(12, remote.dimensions['time'].size, 24),
+                                latitude=slice(10, 150),
+                                longitude=slice(20, 100) )
+                   .getxArray() )
+    ```
+    """
+    dimNames = list(self.dimensions.keys())
+    dimsIndexes = OrderedDict( (dimNames[idx], pdim) for idx, pdim in enumerate(pdims) )
+    dimsIndexes.update(kwdims)
+    indexArrays = OrderedDict( (dimName, self._dimensionIndexes(dimName, dimIndexes))
+                               for dimName, dimIndexes in dimsIndexes.items()
+                               if not isinstance(dimIndexes, slice) and np.ndim(dimIndexes) > 0 )
+    positionalIndexes = self.dimensions.subsetI(**{ dimName : int(dimIndexes) if isinstance(dimIndexes, np.integer) else dimIndexes
+                                                    for dimName, dimIndexes in dimsIndexes.items() if dimName not in indexArrays })
+    self.__polygon_subset = None
+    self.__sparse_subset = None
+    if not indexArrays:
+      self.__positional_indexes = positionalIndexes
+      return self
+
+    # The bytes of each index of a dimension, with the other dimensions subset
+    if self.resultVariables:
+      variables = [ extractVariableName(varName) for varName in self.resultVariables ]
+    else:
+      variables = list(self.variables.keys())
+    boundsIndexes = self._filledPositionalIndexes(positionalIndexes)
+    for dimName, dimIndexes in indexArrays.items():
+      boundsIndexes[dimName] = slice(0, np.unique(dimIndexes).size)
+    sparseSubset = OrderedDict()
+    for dimName, dimIndexes in indexArrays.items():
+      uniqueIndexes = np.unique(dimIndexes)
+      cellIndexes = OrderedDict(boundsIndexes)
+      cellIndexes[dimName] = slice(0, 1)
+      runs = indexRuns(uniqueIndexes, self._estimatedSubsetBytes(variables, cellIndexes), self.REQUEST_OVERHEAD_BYTES)
+      if len(runs) == 1 and uniqueIndexes.size == dimIndexes.size and (dimIndexes.size == 1 or np.all(np.diff(dimIndexes) > 0)):
+        # A single request in the order of the indexes
+        positionalIndexes[dimName] = runs[0]
+      else:
+        sparseSubset[dimName] = { 'indexes' : dimIndexes, 'runs' : runs }
+        positionalIndexes[dimName] = slice(int(uniqueIndexes[0]), int(uniqueIndexes[-1]) + 1)
+
+    if sparseSubset:
+      self.__positional_indexes = self._filledPositionalIndexes(positionalIndexes)
+      self.__sparse_subset = sparseSubset
+    else:
+      self.__positional_indexes = positionalIndexes
+    return self
+
+
+  def _dimensionIndexes(self, dimName, dimIndexes):
+    """
+    Returns the array of non negative indexes of a list of indexes or a boolean
+    mask of a dimension.
+    """
+    dObj = self.dimensions[dimName]
+    dimIndexes = np.asarray(dimIndexes)
+    if dimIndexes.dtype == bool:
+      if dimIndexes.shape != (dObj.size,):
+        raise Exception("The boolean mask of the dimension {} must have its size {}".format(dimName, dObj.size))
+      dimIndexes = np.flatnonzero(dimIndexes)
+    elif dimIndexes.ndim != 1 or not np.issubdtype(dimIndexes.dtype, np.integer):
+      raise Exception("Invalid indexes array for dimension {}".format(dimName))
+    if dimIndexes.size == 0:
+      raise Exception("The indexes of the dimension {} are empty".format(dimName))
+    if dimIndexes.min() < -dObj.size or dimIndexes.max() >= dObj.size:
+      raise Exception("indexes out of bounds for the dimension {} with size {}".format(dimName, dObj.size))
+    return np.where(dimIndexes < 0, dimIndexes + dObj.size, dimIndexes).astype('int64')
+
+
+  def _sparseRequestsCount(self):
+    return int(np.prod([ len(dimSubset['runs']) for dimSubset in self.__sparse_subset.values() ]))
+
+
+  def _getSparsexArray(self, workers=DEFAULT_WORKERS):
+    """
+    Requests the runs of the indexes arrays of the subset concurrently, one request
+    for each combination of the runs of the dimensions, and returns the xarray.Dataset
+    with the values in the order of the indexes.
+    """
+    if self.resultVariables:
+      variables = [ extractVariableName(varName) for varName in self.resultVariables ]
+    else:
+      variables = list(self.variables.keys())
+    dimNames = list(self.dimensions.keys())
+    coordsValues = self._subsetCoordinates(self.__positional_indexes)
+
+    # For each dimension, the runs slices, and the positions in the result and in the run response of its values
+    dimsRuns = OrderedDict()
+    for dimName, dimSlice in self.__positional_indexes.items():
+      if dimName not in self.__sparse_subset:
+        allPositions = np.arange(coordsValues[dimName].size)
+        dimsRuns[dimName] = [ (dimSlice, allPositions, allPositions) ]
+        continue
+      dimIndexes, runs = self.__sparse_subset[dimName]['indexes'], self.__sparse_subset[dimName]['runs']
+      uniqueIndexes = np.unique(dimIndexes)
+      runOf, runOffset = np.full(uniqueIndexes.size, -1), np.zeros(uniqueIndexes.size, dtype='int64')
+      for runIdx, run in enumerate(runs):
+        inRun = (runOf < 0) & (uniqueIndexes >= run.start) & (uniqueIndexes < run.stop) & ((uniqueIndexes - run.start) % (run.step or 1) == 0)
+        runOf[inRun] = runIdx
+        runOffset[inRun] = (uniqueIndexes[inRun] - run.start) // (run.step or 1)
+      uniquePositions = np.searchsorted(uniqueIndexes, dimIndexes)
+      dimsRuns[dimName] = []
+      for runIdx, run in enumerate(runs):
+        resultPositions = np.flatnonzero(runOf[uniquePositions] == runIdx)
+        if resultPositions.size:
+          dimsRuns[dimName].append((run, resultPositions, runOffset[uniquePositions[resultPositions]]))
+      coordsValues[dimName] = np.asarray(self.dimensions[dimName].data)[dimIndexes]
+
+    combinations = list(itertools.product(*dimsRuns.values()))
+    requestsIndexes = [ OrderedDict( (dimName, run) for dimName, (run, _, _) in zip(dimNames, combination) )
+                        for combination in combinations ]
+    requestsValues = self._fetchSubsets(variables, requestsIndexes, workers)
+
+    shape = tuple( coordsValues[dimName].size for dimName in dimNames )
+    # Every position of the result is in a run, unless a dimension has indexes out of the runs
+    needsFill = any( sum(resultPositions.size for _, resultPositions, _ in dimsRuns[dimName]) < coordsValues[dimName].size
+                     for dimName in dimNames )
+    dataVars = OrderedDict()
+    for varName in variables:
+      dtype = np.result_type(*[ requestValues[varName].dtype for requestValues in requestsValues ])
+      if needsFill:
+        values = np.full(shape, np.nan, dtype=np.result_type(dtype, np.float32))
+      else:
+        values = np.empty(shape, dtype=dtype)
+      for combination, requestValues in zip(combinations, requestsValues):
+        resultIndex = np.ix_(*[ resultPositions for _, resultPositions, _ in combination ])
+        requestIndex = np.ix_(*[ requestPositions for _, _, requestPositions in combination ])
+        values[resultIndex] = requestValues[varName][requestIndex]
+      dataVars[varName] = values
+
+    _xarray = self._subsetxArray(dataVars, coordsValues)
+    _xarray.attrs['sparse_requests'] = len(combinations)
+    return _xarray
+
+
+  def reduce(self, dim='time', ops=['mean'], groupby=None, variables=None, ddof=0, chunkBytes=DEFAULT_CHUNK_BYTES, prefetch=1):
+    """
+    Reduces the variables of the current subset along a dimension, like a time mean
+    or a monthly climatology, without loading the whole subset in memory. The subset
+    is requested in chunks along `dim`, of about `chunkBytes` each, and each chunk
+    updates running accumulators and is released before the next one is used, while
+    the next `prefetch` chunks are downloaded in the background.
+
+    Usage example:
+
+    ```
+    climatology = ( remote.setResultVariables(['sst'])
+                          .setSubset(time=slice('2000-01-01', '2019-12-31'),
+                                     latitude=slice(20, 30), longitude=slice(-120, -110))
+                          .reduce('time', ops=['mean', 'std'], groupby='month') )
+    ```
+
+    Arguments:
+
+    `dim` : Name of the dimension to reduce.
+
+    `ops` : List of operations: count, sum, mean, var, std, min, max. The missing values
+    are ignored.
+
+    `groupby` : Optional time grouping of the reduction: month, season, year or dayofyear,
+    the result has a dimension with the groups names.
+
+    `variables` : List of variables names, by default the result variables or all the variables.
+
+    `ddof` : Delta degrees of freedom of var and std.
+
+    Returns a xarray.Dataset with a `<variable>_<operation>` variable for each operation.
+    """
+    if self.__polygon_subset is not None:
+      raise Exception("The reductions of a polygon subset are not supported")
+    if self.__sparse_subset is not None:
+      raise Exception("The reductions of an indexes subset that needs several requests are not supported")
+    for operation in ops:
+      if operation not in REDUCE_OPERATIONS:
+        raise Exception("Invalid reduce operation {}, valid operations: {}".format(operation, ", ".join(REDUCE_OPERATIONS)))
+    if groupby is not None and not self.dimensions[dim].isTime:
+      raise Exception("The reduction can be grouped by {} only along a time dimension".format(groupby))
+    if variables is None:
+      variables = [ extractVariableName(varName) for varName in self.resultVariables ] or list(self.variables.keys())
+    dimNames = list(self.dimensions.keys())
+    axis = dimNames.index(dim)
+    positionalIndexes = self._filledPositionalIndexes(self.__positional_indexes)
+    coordsValues = self._subsetCoordinates(positionalIndexes)
+
+    chunksIndexes = self._chunksIndexes(positionalIndexes, dim, len(variables), chunkBytes)
+
+    groupKeys = np.zeros(coordsValues[dim].size, dtype='int64') if groupby is None else timeGroupKeys(coordsValues[dim], groupby)
+    groups = np.unique(groupKeys)
+    statistics = { varName : { group : RunningStatistics() for group in groups } for varName in variables }
+    fetchChunk = lambda chunkIndexes: self._fetchWrappedSubsets(variables, [ chunkIndexes ])[0]
+    chunkStart = 0
+    for chunkValues in mapPrefetched(fetchChunk, chunksIndexes, prefetch):
+      chunkLength = chunkValues[variables[0]].shape[axis]
+      chunkKeys = groupKeys[chunkStart:chunkStart + chunkLength]
+      chunkStart += chunkLength
+      for varName in variables:
+        for group in np.unique(chunkKeys):
+          groupValues = chunkValues[varName] if groupby is None else np.compress(chunkKeys == group, chunkValues[varName], axis=axis)
+          statistics[varName][group].update(groupValues, axis=axis)
+      del chunkValues
+
+    resultDims = [ dimName for dimName in dimNames if dimName != dim ]
+    coords = self._subsetxArrayCoords(OrderedDict( (dimName, coordsValues[dimName]) for dimName in resultDims ))
+    if groupby is not None:
+      coords[groupby] = (groupby, groups)
+      resultDims = [ groupby ] + resultDims
+    dataVars = OrderedDict()
+    for varName in variables:
+      varAttributes = { attName : attValue for attName, attValue in self.variables[varName].items() if not attName.startswith('_') }
+      for operation in ops:
+        values = np.stack([ statistics[varName][group].result(operation, ddof) for group in groups ])
+        if groupby is None:
+          values = values[0]
+        if operation == 'count':
+          dataVars[varName + '_count'] = (resultDims, values, { 'long_name' : 'Number of values of {}'.format(varName) })
+        else:
+          dataVars[varName + '_' + operation] = (resultDims, values, dict(varAttributes, cell_methods='{}: {}'.format(dim, self.CELL_METHODS[operation])))
+    _xarray = xr.Dataset(dataVars, coords=coords)
+    _xarray.attrs['chunk_requests'] = len(chunksIndexes)
+    return _xarray
+
+
+  def exportNetCDF(self, path, variables=None, chunkBytes=DEFAULT_CHUNK_BYTES, prefetch=2):
+    """
+    Exports the current subset to a local NetCDF4 file, requesting and writing it
+    in chunks along the time dimension, of about `chunkBytes` each, while the next
+    `prefetch` chunks are downloaded concurrently. The time dimension of the file is
+    unlimited, and each chunk is written at its position.
+
+    The completed chunks are recorded in the `<path>.checkpoint.json` file, calling
+    this method again with the same subset resumes the export skipping the completed
+    chunks. A subset with the same start and a later time stop, like the last time of
+    a dataset that was updated, appends the new time steps to the file.
+
+    Arguments:
+
+    `path` : Path of the NetCDF file.
+
+    `variables` : List of variables names, by default the result variables or all the variables.
+
+    `chunkBytes` : Approximate size of each chunk request.
+
+    `prefetch` : Number of chunks downloaded ahead, concurrently.
+
+    Returns the list of the completed chunks, as "start:stop" time indexes.
+    """
+    return self._export(path, 'netcdf', variables, chunkBytes, prefetch)
+
+
+  def exportZarr(self, path, variables=None, chunkBytes=DEFAULT_CHUNK_BYTES, prefetch=2):
+    """
+    Exports the current subset to a local Zarr store, in chunks along the time
+    dimension appended to the store, like `erddapClient.ERDDAP_Griddap.exportNetCDF`,
+    with the same `<path>.checkpoint.json` resume. The steps of a chunk written but
+    not recorded in the checkpoint are removed before resuming.
+
+    This method requires the zarr package.
+
+    Returns the list of the completed chunks, as "start:stop" time indexes.
+    """
+    try:
+      import zarr
+    except ImportError:
+      raise Exception("The zarr package is required to export to Zarr")
+    return self._export(path, 'zarr', variables, chunkBytes, prefetch)
+
+
+  def _export(self, path, storeFormat, variables, chunkBytes, prefetch):
+    """
+    Requests the chunks of the current subset along the time dimension, and
+    writes them in order to a NetCDF file or Zarr store, updating the checkpoint
+    after each chunk.
+    """
+    if self.__polygon_subset is not None:
+      raise Exception("The export of a polygon subset is not supported")
+    if self.__sparse_subset is not None:
+      raise Exception("The export of an indexes subset that needs several requests is not supported")
+    if variables is None:
+      variables = [ extractVariableName(varName) for varName in self.resultVariables ] or list(self.variables.keys())
+    timeName = self.dimensions.timeDimension.name if self.dimensions.timeDimension else list(self.dimensions.keys())[0]
+    positionalIndexes = self._filledPositionalIndexes(self.__positional_indexes)
+    chunksIndexes = self._chunksIndexes(positionalIndexes, timeName, len(variables), chunkBytes)
+    chunksNames = [ '{}:{}'.format(chunkIndexes[timeName].start, chunkIndexes[timeName].stop) for chunkIndexes in chunksIndexes ]
+
+    # The export is identified by everything except the time stop, a later stop appends to it
+    export = { 'format' : storeFormat, 'variables' : variables, 'chunkBytes' : chunkBytes,
+               'subset' : [ [dimSlice.start, dimSlice.stop, dimSlice.step] if dimName != timeName else [dimSlice.start, dimSlice.step]
+                            for dimName, dimSlice in positionalIndexes.items() ] }
+    checkpointPath = path.rstrip('/\\') + '.checkpoint.json'
+    checkpoint = { 'export' : export, 'completed' : [] }
+    if os.path.exists(checkpointPath) and os.path.exists(path):
+      with open(checkpointPath) as f:
+        previousCheckpoint = json.load(f)
+      if previousCheckpoint['export'] != export:
+        raise Exception("The store {} contains a export of a different subset".format(path))
+      checkpoint = previousCheckpoint
+    elif os.path.exists(path):
+      raise Exception("The store {} already exists, and it doesn't have a export checkpoint".format(path))
+
+    # The chunks are written in order, the export resumes from the first chunk not completed
+    firstPending = next(( chunkIdx for chunkIdx, chunkName in enumerate(chunksNames) if chunkName not in checkpoint['completed'] ), len(chunksNames))
+    checkpoint['completed'] = chunksNames[:firstPending]
+    timeOffsets = np.cumsum([0] + [ len(range(chunkIndexes[timeName].start, chunkIndexes[timeName].stop, chunkIndexes[timeName].step or 1))
+                                    for chunkIndexes in chunksIndexes ])
+    if storeFormat == 'zarr' and os.path.exists(path):
+      truncateZarrStore(path, timeName, int(timeOffsets[firstPending]))
+    self._writeCheckpoint(checkpointPath, checkpoint)
+
+    fetchChunk = lambda chunkIndexes: self._fetchWrappedSubsets(variables, [ chunkIndexes ])[0]
+    pendingChunks = chunksIndexes[firstPending:]
+    for chunkIdx, chunkValues in enumerate(mapPrefetched(fetchChunk, pendingChunks, prefetch), firstPending):
+      chunkCoords = self._subsetCoordinates(chunksIndexes[chunkIdx])
+      if storeFormat == 'netcdf':
+        self._writeNetCDFChunk(path, timeName, int(timeOffsets[chunkIdx]), chunkValues, chunkCoords)
+      else:
+        self._writeZarrChunk(path, timeName, int(timeOffsets[chunkIdx]), chunkValues, chunkCoords)
+      del chunkValues
+      checkpoint['completed'].append(chunksNames[chunkIdx])
+      self._writeCheckpoint(checkpointPath, checkpoint)
+    return checkpoint['completed']
+
+
+  def _writeCheckpoint(self, checkpointPath, checkpoint):
+    with open(checkpointPath + '.tmp', 'w') as f:
+      json.dump(checkpoint, f)
+    os.replace(checkpointPath + '.tmp', checkpointPath)
+
+
+  def _exportDataType(self, varName):
+    return 'f8' if self.variables[varName].get('_dataType') == 'double' else 'f4'
+
+
+  def _writeNetCDFChunk(self, path, timeName, timeOffset, variablesValues, coordsValues):
+    """
+    Writes a chunk of the export to the NetCDF file, at the position `timeOffset`
+    of the time dimension, the file is created with the first chunk.
+    """
+    timeSlice = slice(timeOffset, timeOffset + coordsValues[timeName].size)
+    with NETCDF_LOCK:
+      with netCDF4.Dataset(path, 'a' if os.path.exists(path) else 'w') as ncfile:
+        if not ncfile.dimensions:
+          ncfile.setncatts(exportAttributes(self.info))
+          for dimName, dimValues in coordsValues.items():
+            ncfile.createDimension(dimName, None if dimName == timeName else dimValues.size)
+            dimVar = ncfile.createVariable(dimName, 'f8', (dimName,))
+            dimVar.setncatts(exportAttributes(self.dimensions[dimName].metadata))
+            if dimName != timeName:
+              dimVar[:] = dimValues
+          for varName in variablesValues:
+            variable = ncfile.createVariable(varName, self._exportDataType(varName), tuple(coordsValues.keys()),
+                                             zlib=True, fill_value=np.nan)
+            variable.setncatts(exportAttributes(self.variables[varName]))
+        ncfile[timeName][timeSlice] = coordsValues[timeName]
+        timeAxis = list(coordsValues.keys()).index(timeName)
+        for varName, values in variablesValues.items():
+          ncfile[varName][(slice(None),) * timeAxis + (timeSlice,)] = values
+
+
+  def _writeZarrChunk(self, path, timeName, timeOffset, variablesValues, coordsValues):
+    """
+    Appends a chunk of the export to the Zarr store, the store is created with
+    the first chunk.
     """
+    chunkData = self._subsetxArray(OrderedDict( (varName, values.astype(self._exportDataType(varName)))
+                                                for varName, values in variablesValues.items() ), coordsValues)
+    chunkData.attrs = exportAttributes(self.info)
+    for name in chunkData.variables:
+      chunkData[name].attrs = exportAttributes(chunkData[name].attrs)
+    if self.dimensions[timeName].isTime:
+      for attName in ['units', 'calendar']:
+        chunkData[timeName].attrs.pop(attName, None)
+    if timeOffset == 0:
+      encoding = { timeName : { 'units' : ERDDAP_TIME_UNITS, 'dtype' : 'float64' } } if self.dimensions[timeName].isTime else {}
+      chunkData.to_zarr(path, mode='w', encoding=encoding)
+    else:
+      chunkData.to_zarr(path, append_dim=timeName)
+
 
-    self.__positional_indexes = self.dimensions.subsetI(*pdims, **kwdims)
+  def _chunksIndexes(self, positionalIndexes, dim, nVariables, chunkBytes):
+    """
+    Splits the positional indexes of a subset in chunks along a dimension, of
+    about `chunkBytes` each (float64 values), a chunk per request. Returns the
+    list of positional indexes of the chunks.
+    """
+    dimSlice = positionalIndexes[dim]
+    chunkedIdx = np.arange(dimSlice.start, dimSlice.stop, dimSlice.step or 1)
+    stepCells = int(np.prod([ len(range(otherSlice.start, otherSlice.stop, otherSlice.step or 1))
+                              for dimName, otherSlice in positionalIndexes.items() if dimName != dim ]))
+    chunkLength = max(1, chunkBytes // max(8 * nVariables * stepCells, 1))
+    chunksIndexes = []
+    for chunkStart in range(0, chunkedIdx.size, chunkLength):
+      chunkIdx = chunkedIdx[chunkStart:chunkStart + chunkLength]
+      chunkIndexes = OrderedDict(positionalIndexes)
+      chunkIndexes[dim] = slice(int(chunkIdx[0]), int(chunkIdx[-1]) + 1, dimSlice.step)
+      chunksIndexes.append(chunkIndexes)
+    return chunksIndexes
+
+
+  def setOverview(self, maxCells=DEFAULT_OVERVIEW_CELLS, targetShape=None):
+    """
+    Sets the strides of the current subset, or of the whole dataset if there isn't
+    a subset, so each variable has at most `maxCells` cells. The strides are applied
+    by the ERDDAP server, the size of the response doesn't depend on the native
+    resolution of the dataset.
+
+    Usage example:
+
+    ```
+    thumbnail = ( remote.setResultVariables(['analysed_sst'])
+                        .setSubset(time="2021-05-20", latitude=slice(10, 35), longitude=slice(-120, -80))
+                        .setOverview(maxCells=500 * 500)
+                        .getxArray() )
+    ```
+
+    Arguments:
+
+    `maxCells` : Maximum number of cells of the subset. The same stride is applied to the
+    latitude and longitude dimensions, or to all the dimensions if the dataset doesn't
+    have them.
+
+    `targetShape` : Optional dictionary with dimensions names and the number of values
+    wanted in each one, instead of `maxCells`.
+    """
+    if self.__polygon_subset is not None:
+      raise Exception("The overview strides can't be applied to a polygon subset")
+    if self.__sparse_subset is not None:
+      raise Exception("The overview strides can't be applied to an indexes subset that needs several requests")
+    self.__positional_indexes = self._overviewIndexes(self._filledPositionalIndexes(self.__positional_indexes), maxCells, targetShape)
     return self
 
+
+  def overview(self, variables=None, maxCells=DEFAULT_OVERVIEW_CELLS, targetShape=None, pyramid=True, pyramidDir=None, **kwdims):
+    """
+    Returns a xarray.Dataset overview of the variables, of the whole dataset or of the
+    subset of `kwdims` (same arguments of `setSubset`), with at most `maxCells` cells
+    per variable. The strides are applied by the ERDDAP server, see `setOverview`.
+    The current query of the object is not modified.
+
+    With `pyramid`, the strides are rounded up to powers of two, and the overview levels
+    are kept as local files, next to the dataset snapshot (see `saveSnapshot`), by
+    variables and subset. An overview is made from the coarsest level already kept
+    whose strides divide the needed ones, without requesting the server. The pyramid of
+    a dataset is not used after its date_created, history or time_coverage_end
+    attributes change.
+
+    Arguments:
+
+    `variables` : List of variables names, by default the result variables or all the variables.
+
+    `maxCells`, `targetShape` : The size of the overview, see `setOverview`.
+
+    `pyramid` : If True, the local pyramid of overviews is used and updated.
+
+    `pyramidDir` : Optional directory of the snapshots and pyramids, by default `snapshots.SNAPSHOT_DIR`.
+    """
+    if variables is None:
+      variables = [ extractVariableName(varName) for varName in self.resultVariables ] or list(self.variables.keys())
+    positionalIndexes = self._filledPositionalIndexes(self.dimensions.subset(**kwdims))
+    overviewIndexes = self._overviewIndexes(positionalIndexes, maxCells, targetShape, powerOfTwo=pyramid)
+    if not pyramid:
+      variablesValues = self._fetchWrappedSubsets(variables, [ overviewIndexes ])[0]
+      return self._subsetxArray(variablesValues, self._subsetCoordinates(overviewIndexes))
+
+    pyramidKey = hashlib.sha1(json.dumps({ 'variables' : sorted(variables),
+                                           'subset' : [ [dimSlice.start, dimSlice.stop, dimSlice.step] for dimSlice in positionalIndexes.values() ],
+                                           'token' : attributesToken({ attName : self.info.get(attName, '') for attName in TOKEN_ATTRIBUTES }) }).encode('utf-8')).hexdigest()[:16]
+    path = overviewsPath(pyramidDir, self.erddapurl, self.datasetid, pyramidKey)
+    strides = tuple( (overviewIndexes[dimName].step or 1) // (positionalIndexes[dimName].step or 1) for dimName in overviewIndexes )
+    # The coarsest level kept, whose strides divide the needed strides
+    levels = [ level for level in listOverviewLevels(path)
+               if all( stride % levelStride == 0 for stride, levelStride in zip(strides, level) ) ]
+    if levels:
+      level = max(levels, key=lambda level: np.prod(level))
+      levelValues = readOverviewLevel(path, level)
+      subsample = tuple( slice(None, None, stride // levelStride) for stride, levelStride in zip(strides, level) )
+      variablesValues = OrderedDict( (varName, levelValues[varName][subsample]) for varName in variables )
+    else:
+      variablesValues = self._fetchWrappedSubsets(variables, [ overviewIndexes ])[0]
+      writeOverviewLevel(path, strides, variablesValues)
+    return self._subsetxArray(variablesValues, self._subsetCoordinates(overviewIndexes))
+
+
+  def _filledPositionalIndexes(self, positionalIndexes):
+    """
+    Returns the positional indexes with the whole dimension for the missing slices,
+    and non negative starts and stops.
+    """
+    filledIndexes = OrderedDict()
+    for dimName, dObj in self.dimensions.items():
+      dimSlice = positionalIndexes.get(dimName) if positionalIndexes else None
+      if dimSlice is None:
+        filledIndexes[dimName] = slice(0, dObj.size)
+      elif dimSlice.stop is not None and dimSlice.stop > dObj.size:
+        # Wrapped longitude subset, already non negative
+        filledIndexes[dimName] = dimSlice
+      else:
+        start, stop, step = dimSlice.indices(dObj.size)
+        filledIndexes[dimName] = slice(start, stop, dimSlice.step)
+    return filledIndexes
+
+
+  def _overviewIndexes(self, positionalIndexes, maxCells, targetShape=None, powerOfTwo=False):
+    """
+    Returns the positional indexes with the overview strides, multiplied to the
+    slices steps.
+    """
+    counts = OrderedDict( (dimName, len(range(dimSlice.start, dimSlice.stop, dimSlice.step or 1)))
+                          for dimName, dimSlice in positionalIndexes.items() )
+    if targetShape is None:
+      try:
+        stridedDims = list(self._latLonDimensionNames())
+      except Exception:
+        stridedDims = list(counts.keys())
+    else:
+      stridedDims = list(targetShape.keys())
+    strides = overviewStrides(counts, maxCells, stridedDims, targetShape, powerOfTwo)
+    return OrderedDict( (dimName, slice(dimSlice.start, dimSlice.stop, (dimSlice.step or 1) * strides[dimName])
+                                  if strides[dimName] > 1 or dimSlice.step else dimSlice)
+                        for dimName, dimSlice in positionalIndexes.items() )
+
+
+  def matchup(self, variables=None, window=0, maxBytes=DEFAULT_MATCHUP_BYTES, workers=DEFAULT_WORKERS, **coordinates):
+    """
+    Samples the griddap variables at a list of points, like the locations of
+    tabledap observations. The points coordinates are mapped to the closest
+    grid indexes in a single vectorized pass over the dimensions, the points
+    are clustered in bounding subsets with an estimated size under `maxBytes`,
+    the subsets are requested concurrently and the values are gathered back
+    in the order of the points.
+
+    Usage example:
+
+    ```
+    obs = buoys.getDataFrame(parse_dates=['time (UTC)'])
+    matched = remote.matchup(['analysed_sst'],
+                             time=obs['time (UTC)'],
+                             latitude=obs['latitude (degrees_north)'],
+                             longitude=obs['longitude (degrees_east)'])
+    ```
+
+    Arguments:
+
+    `variables` : List of the variables names to sample. By default all the variables.
+
+    `window` : Half size, in grid cells, of the neighborhood sampled around each point,
+    an integer for all the dimensions, or a dictionary with dimension names and sizes.
+
+    `maxBytes` : Maximum estimated size of each subset request.
+
+    `workers` : Number of concurrent requests.
+
+    `coordinates` : The dimensions names and the arrays of the points coordinates,
+    or a single value for all the points. The time coordinates can be datetimes,
+    ISO 8601 strings or seconds since 1970.
+
+    Returns a xarray.Dataset with the `obs` dimension, the sampled variables, and the
+    closest grid coordinates and indexes of each point. The values of the points outside
+    the grid are NaN, and their indexes -1. When a `window` is used, the variables have
+    a `<dimension>_offset` dimension for each dimension with a neighborhood.
+    """
+    self.loadMetadata()
+    variables = list(self.variables.keys()) if variables is None else list(variables)
+    dimNames = list(self.dimensions.keys())
+    missingDims = [ dimName for dimName in dimNames if dimName not in coordinates ]
+    if missingDims:
+      raise Exception("The coordinates of the dimensions ({}) are required".format(", ".join(missingDims)))
+    unknownDims = [ dimName for dimName in coordinates if dimName not in dimNames ]
+    if unknownDims:
+      raise Exception("({}) are not dimensions of the dataset {}".format(", ".join(unknownDims), self.datasetid))
+    windows = window if isinstance(window, dict) else dict.fromkeys(dimNames, window)
+    halfWindows = np.array([ int(windows.get(dimName, 0)) for dimName in dimNames ])
+
+    # Closest grid indexes of the points, the scalar coordinates are used for all the points
+    coordinatesArrays = [ np.atleast_1d(np.asarray(coordinates[dimName])).ravel() for dimName in dimNames ]
+    nPoints = max(coordinatesArray.size for coordinatesArray in coordinatesArrays)
+    pointsIndexes = np.empty((len(dimNames), nPoints), dtype='int64')
+    for dimOrder, (dimName, coordinatesArray) in enumerate(zip(dimNames, coordinatesArrays)):
+      if coordinatesArray.size not in (1, nPoints):
+        raise Exception("The coordinates of {} have {} values, expected {}".format(dimName, coordinatesArray.size, nPoints))
+      pointsIndexes[dimOrder] = self.dimensions[dimName].closestIdxArray(coordinatesArray)
+    validPoints = (pointsIndexes >= 0).all(axis=0)
+
+    # The points in the same grid cell are sampled once
+    dimSizes = np.array([ self.dimensions[dimName].size for dimName in dimNames ])
+    cellsIds, cellsInverse = np.unique(np.ravel_multi_index(tuple(pointsIndexes[:, validPoints]), tuple(dimSizes)), return_inverse=True)
+    cells = np.array(np.unravel_index(cellsIds, tuple(dimSizes))).reshape(len(dimNames), -1)
+    cellsInverse = cellsInverse.reshape(-1)
+    cellBytes = sum( ERDDAP_DATATYPE_SIZES.get(self.variables[varName].get('_dataType'), 8) for varName in variables )
+    subsets = boundingSubsets(cells, halfWindows, dimSizes, cellBytes, maxBytes) if cells.shape[1] else []
+
+    subsetsValues = self._fetchSubsets(variables, [ OrderedDict( (dimName, slice(int(start), int(stop) + 1))
+                                                                 for dimName, start, stop in zip(dimNames, subsetStart, subsetStop) )
+                                                    for subsetStart, subsetStop, _ in subsets ], workers)
+
+    # Gather the values of each cell, and its neighborhood, from the subsets
+    offsets = np.meshgrid(*[ np.arange(-hw, hw + 1) for hw in halfWindows ], indexing='ij')
+    cellsValues = OrderedDict( (varName, np.full((cells.shape[1],) + offsets[0].shape, np.nan)) for varName in variables )
+    for (subsetStart, subsetStop, cellsPositions), subsetValues in zip(subsets, subsetsValues):
+      localIndexes = [ (cells[dimOrder, cellsPositions] - subsetStart[dimOrder]).reshape((-1,) + (1,) * len(dimNames)) + offsets[dimOrder]
+                       for dimOrder in range(len(dimNames)) ]
+      inside = np.logical_and.reduce([ (localIdx >= 0) & (localIdx <= subsetStop[dimOrder] - subsetStart[dimOrder])
+                                       for dimOrder, localIdx in enumerate(localIndexes) ])
+      clippedIndexes = tuple( np.clip(localIdx, 0, subsetStop[dimOrder] - subsetStart[dimOrder])
+                              for dimOrder, localIdx in enumerate(localIndexes) )
+      for varName in variables:
+        cellsValues[varName][cellsPositions] = np.where(inside, subsetValues[varName][clippedIndexes], np.nan)
+
+    windowDims = [ dimName for dimName, hw in zip(dimNames, halfWindows) if hw > 0 ]
+    windowShape = tuple( 2 * hw + 1 for hw in halfWindows if hw > 0 )
+    dataVars = OrderedDict()
+    for varName in variables:
+      pointsValues = np.full((nPoints,) + offsets[0].shape, np.nan)
+      pointsValues[validPoints] = cellsValues[varName][cellsInverse]
+      varAttributes = { attName : attValue for attName, attValue in self.variables[varName].items() if not attName.startswith('_') }
+      dataVars[varName] = (('obs',) + tuple(dimName + '_offset' for dimName in windowDims),
+                           pointsValues.reshape((nPoints,) + windowShape), varAttributes)
+
+    coords = OrderedDict([ ('obs', np.arange(nPoints)) ])
+    for dimOrder, dimName in enumerate(dimNames):
+      gridValues = np.full(nPoints, np.nan)
+      gridValues[validPoints] = np.asarray(self.dimensions[dimName].data, dtype='float64')[pointsIndexes[dimOrder, validPoints]]
+      coords[dimName] = ('obs', pd.to_datetime(gridValues, unit='s').values if self.dimensions[dimName].isTime else gridValues)
+      coords[dimName + '_index'] = ('obs', pointsIndexes[dimOrder])
+    for dimName, hw in zip(dimNames, halfWindows):
+      if hw > 0:
+        coords[dimName + '_offset'] = np.arange(-hw, hw + 1)
+
+    matchupDataset = xr.Dataset(dataVars, coords=coords)
+    matchupDataset.attrs['subset_requests'] = len(subsets)
+    return matchupDataset
+
+
+  def _fetchSubsets(self, variables, positionalIndexesList, workers=DEFAULT_WORKERS):
+    """
+    Requests the subsets of a list of dictionaries of dimensions slices concurrently.
+    """
+    return mapConcurrently(lambda positionalIndexes: self._fetchSubset(variables, positionalIndexes),
+                           positionalIndexesList, workers)
+
+
+  def _fetchSubset(self, variables, positionalIndexes, transport=None, variablesGroups=None):
+    """
+    Requests the subset of the variables defined by a dictionary of dimensions
+    slices, read in memory. Returns a dictionary with the variables names and the
+    float arrays of the values, with NaN in the missing values.
+
+    The subset is requested in the .nc format, or in the .dods format if the
+    `transport` property is 'dods'. If it's 'auto', the transport is chosen and
+    measured by the `transportSelector`. If the variables are split in groups
+    (the `variablesPerRequest` property), the groups are requested concurrently
+    as .dods, decoded in parallel (the .nc responses are read under NETCDF_LOCK).
+    """
+    transport = transport or self.transport
+    if variablesGroups is None:
+      variablesGroups = self._variablesGroups(variables, self.variablesPerRequest)
+    if len(variablesGroups) == 1:
+      return self._fetchSubsetVariables('dods' if transport == 'dods' else transport if transport == 'auto' else 'nc',
+                                        variables, positionalIndexes)
+    groupsValues = mapConcurrently(lambda group: self._fetchSubsetTransport('dods', group, positionalIndexes),
+                                   variablesGroups, DEFAULT_WORKERS)
+    variablesValues = { varName : values for groupValues in groupsValues for varName, values in groupValues.items() }
+    return OrderedDict( (varName, variablesValues[varName]) for varName in variables )
+
+
+  def _fetchSubsetVariables(self, transport, variables, positionalIndexes):
+    """
+    Requests the subset of the variables in a single request with the 'nc' or
+    'dods' transport, or the transport chosen by the `transportSelector` if it's 'auto'.
+    """
+    if transport != 'auto':
+      return self._fetchSubsetTransport(transport, variables, positionalIndexes)
+    nBytes = self._estimatedSubsetBytes(variables, positionalIndexes)
+    transport = self.transportSelector.choose(self.erddapurl, nBytes, self._transportCandidates(nBytes, ['nc', 'dods']))
+    startTime = time.perf_counter()
+    variablesValues = self._fetchSubsetTransport(transport, variables, positionalIndexes)
+    self.transportSelector.record(self.erddapurl, nBytes, transport, time.perf_counter() - startTime)
+    return variablesValues
+
+
+  def _variablesGroups(self, variables, variablesPerRequest):
+    """
+    Returns the list of groups of the variables requested concurrently, by the
+    number of variables of each group, or a list of lists of variables names.
+    """
+    if not variablesPerRequest:
+      return [ variables ]
+    if isinstance(variablesPerRequest, int):
+      return [ variables[idx:idx + variablesPerRequest] for idx in range(0, len(variables), variablesPerRequest) ]
+    groups = [ [ varName for varName in group if varName in variables ] for group in variablesPerRequest ]
+    groupedVariables = set( varName for group in groups for varName in group )
+    groups += [ [ varName ] for varName in variables if varName not in groupedVariables ]
+    return [ group for group in groups if group ]
+
+
+  def _fetchSubsetTransport(self, transport, variables, positionalIndexes):
+    """
+    Requests the subset of the variables with the 'nc' or 'dods' transport.
+    """
+    if transport == 'dods':
+      return self._fetchSubsetDods(variables, positionalIndexes)
+    return self._fetchSubsetNetCDF(variables, positionalIndexes)
+
+
+  def _estimatedSubsetBytes(self, variables, positionalIndexes):
+    """
+    Returns the estimated size in bytes of the subset of the variables, by
+    their data types.
+    """
+    cells = int(np.prod([ len(range(dimSlice.start, dimSlice.stop, dimSlice.step or 1)) for dimSlice in positionalIndexes.values() ]))
+    return cells * sum( ERDDAP_DATATYPE_SIZES.get(self.variables[varName].get('_dataType'), 8) for varName in variables )
+
+
+  def _transportCandidates(self, nBytes, transports):
+    """
+    Returns the transports available, in order of preference before they are
+    measured: the small subsets are requested as .dods, a single request without
+    file, and the bigger ones as .nc. The .nc transport requires a netCDF library
+    that opens files in memory.
+    """
+    if not getattr(netCDF4, '__has_nc_open_mem__', True):
+      transports = [ transport for transport in transports if transport != 'nc' ]
+    preferred = 'dods' if nBytes <= self.SMALL_SUBSET_BYTES else 'nc'
+    return sorted(transports, key=lambda transport: transport != preferred)
+
+
+  def _fetchSubsetDods(self, variables, positionalIndexes):
+    """
+    Requests the subset of the variables in the DAP2 .dods binary format, the
+    response is decoded in memory, and the missing values and packing attributes
+    of the variables are applied.
+    """
+    dapIndexing = self._convertPositionalIndexes2DapQuery(positionalIndexes)
+    query = url_operations.parseQueryItems([ varName + dapIndexing for varName in variables ], True, safe='', item_separator=',')
+    subsetURL = url_operations.joinURLElements(self.getBaseURL('dods'), query)
+    # Not cached by urlread, the subsets are used once
+    rawResponse = urlread.__wrapped__(subsetURL, auth=self.erddapauth)
+    # The first array of each grid is the variable, the rest are the maps
+    decodedArrays = OrderedDict()
+    for name, values in decodeDods(rawResponse.content):
+      decodedArrays.setdefault(name, values)
+    variablesValues = OrderedDict()
+    for varName in variables:
+      rawValues = decodedArrays[varName]
+      varAttributes = self.variables[varName]
+      values = rawValues.astype('float64')
+      for attName in ('_FillValue', 'missing_value'):
+        if attName in varAttributes:
+          for missingValue in np.atleast_1d(varAttributes[attName]):
+            values[rawValues == missingValue] = np.nan
+      values = values * varAttributes.get('scale_factor', 1.0) + varAttributes.get('add_offset', 0.0)
+      variablesValues[varName] = values
+    return variablesValues
+
+
+  def _fetchSubsetNetCDF(self, variables, positionalIndexes):
+    """
+    Requests the subset of the variables in the .nc format, the response is read
+    in memory.
+    """
+    dapIndexing = self._convertPositionalIndexes2DapQuery(positionalIndexes)
+    query = url_operations.parseQueryItems([ varName + dapIndexing for varName in variables ], True, safe='', item_separator=',')
+    subsetURL = url_operations.joinURLElements(self.getBaseURL('nc'), query)
+    # Not cached by urlread, the subsets are used once
+    rawResponse = urlread.__wrapped__(subsetURL, auth=self.erddapauth)
+    with NETCDF_LOCK:
+      with netCDF4.Dataset('{}.nc'.format(self.datasetid), memory=rawResponse.content) as ncDataset:
+        return OrderedDict( (varName, np.ma.filled(np.ma.asarray(ncDataset[varName][:]).astype('float64'), np.nan))
+                            for varName in variables )
+
+
   def _parseResultVariablesExtendedDapQueryToValidDap(self, resultVariables):
 
     """
@@ -326,12 +1511,13 @@ class ERDDAP_Griddap(ERDDAP_Dataset):
     return parsedResultVariables
 
 
-  def _convertPositionalIndexes2DapQuery(self):
+  def _convertPositionalIndexes2DapQuery(self, positionalIndexes=None):
     """
     This function will convert the positional_indexes dictionary of slices, to a string
     query type, compatible with the opendap protocol.
 
-    The property __positional_indexes will contain the slices for each dimension in a dict.
+    The property __positional_indexes will contain the slices for each dimension in a dict,
+    other dictionary of slices can be converted with the `positionalIndexes` argument.
 
     OrderedDict([('time', slice(200, 201, None)),
              ('altitude', slice(0, 1, None)),
@@ -350,11 +1536,14 @@ class ERDDAP_Griddap(ERDDAP_Dataset):
     def parseNegativeIndex(nidx, dref):
       return nidx if nidx >= 0 else dref.size + nidx
 
-    if self.__positional_indexes is None or all(dimSlice is None for dimName, dimSlice in self.__positional_indexes.items()):
+    if positionalIndexes is None:
+      positionalIndexes = self.__positional_indexes
+
+    if positionalIndexes is None or all(dimSlice is None for dimName, dimSlice in positionalIndexes.items()):
       return ""
     
     validDapIndexing = ""
-    for dimName, dimSlice in self.__positional_indexes.items():
+    for dimName, dimSlice in positionalIndexes.items():
       if dimSlice is None:
         raise Exception("Not a valid slice available for dimension: {} ".format(dimName))
       if not dimSlice.step is None:
@@ -428,9 +1617,145 @@ class ERDDAP_Griddap(ERDDAP_Dataset):
     if not hasattr(self,'__netcdf4Dataset'):      
       if self.erddapauth:
         # TODO Add user, password in URL
-        self.__netcdf4Dataset = Dataset(self.getBaseURL('opendap'))
+        self.__netcdf4Dataset = netCDF4.Dataset(self.getBaseURL('opendap'))
       else:
-        self.__netcdf4Dataset = Dataset(self.getBaseURL('opendap'))
+        self.__netcdf4Dataset = netCDF4.Dataset(self.getBaseURL('opendap'))
     return self.__netcdf4Dataset    
 
 
+
+
+def boundingSubsets(cells, halfWindows, dimSizes, cellBytes, maxBytes):
+  """
+  Clusters grid cells in bounding subsets with an estimated size under maxBytes.
+  The cells bounding box is split by recursive bisection at the median index of
+  its widest dimension, until each subset size fits.
+
+  Arguments:
+
+  `cells` : Array of the grid indexes of the cells, with shape (dimensions, cells).
+
+  `halfWindows` : Array with the neighborhood half size of each dimension, added to the subsets.
+
+  `dimSizes` : Array with the size of each dimension, to clip the subsets.
+
+  `cellBytes` : Size in bytes of a grid cell of the requested variables.
+
+  `maxBytes` : Maximum size of a subset, a single cell neighborhood is never split.
+
+  Returns a list of tuples with the start and stop (inclusive) indexes arrays of
+  each subset, and the positions of its cells.
+  """
+  subsets = []
+  pending = [ np.arange(cells.shape[1]) ]
+  while pending:
+    positions = pending.pop()
+    subsetCells = cells[:, positions]
+    subsetStart = np.maximum(subsetCells.min(axis=1) - halfWindows, 0)
+    subsetStop = np.minimum(subsetCells.max(axis=1) + halfWindows, dimSizes - 1)
+    subsetExtent = subsetStop - subsetStart + 1
+    if np.prod(subsetExtent.astype('float64')) * cellBytes <= maxBytes or positions.size == 1:
+      subsets.append((subsetStart, subsetStop, positions))
+      continue
+
+    lowerHalf = None
+    for dimOrder in np.argsort(-subsetExtent, kind='stable'):
+      median = np.median(subsetCells[dimOrder])
+      lowerHalf = subsetCells[dimOrder] <= median
+      if lowerHalf.all():
+        lowerHalf = subsetCells[dimOrder] < median
+      if lowerHalf.any():
+        break
+      lowerHalf = None
+    if lowerHalf is None:
+      # All the cells are the same, the neighborhood is bigger than maxBytes
+      subsets.append((subsetStart, subsetStop, positions))
+      continue
+    pending.extend([ positions[~lowerHalf], positions[lowerHalf] ])
+
+  return subsets
+
+
+def overviewStrides(counts, maxCells, stridedDims, targetShape=None, powerOfTwo=False):
+  """
+  Returns the stride of each dimension of an overview.
+
+  Arguments:
+
+  `counts` : Dictionary with the dimensions names and its number of values in the subset.
+
+  `maxCells` : Maximum number of cells of the overview, the same stride is applied to
+  the `stridedDims` dimensions, the other dimensions keep all its values.
+
+  `targetShape` : Optional dictionary with dimensions names and the number of values
+  wanted, instead of `maxCells`, the stride is ceil(count / target).
+
+  `powerOfTwo` : If True, the strides are rounded up to powers of two.
+  """
+  strides = OrderedDict( (dimName, 1) for dimName in counts )
+  if targetShape is not None:
+    for dimName, target in targetShape.items():
+      strides[dimName] = max(1, -(-counts[dimName] // max(1, int(target))))
+  else:
+    fixedCells = int(np.prod([ count for dimName, count in counts.items() if dimName not in stridedDims ]))
+    stridedCounts = [ counts[dimName] for dimName in stridedDims ]
+    cells = lambda stride: fixedCells * int(np.prod([ -(-count // stride) for count in stridedCounts ]))
+    # Starts from the stride of the continuous approximation, ceil(count / stride) may need a bigger one
+    stride = max(1, int((cells(1) / float(maxCells)) ** (1.0 / len(stridedCounts)))) if stridedCounts else 1
+    while cells(stride) > maxCells and stride < max(stridedCounts):
+      stride += 1
+    for dimName in stridedDims:
+      strides[dimName] = stride
+  if powerOfTwo:
+    strides = OrderedDict( (dimName, 1 << (stride - 1).bit_length()) for dimName, stride in strides.items() )
+  return strides
+
+
+def timeGroupKeys(timeValues, groupby):
+  """
+  Returns the array of the groups keys of time values, in seconds since 1970.
+  The `groupby` options are month, season (DJF, MAM, JJA or SON), year and dayofyear.
+  """
+  times = pd.to_datetime(np.asarray(timeValues), unit='s')
+  if groupby == 'month':
+    return np.asarray(times.month)
+  elif groupby == 'season':
+    return np.array(['DJF', 'DJF', 'MAM', 'MAM', 'MAM', 'JJA', 'JJA', 'JJA', 'SON', 'SON', 'SON', 'DJF'])[np.asarray(times.month) - 1]
+  elif groupby == 'year':
+    return np.asarray(times.year)
+  elif groupby == 'dayofyear':
+    return np.asarray(times.dayofyear)
+  raise Exception("Invalid groupby {}, valid options: month, season, year, dayofyear".format(groupby))
+
+
+def exportAttributes(attributes):
+  """
+  Returns the attributes that can be written to NetCDF and Zarr files: strings,
+  numbers and lists of numbers, without the internal attributes (names starting
+  with an underscore) and the packing attributes of the already unpacked values.
+  """
+  exported = OrderedDict()
+  for attName, attValue in attributes.items():
+    if attName.startswith('_') or attName in ('scale_factor', 'add_offset', 'missing_value'):
+      continue
+    if isinstance(attValue, bool):
+      attValue = str(attValue).lower()
+    if isinstance(attValue, (str, int, float)) or \
+       (isinstance(attValue, (list, tuple)) and attValue and all( isinstance(v, (int, float)) and not isinstance(v, bool) for v in attValue )):
+      exported[attName] = list(attValue) if isinstance(attValue, tuple) else attValue
+  return exported
+
+
+def truncateZarrStore(path, dimName, size):
+  """
+  Resizes the arrays of a Zarr store written by xarray along a dimension, removing
+  the values after `size`.
+  """
+  import zarr
+  storeDims = { name : variable.dims for name, variable in xr.open_zarr(path).variables.items() }
+  group = zarr.open_group(path, mode='r+')
+  for name, dims in storeDims.items():
+    if dimName in dims and group[name].shape[dims.index(dimName)] > size:
+      shape = list(group[name].shape)
+      shape[dims.index(dimName)] = size
+      group[name].resize(tuple(shape))
@@ -1,8 +1,12 @@
 from collections import OrderedDict 
 from erddapClient.formatting import erddap_dimensions_str, erddap_dimension_str
-from erddapClient.parse_utils import iso8601STRtoNum, numtodate, dttonum
+from erddapClient.parse_utils import iso8601STRtoNum, numtodate, dttonum, datesToNumArray
+from erddapClient.lazy_imports import lazyImport
 import datetime as dt
 
+np = lazyImport('numpy')
+pd = lazyImport('pandas')
+
 
 class ERDDAP_Griddap_dimensions(OrderedDict):
   """
@@ -91,6 +95,11 @@ class ERDDAP_Griddap_dimensions(OrderedDict):
     { time : slice(0:10), depth : slice(0:1), latitude: slice(0:100), longitude : slice(0:200) }
     ```
 
+    The longitudes are converted to the convention of the dimension values (-180 to 180
+    or 0 to 360). If the longitude dimension covers the 360 degrees, a slice that crosses
+    the longitude boundary of the values, like `longitude=slice(170, -170)`, returns
+    a slice with the stop beyond the dimension size, `slice(start, stop + size)`.
+
     """
 
     def parseSlice(sobj, dref):
@@ -116,6 +125,14 @@ class ERDDAP_Griddap_dimensions(OrderedDict):
 
       if estart is None:
         return slice(estop, estop + 1)     # +1 to make it a valid integer index for python
+      elif dref.isGlobalLongitude and estop == estart and abs(float(sobj.stop) - float(sobj.start)) >= 180:
+        # The 360 degrees, starting from the start longitude
+        return slice(estart, estart + dref.size, estep)
+      elif dref.isGlobalLongitude and estop < estart:
+        # The slice crosses the longitude boundary of the dimension values, a stop
+        # beyond the dimension size marks the wrap around, the subset is requested
+        # in two parts by ERDDAP_Griddap
+        return slice(estart, estop + 1 + dref.size, estep)
       else:
         return slice(estart, estop + 1, estep)
 
@@ -176,7 +193,7 @@ class ERDDAP_Griddap_dimension:
     contains a time dimension, this parameter can be a valid ISO 86091 string
     or datetime.
 
-    `method` : The argument passed to pandas index.get_loc method
+    `method` : The argument passed to pandas index.get_indexer method
     that returns the closest value index.
     """
 
@@ -184,6 +201,8 @@ class ERDDAP_Griddap_dimension:
       value = iso8601STRtoNum(value)
     elif isinstance(value, dt.datetime):
       value = dttonum(value)
+    elif self.isLongitude:
+      value = self.normalizeLongitude(value)
 
     if self.isTime:
       rangemin = dttonum(self.metadata['actual_range'][0])
@@ -192,9 +211,70 @@ class ERDDAP_Griddap_dimension:
       rangemin = self.metadata['actual_range'][0]
       rangemax = self.metadata['actual_range'][1]
     if value > rangemax or value < rangemin:
+      if self.isGlobalLongitude:
+        # In the gap between the last and first longitude values
+        return 0 if value < rangemin else self.size - 1
       return None
-    idx = self.values.index.get_loc(value, method=method)
-    return idx
+    idx = self.values.index.get_indexer([value], method=method)[0]
+    return int(idx)
+
+  def closestIdxArray(self, values, method='nearest'):
+    """
+    Returns an integer array with the indexes that match the closest
+    values in the dimension values, in a single vectorized lookup. The
+    values outside the dimension range, or NaN, get the index -1.
+
+    Arguments:
+
+    `values` : Array of the values to search in the dimension values. For
+    the time dimension, the values can be datetimes, numpy datetime64,
+    ISO 8601 strings or seconds since 1970.
+
+    `method` : The argument passed to pandas index.get_indexer method.
+    """
+    values = datesToNumArray(values) if self.isTime else np.asarray(values, dtype='float64')
+    if self.isLongitude:
+      values = self.normalizeLongitude(values)
+    dimValues = np.asarray(self.data, dtype='float64')
+    valid = np.isfinite(values) & (values >= dimValues.min()) & (values <= dimValues.max())
+    idxs = np.full(values.shape, -1, dtype='int64')
+    idxs[valid] = self.values.index.get_indexer(values[valid], method=method)
+    if self.isGlobalLongitude:
+      # In the gap between the last and first longitude values
+      idxs[np.isfinite(values) & (values < dimValues[0])] = 0
+      idxs[np.isfinite(values) & (values > dimValues[-1])] = self.size - 1
+    return idxs
+
+  def normalizeLongitude(self, value):
+    """
+    Returns the longitude value, or array of values, converted to the convention
+    of the dimension values, -180 to 180 or 0 to 360.
+    """
+    dimValues = np.asarray(self.data, dtype='float64')
+    if dimValues.max() > 180:
+      return np.where(value < 0, value + 360, value) if np.ndim(value) else (value + 360 if value < 0 else value)
+    if dimValues.min() < 0:
+      return np.where(value > 180, value - 360, value) if np.ndim(value) else (value - 360 if value > 180 else value)
+    return value
+
+  def extend(self, newValues):
+    """
+    Appends values at the end of the dimension in place, like the new time steps
+    of a near real time dataset, and updates the actual_range attribute.
+
+    Arguments:
+
+    `newValues` : Array of the new values, in seconds since 1970 for the time dimension.
+    """
+    newValues = np.asarray(newValues, dtype='float64')
+    if newValues.size == 0:
+      return self
+    newSeries = pd.Series( data = np.arange(self.size, self.size + newValues.size), index = newValues)
+    self.values = pd.concat([ self.values, newSeries ])
+    if 'actual_range' in self.metadata:
+      rangeStop = numtodate(newValues.max()) if self.isTime else float(newValues.max())
+      self.metadata['actual_range'] = (self.metadata['actual_range'][0], max(self.metadata['actual_range'][1], rangeStop))
+    return self
 
   @property
   def info(self):
@@ -223,6 +303,22 @@ class ERDDAP_Griddap_dimension:
   def isTime(self):
     return self.name == 'time'
 
+  @property
+  def isLongitude(self):
+    return self.metadata.get('_CoordinateAxisType') == 'Lon' or self.name in ('longitude', 'lon')
+
+  @property
+  def isGlobalLongitude(self):
+    """
+    Returns True for the longitude dimensions with increasing values that cover
+    the 360 degrees, where the subsets can wrap around the longitude boundary.
+    """
+    if not self.isLongitude or self.size < 2:
+      return False
+    dimValues = np.asarray(self.data, dtype='float64')
+    spacing = np.abs(np.diff(dimValues)).max()
+    return bool(dimValues[-1] > dimValues[0] and dimValues[-1] - dimValues[0] + 1.5 * spacing >= 360)
+
   @property
   def range(self):
     if 'actual_range' in self.metadata:
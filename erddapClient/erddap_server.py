@@ -3,7 +3,9 @@ from urllib.parse import quote_plus
 from erddapClient import url_operations
 from erddapClient.formatting import erddap_search_results_repr, erddap_server_repr
 from erddapClient.parse_utils import parseConstraintDateTime, parseERDDAPStatusPage, parseNumericVersion
-from erddapClient.remote_requests import urlread
+from erddapClient.remote_requests import urlread, isEmptyResultError, mapConcurrently, DEFAULT_WORKERS
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import OrderedDict
 from erddapClient.erddap_dataset import ERDDAP_Dataset
 from erddapClient.erddap_tabledap import ERDDAP_Tabledap
 from erddapClient.erddap_griddap import ERDDAP_Griddap
@@ -74,7 +76,7 @@ class ERDDAP_Server:
         return self.__version_string
 
 
-    def search(self, **filters):
+    def search(self, request_kwargs={}, **filters):
         """
         Makes a search request to the ERDDAP Server
 
@@ -117,13 +119,15 @@ class ERDDAP_Server:
         `page` : If the number of results is bigger than the "`itemsPerPage`" you can
                 specify the page of results. (Default: 1)
 
+        `request_kwargs` : Dictionary with the arguments of the request, i.e. {'timeout' : 10}
+
         Returns a `erddapClient.ERDDAP_SearchResults` object
         """
 
         searchURL = self.getSearchURL( **filters)
-        rawSearchResults = urlread(searchURL, self.auth)
+        rawSearchResults = urlread(searchURL, self.auth, **request_kwargs)
         dictSearchResult = rawSearchResults.json()
-        formatedResults = ERDDAP_SearchResults(self.serverURL, dictSearchResult['table']['rows'])
+        formatedResults = ERDDAP_SearchResults(self.serverURL, dictSearchResult['table']['rows'], auth=self.auth)
 
         return formatedResults
 
@@ -205,7 +209,7 @@ class ERDDAP_Server:
         return url_operations.joinURLElements(searchAPIURL, url_operations.parseQueryItems(queryURL, safe='=+-&'))
 
 
-    def advancedSearch(self, **filters):
+    def advancedSearch(self, request_kwargs={}, **filters):
         """
         Makes a advancedSearch request to the ERDDAP Server
 
@@ -274,13 +278,15 @@ class ERDDAP_Server:
         The search will find datasets that have some data within the specified 
         time bounds.
 
+        `request_kwargs` : Dictionary with the arguments of the request, i.e. {'timeout' : 10}
+
         Returns a `erddapClient.ERDDAP_SearchResults` object
         """
 
         searchURL = self.getAdvancedSearchURL( **filters)
-        rawSearchResults = urlread(searchURL, self.auth)
+        rawSearchResults = urlread(searchURL, self.auth, **request_kwargs)
         dictSearchResult = rawSearchResults.json()
-        formatedResults = ERDDAP_SearchResults(self.serverURL, dictSearchResult['table']['rows'])
+        formatedResults = ERDDAP_SearchResults(self.serverURL, dictSearchResult['table']['rows'], auth=self.auth)
 
         return formatedResults
 
@@ -400,6 +406,121 @@ class ERDDAP_Server:
         return url_operations.joinURLElements(searchAPIURL, url_operations.parseQueryItems(queryURL, safe='=+-&'))
 
 
+    def iterSearch(self, workers=4, ordered=True, **filters):
+        """
+        Generator that yields all the results of a search request, requesting
+        every page of results. The first page is requested to know if there are
+        more results, the following pages are requested concurrently.
+
+        Arguments:
+
+        `workers` : Maximum number of pages requested at the same time.
+
+        `ordered` : If True the results are yield in the same order of the search
+                    results, if False they are yield as the pages arrive.
+
+        The search filters kwargs are the same of `erddapClient.ERDDAP_Server.search`,
+        `itemsPerPage` sets the page size.
+
+        Yields `erddapClient.ERDDAP_SearchResult` objects, without duplicated datasetIDs.
+        """
+        return self._iterSearchPages(self.getSearchURL, workers, ordered, filters)
+
+
+    def iterAdvancedSearch(self, workers=4, ordered=True, **filters):
+        """
+        Generator that yields all the results of a advanced search request, requesting
+        every page of results concurrently, like `erddapClient.ERDDAP_Server.iterSearch`.
+
+        The search filters kwargs are the same of `erddapClient.ERDDAP_Server.advancedSearch`.
+
+        Yields `erddapClient.ERDDAP_SearchResult` objects, without duplicated datasetIDs.
+        """
+        return self._iterSearchPages(self.getAdvancedSearchURL, workers, ordered, filters)
+
+
+    def _iterSearchPages(self, searchURLFunction, workers, ordered, filters):
+        itemsPerPage = int(filters.get('itemsPerPage', 1000))
+        firstPage = int(filters.get('page', 1))
+        seenDatasetIDs = set()
+
+        def readPage(page):
+            searchURL = searchURLFunction(**dict(filters, page=page, itemsPerPage=itemsPerPage))
+            try:
+                return urlread(searchURL, self.auth).json()['table']['rows']
+            except Exception as e:
+                # Pages beyond the last one returns a "no matching results" error
+                if isEmptyResultError(e):
+                    return []
+                raise
+
+        def pageResults(rows):
+            for row in rows:
+                if row[ERDDAP_Search_Results_Rows.DATASETID] not in seenDatasetIDs:
+                    seenDatasetIDs.add(row[ERDDAP_Search_Results_Rows.DATASETID])
+                    yield ERDDAP_SearchResult(self.serverURL, row, auth=self.auth)
+
+        rows = readPage(firstPage)
+        yield from pageResults(rows)
+        if len(rows) < itemsPerPage:
+            return
+
+        lastPage = None
+        nextPage = firstPage + 1
+        pending = {}
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            try:
+                while True:
+                    while len(pending) < max(workers, 1) and (lastPage is None or nextPage <= lastPage):
+                        pending[nextPage] = executor.submit(readPage, nextPage)
+                        nextPage += 1
+                    if not pending:
+                        break
+
+                    if ordered:
+                        completedPages = [ min(pending) ]
+                    else:
+                        done, _ = wait(pending.values(), return_when=FIRST_COMPLETED)
+                        completedPages = sorted(page for page, future in pending.items() if future in done)
+
+                    for page in completedPages:
+                        rows = pending.pop(page).result()
+                        if len(rows) < itemsPerPage and (lastPage is None or page < lastPage):
+                            lastPage = page
+                        yield from pageResults(rows)
+            finally:
+                for future in pending.values():
+                    future.cancel()
+
+
+    def loadMetadata(self, datasetids, workers=DEFAULT_WORKERS):
+        """
+        Requests the metadata (info page) of many datasets of the server concurrently,
+        and returns the dataset objects with the metadata already loaded.
+
+        Arguments:
+
+        `datasetids` : List of the datasets identifiers.
+
+        `workers` : Number of concurrent requests.
+
+        Returns a OrderedDict with the datasetids and its `erddapClient.ERDDAP_Griddap` 
+        or `erddapClient.ERDDAP_Tabledap` objects.
+        """
+        def readMetadata(datasetid):
+            # Not cached by urlread, to not keep thousands of responses in memory
+            metadataURL = url_operations.url_join(self.serverURL, "info", datasetid, "index.json")
+            return urlread.__wrapped__(metadataURL, auth=self.auth).json()
+
+        datasets = OrderedDict()
+        for datasetid, rawMetadata in zip(datasetids, mapConcurrently(readMetadata, datasetids, workers)):
+            isGriddap = any(row[ERDDAP_Metadata_Rows.ROW_TYPE] == 'dimension' for row in rawMetadata['table']['rows'])
+            dataset = (ERDDAP_Griddap if isGriddap else ERDDAP_Tabledap)(self.serverURL, datasetid, auth=self.auth)
+            dataset.loadMetadata(rawMetadata=rawMetadata)
+            datasets[datasetid] = dataset
+        return datasets
+
+
     def getQueryAllDatasetsURL(self, filetype='json', constraints=[]):
         """
         This method returns a string URL with the allDatasets default 
@@ -465,27 +586,52 @@ class ERDDAP_Server:
 
 
 class ERDDAP_SearchResult(object):
-    datasetid = None
-    title     = None
-    summary   = None 
+    """
+    Class with the representation of a search result element, the dataset
+    object is created only when the `dataset` property is accessed.
+    """
+    __slots__ = ('url', 'datasetid', 'title', 'summary', 'protocol', 'auth', 'lazyload', '_dataset')
 
     def __init__(self, url, erddapSearchResultRow, auth=None, lazyload=True):
+        self.url = url
         self.datasetid, self.title, self.summary = \
             erddapSearchResultRow[ERDDAP_Search_Results_Rows.DATASETID], \
             erddapSearchResultRow[ERDDAP_Search_Results_Rows.TITLE], \
             erddapSearchResultRow[ERDDAP_Search_Results_Rows.SUMMARY]
         if erddapSearchResultRow[ERDDAP_Search_Results_Rows.GRIDDAP]:
-            self.dataset = ERDDAP_Griddap(url, self.datasetid, auth=auth, lazyload=lazyload)
+            self.protocol = 'griddap'
         elif erddapSearchResultRow[ERDDAP_Search_Results_Rows.TABLEDAP]:
-            self.dataset = ERDDAP_Tabledap(url, self.datasetid, auth=auth, lazyload=lazyload)
-    
+            self.protocol = 'tabledap'
+        else:
+            self.protocol = None
+        self.auth = auth
+        self.lazyload = lazyload
+        self._dataset = None
+
+    @property
+    def dataset(self):
+        """
+        Returns the `erddapClient.ERDDAP_Griddap` or `erddapClient.ERDDAP_Tabledap`
+        object of the search result, its created on the first access.
+        """
+        if self._dataset is None:
+            if self.protocol == 'griddap':
+                self._dataset = ERDDAP_Griddap(self.url, self.datasetid, auth=self.auth, lazyload=self.lazyload)
+            elif self.protocol == 'tabledap':
+                self._dataset = ERDDAP_Tabledap(self.url, self.datasetid, auth=self.auth, lazyload=self.lazyload)
+        return self._dataset
+
     def __get__(self, instance, owner):
         return self.dataset
 
 
 class ERDDAP_SearchResults(list):
+    """
+    List of `erddapClient.ERDDAP_SearchResult` elements, indexing this list returns
+    the dataset object of the result.
+    """
 
-    def __init__(self, url, erddapSearchRows, auth=None, lazyload=True):
+    def __init__(self, url=None, erddapSearchRows=[], auth=None, lazyload=True):
         for erddapSearchRow in erddapSearchRows:
             self.append(ERDDAP_SearchResult(url, erddapSearchRow, auth=auth, lazyload=lazyload))
     
@@ -493,9 +639,34 @@ class ERDDAP_SearchResults(list):
         return erddap_search_results_repr(self)
 
     def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [ searchResult.dataset for searchResult in super(ERDDAP_SearchResults, self).__getitem__(key) ]
         return super(ERDDAP_SearchResults, self).__getitem__(key).dataset       
             
     @property
     def results(self):
         return list(self)     
 
+    def prefetchMetadata(self, indexes=None, workers=DEFAULT_WORKERS):
+        """
+        Loads the metadata of the datasets of the search results concurrently.
+
+        Arguments:
+
+        `indexes` : List of the results positions, or a slice, to load. By default
+                    the metadata of all the results is loaded.
+
+        `workers` : Number of concurrent requests.
+
+        Returns the current object.
+        """
+        if indexes is None:
+            searchResults = list(self)
+        elif isinstance(indexes, slice):
+            searchResults = super(ERDDAP_SearchResults, self).__getitem__(indexes)
+        else:
+            searchResults = [ super(ERDDAP_SearchResults, self).__getitem__(idx) for idx in indexes ]
+
+        searchDatasets = [ searchResult.dataset for searchResult in searchResults if searchResult.dataset is not None ]
+        mapConcurrently(lambda dataset: dataset.loadMetadata(), searchDatasets, workers)
+        return self
@@ -0,0 +1,213 @@
+from erddapClient.erddap_server import ERDDAP_Server
+from erddapClient.remote_requests import DEFAULT_WORKERS
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, deque
+import datetime as dt
+import threading
+import time
+
+
+class ERDDAP_StatusPoller:
+    """
+    Class to sample the status.html page of a group of ERDDAP servers on an
+    interval. The numeric metrics of each sample are kept in a bounded ring
+    buffer per server and metric, used to compute deltas and rates, and
+    exported in the Prometheus text format.
+    """
+
+    DEFAULT_INTERVAL = 30
+    DEFAULT_HISTORY = 120
+    METRICS_PREFIX = 'erddap_'
+
+    def __init__(self, servers, interval=DEFAULT_INTERVAL, history=DEFAULT_HISTORY, workers=DEFAULT_WORKERS, auth=None):
+        """
+        Constructs the status poller, the polling starts with
+        `erddapClient.ERDDAP_StatusPoller.start`, or a single sample is made
+        with `erddapClient.ERDDAP_StatusPoller.poll`.
+
+        Arguments:
+
+        `servers` : List of ERDDAP server urls or `erddapClient.ERDDAP_Server` objects.
+
+        `interval` : Seconds between samples.
+
+        `history` : Number of samples kept of each metric.
+
+        `workers` : Number of servers requested at the same time.
+
+        `auth` : Tupple with username and password, used for the servers given as urls.
+        """
+        self.servers = [ server if isinstance(server, ERDDAP_Server) else ERDDAP_Server(server, auth=auth)
+                         for server in servers ]
+        self.interval = interval
+        self.history = history
+        self.workers = workers
+        self.samples = OrderedDict( (server.serverURL, {}) for server in self.servers )
+        """ Dictionary with the servers urls, and the ring buffers of (timestamp, value) samples of each metric """
+        self.lastErrors = OrderedDict()
+        """ Dictionary with the servers urls and the error of the last sample, for the servers that failed """
+        self.__lock = threading.Lock()
+        self.__stopEvent = threading.Event()
+        self.__thread = None
+
+    def __repr__(self):
+        summary = ["<erddapClient.{}>".format(type(self).__name__),
+                   "Interval: {} s".format(self.interval), "Servers:"]
+        summary.extend([ "  {}".format(server.serverURL) for server in self.servers ])
+        return "\n".join(summary)
+
+
+    def poll(self):
+        """
+        Requests and parses the status page of all the servers concurrently,
+        and adds the numeric metrics to the ring buffers.
+
+        Returns the dictionary of the servers urls and the metrics of the sample.
+        """
+        def sampleServer(server):
+            startTime = time.time()
+            try:
+                server.parseStatusPage(force=True)
+                return server.serverURL, startTime, statusMetrics(server.statusValues), None
+            except Exception as e:
+                return server.serverURL, startTime, None, e
+
+        with ThreadPoolExecutor(max_workers=max(min(self.workers, len(self.servers)), 1)) as executor:
+            results = list(executor.map(sampleServer, self.servers))
+
+        sample = OrderedDict()
+        with self.__lock:
+            for serverURL, startTime, metrics, error in results:
+                metrics = OrderedDict() if metrics is None else metrics
+                metrics['up'] = 0 if error else 1
+                metrics['scrape_duration_seconds'] = time.time() - startTime
+                if error:
+                    self.lastErrors[serverURL] = error
+                else:
+                    self.lastErrors.pop(serverURL, None)
+                for metric, value in metrics.items():
+                    self.samples[serverURL].setdefault(metric, deque(maxlen=self.history)).append((startTime, value))
+                sample[serverURL] = metrics
+        return sample
+
+
+    def start(self):
+        """
+        Starts polling the servers every `interval` seconds in a background thread.
+        """
+        if self.__thread is not None and self.__thread.is_alive():
+            return self
+        self.__stopEvent.clear()
+        self.__thread = threading.Thread(target=self._pollLoop, daemon=True)
+        self.__thread.start()
+        return self
+
+
+    def stop(self):
+        """
+        Stops the background polling.
+        """
+        self.__stopEvent.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+
+    def _pollLoop(self):
+        while not self.__stopEvent.is_set():
+            startTime = time.time()
+            self.poll()
+            self.__stopEvent.wait(max(self.interval - (time.time() - startTime), 0))
+
+
+    def values(self, serverURL, metric):
+        """
+        Returns the list of (timestamp, value) samples of a server metric.
+        """
+        with self.__lock:
+            return list(self.samples.get(serverURL, {}).get(metric, []))
+
+
+    def delta(self, serverURL, metric):
+        """
+        Returns the difference between the last two samples of a server metric,
+        or None if there are less than two samples.
+        """
+        values = self.values(serverURL, metric)
+        if len(values) < 2 or values[-1][1] is None or values[-2][1] is None:
+            return None
+        return values[-1][1] - values[-2][1]
+
+
+    def rate(self, serverURL, metric, window=None):
+        """
+        Returns the per second rate of increase of a counter metric, like the
+        number of failed or succeeded responses since startup. The rate is
+        calculated from the samples of the last `window` seconds (all the samples
+        by default), after the last counter reset (a server restart).
+        """
+        values = [ (t, v) for t, v in self.values(serverURL, metric) if v is not None ]
+        if window is not None and values:
+            values = [ (t, v) for t, v in values if t >= values[-1][0] - window ]
+        for idx in range(len(values) - 1, 0, -1):
+            if values[idx][1] < values[idx - 1][1]:
+                values = values[idx:]
+                break
+        if len(values) < 2 or values[-1][0] == values[0][0]:
+            return None
+        return (values[-1][1] - values[0][1]) / (values[-1][0] - values[0][0])
+
+
+    def prometheus(self):
+        """
+        Returns the last sample of the metrics of all the servers in the
+        Prometheus text exposition format. The counters of responses and task
+        threads since startup, include a `_rate` metric with its rate per second.
+        """
+        metricsLines = OrderedDict()
+        with self.__lock:
+            serversMetrics = [ (serverURL, list(metrics.keys())) for serverURL, metrics in self.samples.items() ]
+        for serverURL, metrics in serversMetrics:
+            labels = '{{server="{}"}}'.format(serverURL.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            lastSample = self.values(serverURL, 'up')
+            for metric in metrics:
+                values = self.values(serverURL, metric)
+                # Leave out the metrics missing in the last sample
+                if not values or values[-1][1] is None or values[-1][0] != lastSample[-1][0]:
+                    continue
+                metricName = self.METRICS_PREFIX + metric
+                metricsLines.setdefault(metricName, []).append("{}{} {}".format(metricName, labels, values[-1][1]))
+                if isCounterMetric(metric):
+                    rate = self.rate(serverURL, metric)
+                    if rate is not None:
+                        metricsLines.setdefault(metricName + '_rate', []).append("{}_rate{} {}".format(metricName, labels, rate))
+
+        exposition = []
+        for metricName, lines in metricsLines.items():
+            exposition.append("# TYPE {} gauge".format(metricName))
+            exposition.extend(lines)
+        return "\n".join(exposition) + "\n"
+
+
+def statusMetrics(statusValues):
+    """
+    Returns a OrderedDict with the numeric scalar values of a parsed status page,
+    the datetimes as seconds since 1970.
+    """
+    metrics = OrderedDict()
+    for key, value in statusValues.items():
+        metric = key.replace('-', '_')
+        if isinstance(value, dt.datetime):
+            metrics[metric + '_seconds'] = value.timestamp()
+        elif isinstance(value, (int, float)) or value is None:
+            metrics[metric] = value
+    return metrics
+
+
+def isCounterMetric(metric):
+    """
+    Returns True for the metrics of counts since startup, which only increase
+    until the server restarts.
+    """
+    return metric.startswith('n') and metric.endswith('_since_startup') and \
+           not metric.startswith('nmedian_') and '_time_' not in metric
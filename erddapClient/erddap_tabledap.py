@@ -1,6 +1,22 @@
 from erddapClient.erddap_dataset import ERDDAP_Dataset
+from erddapClient import url_operations
+from erddapClient.remote_requests import urlread, urlstream, mapConcurrently, isEmptyResultError, DEFAULT_WORKERS
 from erddapClient.formatting import tabledap_str
-from erddapClient.parse_utils import castTimeRangeAttribute, ifListToCommaSeparatedString, parseTimeRangeAttributes
+from erddapClient.parse_utils import castTimeRangeAttribute, ifListToCommaSeparatedString, parseTimeRangeAttributes, parseQueryExpression, parseConstraintValue, valuesToRegex, parseISO8601Duration, parseRelativeTime, timeIntervalString, validate_iso8601, iso8601STRtoNum, dttonum
+from erddapClient.erddap_constants import ERDDAP_PANDAS_DATATYPES
+from erddapClient.lazy_imports import lazyImport
+from io import StringIO
+from urllib.parse import quote
+import datetime as dt
+import ast
+import re
+import os
+import json
+import shutil
+import time
+
+pd = lazyImport('pandas')
+np = lazyImport('numpy')
 
 
 class ERDDAP_Tabledap(ERDDAP_Dataset):
@@ -10,6 +26,10 @@ class ERDDAP_Tabledap(ERDDAP_Dataset):
   """
 
   DEFAULT_FILETYPE = 'csvp'
+  MAX_URL_LENGTH = 4000
+  """ Maximum length of the request urls built by `erddapClient.ERDDAP_Tabledap.getDataFrameForValues` """
+  SUBSET_INDEX_TTL = 3600
+  """ Seconds before the subset variables index is requested again """
 
   def __init__(self, url, datasetid, auth=None, lazyload=True):
     """
@@ -28,16 +48,577 @@ class ERDDAP_Tabledap(ERDDAP_Dataset):
 
     """
     super().__init__(url, datasetid, 'tabledap', auth, lazyload=lazyload)
+    self.localFilters = []
+    """
+    Stores the query expression predicates that couldn't be converted to ERDDAP 
+    constraints, these are evaluated on the results of `erddapClient.ERDDAP_Tabledap.getDataFrame`
+    """
+    self.__subsetIndex = None
+    self.__subsetIndexTime = None
 
   def __str__(self):
     dst_repr_ = super().__str__()
     return dst_repr_ + tabledap_str(self)
 
-  def loadMetadata(self, force=False):
-    if super().loadMetadata(force):
+  def loadMetadata(self, force=False, rawMetadata=None):
+    if super().loadMetadata(force, rawMetadata):
       parseTimeRangeAttributes(self.variables.items())
 
 
+  def clearConstraints(self):
+    super().clearConstraints()
+    self.localFilters = []
+
+
+  def query(self, expression, **variables):
+    """
+    Adds the predicates of a pandas-style query expression to the data request.
+    The expression is parsed, and every predicate that ERDDAP can evaluate is 
+    added as a constraint, a list of values (`in` operator) is added as a regex 
+    constraint. The predicates that ERDDAP can't evaluate are applied locally 
+    to the DataFrame returned by `erddapClient.ERDDAP_Tabledap.getDataFrame`.
+
+    Arguments
+
+    `expression` : The query expression string.
+
+    `variables` : Optional kwargs with values that can be referenced by name 
+                  in the expression.
+
+    Example:
+    ```
+    >>> dataset.query("sst > 20 and time >= '2020-01-01' and station in ['A','B']")
+    >>> dataset.query("time >= start and (atmp > 25 or wspd > 10)", start=dt.datetime(2020,1,1))
+    ```
+
+    Returns the current object allowing chaining functions.
+    """
+    constraints, localPredicates = parseQueryExpression(expression, variables)
+    self.addConstraints(constraints)
+    if localPredicates:
+      self.localFilters.append( (' and '.join('({})'.format(p) for p in localPredicates), variables) )
+    return self
+
+
+  def _addConstraintDict(self, constraintDict):
+    constraintKey = next(iter(constraintDict))
+    self._validateSubsetConstraint(constraintKey, constraintDict[constraintKey])
+    super()._addConstraintDict(constraintDict)
+
+
+  @property
+  def subsetVariables(self):
+    """
+    Returns the list of the dataset subsetVariables, the variables with a limited
+    number of distinct values (i.e. station, longitude, latitude).
+    """
+    subsetVariables = self.getAttribute('subsetVariables')
+    if not subsetVariables:
+      return []
+    return [ v.strip() for v in subsetVariables.split(',') if v.strip() ]
+
+
+  def loadSubsetIndex(self, force=False):
+    """
+    Loads in to memory the distinct combinations of values of the dataset 
+    subsetVariables. ERDDAP keeps this table cached, so the request is fast.
+    The index is used by `erddapClient.ERDDAP_Tabledap.subsetValues`, and to
+    validate constraints values before a request is made. It's requested 
+    again after `erddapClient.ERDDAP_Tabledap.SUBSET_INDEX_TTL` seconds.
+
+    Arguments:
+
+    `force` : If true, this method will reload the index even if its not expired.
+    """
+    if self.__subsetIndex is not None and not force and \
+       time.time() - self.__subsetIndexTime < self.SUBSET_INDEX_TTL:
+      return self.__subsetIndex
+
+    subsetVariables = self.subsetVariables
+    if not subsetVariables:
+      raise Exception("The dataset {} doesn't have subsetVariables".format(self.datasetid))
+
+    requestURL = url_operations.joinURLElements(self.getBaseURL('csvp'), 
+                    url_operations.parseQueryItems(subsetVariables, safe='', item_separator=',') + '&distinct()')
+    rawRequest = urlread.__wrapped__(requestURL, auth=self.erddapauth)
+    subsetIndex = pd.read_csv(StringIO(rawRequest.text), dtype=str, keep_default_na=False)
+    subsetIndex.columns = subsetVariables
+    for variableName in subsetVariables:
+      if self.variables[variableName]['_dataType'] in ['String', 'char']:
+        subsetIndex[variableName] = subsetIndex[variableName].astype('category')
+      else:
+        subsetIndex[variableName] = pd.to_numeric(subsetIndex[variableName], errors='coerce')
+
+    self.__subsetIndex = subsetIndex
+    self.__subsetIndexTime = time.time()
+    return self.__subsetIndex
+
+
+  def subsetLookup(self, **lookup):
+    """
+    Returns a DataFrame with the distinct combinations of the subsetVariables
+    values that match the lookup kwargs. Each kwarg is a subset variable name
+    with a value or a list of values.
+
+    Example:
+    ```
+    >>> dataset.subsetLookup(station=['41001', '41002'])
+    ```
+    """
+    subsetIndex = self.loadSubsetIndex()
+    mask = np.ones(len(subsetIndex), dtype=bool)
+    for variableName, value in lookup.items():
+      if variableName not in subsetIndex.columns:
+        raise Exception("{} is not a subset variable of the dataset {}".format(variableName, self.datasetid))
+      values = value if isinstance(value, (list, tuple, set)) else [value]
+      mask &= subsetIndex[variableName].isin(values).values
+    return subsetIndex[mask]
+
+
+  def subsetValues(self, variable, **lookup):
+    """
+    Returns the sorted list of distinct values of a subset variable, the values 
+    are taken from the local subset index, without requesting the server.
+    Optional kwargs filter the values like in `erddapClient.ERDDAP_Tabledap.subsetLookup`.
+
+    Example:
+    ```
+    >>> dataset.subsetValues('station')
+    >>> dataset.subsetValues('station', latitude=25.9)
+    ```
+    """
+    subsetRows = self.subsetLookup(**lookup)
+    if variable not in subsetRows.columns:
+      raise Exception("{} is not a subset variable of the dataset {}".format(variable, self.datasetid))
+    return sorted(subsetRows[variable].dropna().unique())
+
+
+  def _validateSubsetConstraint(self, constraintKey, value):
+    """
+    Raises an exception if the constraint is an equality or regex constraint
+    of a subset variable, and no value of the subset index matches it. The 
+    validation is done only if the subset index is already loaded.
+    """
+    if self.__subsetIndex is None or time.time() - self.__subsetIndexTime >= self.SUBSET_INDEX_TTL:
+      return
+    constraintSearch = re.match(r'^(\w+)(=~|=)$', constraintKey)
+    if constraintSearch is None or constraintSearch.group(1) not in self.__subsetIndex.columns:
+      return
+
+    variableName, operator = constraintSearch.groups()
+    indexValues = self.__subsetIndex[variableName]
+    if operator == '=~':
+      matches = indexValues.astype(str).str.fullmatch(str(value)).any()
+    elif pd.api.types.is_numeric_dtype(indexValues):
+      try:
+        numericValue = float(value)
+      except (TypeError, ValueError):
+        # Not a number, let the server answer the request
+        return
+      matches = np.isclose(indexValues.values, numericValue).any()
+    else:
+      matches = str(value) in set(indexValues.cat.categories)
+    if not matches:
+      raise Exception("The constraint {}{} doesn't match any value of the subset variable {} in dataset {}".format(
+                        constraintKey, value, variableName, self.datasetid))
+
+
+  def getDataFrame(self, request_kwargs={}, **kwargs):
+    """
+    This method makes a data request to the ERDDAP server in csv format
+    then convert it to a pandas object. The predicates added with 
+    `erddapClient.ERDDAP_Tabledap.query` that ERDDAP can't evaluate are
+    applied to the DataFrame before returning it.
+
+    Returns the pandas DataFrame object.
+    """
+    if not self.localFilters:
+      return super().getDataFrame(request_kwargs, **kwargs)
+
+    _resultVars = self.resultVariables
+    extraVariables = self._localFiltersExtraVariables()
+    self.resultVariables = _resultVars + extraVariables
+    try:
+      df = super().getDataFrame(request_kwargs, **kwargs)
+    finally:
+      self.resultVariables = _resultVars
+
+    return self._applyLocalFilters(df, extraVariables)
+
+
+  def getDataFrameForValues(self, variable, values, maxURLLength=None, workers=DEFAULT_WORKERS, request_kwargs={}, **kwargs):
+    """
+    Makes the data request for a long list of values of one variable, for example
+    a list of stations. The values are packed in as few regex constraints 
+    `variable=~"(a|b|c)"` as the url length limit allows, the requests are made
+    concurrently and the results are combined in a single DataFrame.
+
+    The current result variables, constraints and server side functions are
+    used in every request.
+
+    Arguments
+
+    `variable` : The variable name to constraint.
+
+    `values` : The list of values for the variable.
+
+    `maxURLLength` : The maximum length of the request urls, defaults 
+                     to `erddapClient.ERDDAP_Tabledap.MAX_URL_LENGTH`
+
+    `workers` : Number of concurrent requests.
+
+    Additional kwargs are passed to the pandas read_csv method.
+
+    Returns the pandas DataFrame object.
+    """
+    if maxURLLength is None:
+      maxURLLength = self.MAX_URL_LENGTH
+
+    _resultVars = self.resultVariables
+    extraVariables = self._localFiltersExtraVariables()
+    self.resultVariables = _resultVars + extraVariables
+    try:
+      requestURLs = [ self._getDataRequestURLWithConstraint({ variable + '=~' : valuesToRegex(batch) }) 
+                      for batch in self._packValuesInBatches(variable, values, maxURLLength) ]
+    finally:
+      self.resultVariables = _resultVars
+
+    def readBatch(requestURL):
+      try:
+        rawRequest = urlread(requestURL, auth=self.erddapauth, **request_kwargs)
+      except Exception as e:
+        if isEmptyResultError(e):
+          return None
+        raise
+      return pd.read_csv(StringIO(rawRequest.text), **kwargs)
+
+    frames = [ df for df in mapConcurrently(readBatch, requestURLs, workers) if df is not None ]
+    if not frames:
+      raise Exception("Your query produced no matching results for any of the {} values".format(variable))
+
+    return self._applyLocalFilters(pd.concat(frames, ignore_index=True), extraVariables)
+
+
+  def preview(self, targetRows=1000, groupVariables=None, request_kwargs={}, **kwargs):
+    """
+    Makes a decimated data request, that returns about `targetRows` rows for each
+    timeseries (or trajectory) of the current query. The decimation is done in the
+    server with the orderByClosest function, the interval is calculated from the 
+    time range of the current constraints, or the time actual_range of the dataset,
+    and it's never smaller than the dataset time resolution (time_coverage_resolution).
+    The relative time constraints (now-7days, max(time)-1day) are resolved against
+    the time actual_range, if the time range is unknown the data is not decimated.
+
+    Arguments
+
+    `targetRows` : The approximate number of rows for each timeseries.
+
+    `groupVariables` : The variables that identify each timeseries, defaults to the
+                       cdm_timeseries_variables or cdm_trajectory_variables of the dataset.
+
+    Additional kwargs are passed to the pandas read_csv method.
+
+    Returns the pandas DataFrame object.
+    """
+    timeVariable = self._timeVariableName()
+    if timeVariable is None:
+      raise Exception("The dataset {} doesn't have a time variable to calculate the preview interval".format(self.datasetid))
+    timeRange = self._timeRange()
+    if timeRange is None:
+      # The interval would be a guess, the data is requested without decimation
+      return self.getDataFrame(request_kwargs, **kwargs)
+
+    interval = (timeRange[1] - timeRange[0]) / max(targetRows, 1)
+    nativeSpacing = parseISO8601Duration(self.getAttribute('time_coverage_resolution'))
+    if nativeSpacing is not None and interval <= nativeSpacing:
+      return self.getDataFrame(request_kwargs, **kwargs)
+
+    if groupVariables is None:
+      groupVariables = self.getAttribute('cdm_timeseries_variables') or self.getAttribute('cdm_trajectory_variables') or []
+    if isinstance(groupVariables, str):
+      groupVariables = [ v.strip() for v in groupVariables.split(',') if v.strip() ]
+    # Only the first variable is used, the cdm variables are usually the station id and its location
+    orderVariables = groupVariables[:1] + [ "{}/{}".format(timeVariable, timeIntervalString(interval)) ]
+
+    _serverSideFunctions = self.serverSideFunctions
+    self.serverSideFunctions = [ f for f in _serverSideFunctions if not f.startswith('orderBy') ]
+    try:
+      self.orderByClosest(orderVariables)
+      return self.getDataFrame(request_kwargs, **kwargs)
+    finally:
+      self.serverSideFunctions = _serverSideFunctions
+
+
+  def exportParquet(self, path, timePartition='month', partitionVariable=None, partitionValues=None, chunksize=100000, request_kwargs={}):
+    """
+    Exports the current query to a Parquet dataset in the local directory `path`,
+    partitioned by time periods and/or by the values of a variable (hive style 
+    directories, i.e. `year=2020/month=01/station=41001/part-00000.parquet`, the
+    values are escaped like in urls, i.e. `station=A%2FB` for the value "A/B").
+
+    Each partition is a separate data request, the response is streamed and
+    converted in batches of `chunksize` rows, so the memory used doesn't depend
+    on the size of the export. The completed partitions are recorded in the 
+    `_checkpoint.json` file of the dataset directory, calling this method again
+    with the same query resumes the export skipping the completed partitions.
+
+    This method requires the pyarrow package.
+
+    Arguments
+
+    `path` : The directory of the Parquet dataset.
+
+    `timePartition` : Either 'year', 'month', 'day' or None to not partition by time.
+
+    `partitionVariable` : Optional variable name to partition by its values, i.e. 'station'.
+
+    `partitionValues` : The list of values of `partitionVariable` to export, by default
+                        all the distinct values are requested to the server.
+
+    `chunksize` : Number of rows of each Parquet file.
+
+    Returns the list of the partition directories completed.
+    """
+    try:
+      import pyarrow as pa
+      import pyarrow.parquet as pq
+    except ImportError:
+      raise Exception("The pyarrow package is required to export to Parquet")
+
+    partitions = self._exportPartitions(timePartition, partitionVariable, partitionValues)
+    baseRequestURL = self.getDataRequestURL()
+
+    os.makedirs(path, exist_ok=True)
+    checkpointPath = os.path.join(path, '_checkpoint.json')
+    checkpoint = { 'requestURL' : baseRequestURL, 'completed' : [] }
+    if os.path.exists(checkpointPath):
+      with open(checkpointPath) as f:
+        previousCheckpoint = json.load(f)
+      if previousCheckpoint['requestURL'] != baseRequestURL:
+        raise Exception("The directory {} contains a export of a different query".format(path))
+      checkpoint = previousCheckpoint
+
+    for partitionDirectory, constraints in partitions:
+      if partitionDirectory in checkpoint['completed']:
+        continue
+
+      partitionPath = os.path.join(path, *partitionDirectory.split('/'))
+      if os.path.exists(partitionPath):
+        shutil.rmtree(partitionPath)
+      os.makedirs(partitionPath)
+
+      _constraints, _resultVars = list(self.constraints), self.resultVariables
+      extraVariables = self._localFiltersExtraVariables()
+      try:
+        self.addConstraints(constraints)
+        self.resultVariables = _resultVars + extraVariables
+        requestURL = self.getDataRequestURL()
+      finally:
+        self.constraints, self.resultVariables = _constraints, _resultVars
+
+      try:
+        response = urlstream(requestURL, auth=self.erddapauth, **request_kwargs)
+      except Exception as e:
+        if not isEmptyResultError(e):
+          raise
+        response = None
+
+      if response is not None:
+        with response:
+          schema = None
+          for chunkNumber, chunk in enumerate(pd.read_csv(response.raw, chunksize=chunksize)):
+            chunk = self._castDataFrameTypes(self._applyLocalFilters(chunk, extraVariables))
+            if partitionVariable in chunk.columns:
+              # The value is in the partition directory name
+              chunk = chunk.drop(columns=[partitionVariable])
+            table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            schema = table.schema
+            pq.write_table(table, os.path.join(partitionPath, 'part-{:05d}.parquet'.format(chunkNumber)))
+
+      checkpoint['completed'].append(partitionDirectory)
+      with open(checkpointPath + '.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+      os.replace(checkpointPath + '.tmp', checkpointPath)
+
+    return checkpoint['completed']
+
+
+  def _exportPartitions(self, timePartition, partitionVariable, partitionValues):
+    """
+    Returns a list of tuples with the partition directory and the constraints to
+    request the data of each partition.
+    """
+    timePartitionFormats = { 'year' : ('Y', 'year=%Y'), 
+                             'month' : ('M', 'year=%Y/month=%m'), 
+                             'day' : ('D', 'year=%Y/month=%m/day=%d') }
+    timePartitions = [ ('', []) ]
+    if timePartition is not None:
+      if timePartition not in timePartitionFormats:
+        raise Exception("timePartition must be one of: {}".format(', '.join(timePartitionFormats.keys())))
+      timeVariable = self._timeVariableName()
+      timeRange = self._timeRange()
+      if timeRange is None:
+        raise Exception("The dataset {} doesn't have a time range to partition".format(self.datasetid))
+      frequency, directoryFormat = timePartitionFormats[timePartition]
+      periods = pd.period_range(pd.Timestamp(timeRange[0], unit='s'), pd.Timestamp(timeRange[1], unit='s'), freq=frequency)
+      timePartitions = [ (period.start_time.strftime(directoryFormat), 
+                          [ { timeVariable + '>=' : period.start_time.to_pydatetime() }, 
+                            { timeVariable + '<' : (period + 1).start_time.to_pydatetime() } ])
+                         for period in periods ]
+
+    if partitionVariable is None:
+      return timePartitions
+
+    if partitionValues is None:
+      partitionValues = self._distinctValues(partitionVariable)
+    # Hive style escaping of the values, a "/" would be a subdirectory
+    return [ ( '/'.join(filter(None, [timeDirectory, '{}={}'.format(partitionVariable, quote(str(value), safe=''))])),
+               timeConstraints + [ { partitionVariable + '=' : value } ] )
+             for timeDirectory, timeConstraints in timePartitions 
+             for value in partitionValues ]
+
+
+  def _distinctValues(self, variable):
+    if variable in self.subsetVariables:
+      return self.subsetValues(variable)
+    _resultVars, _serverSideFunctions = self.resultVariables, self.serverSideFunctions
+    try:
+      self.resultVariables, self.serverSideFunctions = [variable], []
+      self.distinct()
+      return list(super().getDataFrame().iloc[:, 0])
+    finally:
+      self.resultVariables, self.serverSideFunctions = _resultVars, _serverSideFunctions
+
+
+  def _castDataFrameTypes(self, df):
+    """
+    Removes the units of the DataFrame column names, and casts the columns 
+    to the data type of the variables in the dataset metadata. The time 
+    variable is converted to datetime.
+    """
+    df = df.rename(columns=lambda column: column.split(' (')[0])
+    for column in df.columns:
+      variableAttributes = self.variables.get(column, {})
+      dataType = variableAttributes.get('_dataType')
+      if variableAttributes.get('_CoordinateAxisType') == 'Time':
+        df[column] = pd.to_datetime(df[column], utc=True)
+      elif dataType in ERDDAP_PANDAS_DATATYPES:
+        df[column] = df[column].astype(ERDDAP_PANDAS_DATATYPES[dataType])
+    return df
+
+
+  def _timeVariableName(self):
+    for variableName, variableAttributes in self.variables.items():
+      if variableAttributes.get('_CoordinateAxisType') == 'Time':
+        return variableName
+    return 'time' if 'time' in self.variables else None
+
+
+  def _timeRange(self):
+    """
+    Returns a tuple with the start and end time, in seconds since 1970, of the 
+    current query. The range is taken from the time constraints, or from the 
+    time variable actual_range. The relative time constraints (now-7days,
+    max(time)-1day) are resolved against the actual_range. Returns None if
+    the range is unknown, or a time constraint can't be resolved.
+    """
+    timeVariable = self._timeVariableName()
+    if timeVariable is None:
+      return None
+
+    actualRange = [None, None]
+    if 'actual_range' in self.variables[timeVariable]:
+      actualRange = [ dttonum(t) for t in self.variables[timeVariable]['actual_range'] ]
+    timeRange = list(actualRange)
+
+    for constraint in self.constraints:
+      constraintSearch = re.match(r'^{}(>=|>|<=|<|=)(.+)$'.format(timeVariable), constraint)
+      if constraintSearch is None:
+        continue
+      constraintValue = constraintSearch.group(2).strip('"')
+      if validate_iso8601(constraintValue):
+        constraintTime = iso8601STRtoNum(constraintValue)
+      else:
+        constraintTime = parseRelativeTime(constraintValue, *actualRange)
+        if constraintTime is None:
+          return None
+      if constraintSearch.group(1) in ['>=', '>', '=']:
+        timeRange[0] = constraintTime if timeRange[0] is None else max(timeRange[0], constraintTime)
+      if constraintSearch.group(1) in ['<=', '<', '=']:
+        timeRange[1] = constraintTime if timeRange[1] is None else min(timeRange[1], constraintTime)
+
+    # A single bound, without actual_range, is not a range
+    return None if None in timeRange else tuple(timeRange)
+
+
+  def _packValuesInBatches(self, variable, values, maxURLLength):
+    """
+    Splits the values in groups that fit in the url length limit once
+    converted to a regex constraint.
+    """
+    quoteConstraint = lambda c: url_operations.parseQueryItems([c], True, safe='=!()&')
+    baseLength = len(self._buildDataRequestURL()) + len(quoteConstraint('&{}=~"()"'.format(variable)))
+    separatorLength = len(quoteConstraint('|'))
+
+    batches, batch, batchLength = [], [], baseLength
+    for value in values:
+      valueLength = len(quoteConstraint(valuesToRegex([value])[1:-1]))
+      if baseLength + valueLength > maxURLLength:
+        raise Exception("The value {} doesn't fit in a request url of {} characters".format(value, maxURLLength))
+      if batch and batchLength + separatorLength + valueLength > maxURLLength:
+        batches.append(batch)
+        batch, batchLength = [], baseLength
+      batchLength += valueLength + (separatorLength if batch else 0)
+      batch.append(value)
+    if batch:
+      batches.append(batch)
+    return batches
+
+
+  def _getDataRequestURLWithConstraint(self, constraint, filetype=DEFAULT_FILETYPE):
+    _constraints = list(self.constraints)
+    try:
+      self._addConstraintDict(constraint)
+      return self.getDataRequestURL(filetype)
+    finally:
+      self.constraints = _constraints
+
+
+  def _localFiltersExtraVariables(self):
+    """
+    Returns the variables used by the local filters that are not part of the
+    result variables, they must be requested to evaluate the filters.
+    """
+    if not self.resultVariables:
+      return []
+    return [ v for v in self._localFiltersVariables() if v not in self.resultVariables ]
+
+
+  def _applyLocalFilters(self, df, dropVariables=[]):
+    if not self.localFilters:
+      return df
+
+    columns = { column.split(' (')[0] : column for column in df.columns }
+    for expression, variables in self.localFilters:
+      resolvers = { name : (parseConstraintValue(value).strip('"') if isinstance(value, dt.datetime) else value) 
+                    for name, value in variables.items() }
+      resolvers.update({ name : df[column] for name, column in columns.items() })
+      df = df[df.eval(expression, resolvers=(resolvers,))]
+
+    if dropVariables:
+      df = df.drop(columns=[ columns[v] for v in dropVariables if v in columns ])
+    return df
+
+
+  def _localFiltersVariables(self):
+    filterVariables = []
+    for expression, variables in self.localFilters:
+      for node in ast.walk(ast.parse(expression, mode='eval')):
+        if isinstance(node, ast.Name) and node.id not in variables and node.id not in filterVariables:
+          filterVariables.append(node.id)
+    return filterVariables
+
+
   # 
   # Tabledap server side functions wrappers
   # 
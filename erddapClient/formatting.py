@@ -1,6 +1,7 @@
 
 
 MAX_SUMMARY_LEN = 75
+SEARCH_RESULT_CLASS_NAMES = { 'griddap' : 'ERDDAP_Griddap', 'tabledap' : 'ERDDAP_Tabledap' }
 
 def erddap_server_repr(sobj):
     summary = ["<erddapClient.{}>".format(type(sobj).__name__)]
@@ -66,7 +67,7 @@ def erddap_search_results_repr(srobj):
     summary.append ("Results:  {}".format(len(list(srobj))))
     summary.append('[')
     for idx, item in enumerate(list(srobj)):
-        summary.append( "  {}".format(idx) + " - <erddapClient.{}>".format(type(item.dataset).__name__) + \
+        summary.append( "  {}".format(idx) + " - <erddapClient.{}>".format(SEARCH_RESULT_CLASS_NAMES.get(item.protocol)) + \
                         " " + item.datasetid + " , \"" + item.title + "\"")
     summary.append(']')
     return '\n'.join(summary)    
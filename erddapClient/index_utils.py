@@ -0,0 +1,128 @@
+from erddapClient.lazy_imports import lazyImport
+import math
+
+np = lazyImport('numpy')
+
+
+MAX_MERGED_ATOMS = 64
+MAX_CANDIDATE_STEPS = 3
+CANDIDATE_STEPS_LAG = 8
+
+
+def indexRuns(indexes, cellBytes=1, requestBytes=0):
+    """
+     Compiles a sorted array of unique indexes of a dimension in a list of
+     strided slices that request them, minimizing the cost of the requests:
+     `requestBytes` for each request, the bytes that could be downloaded in
+     the time of a request round trip, plus `cellBytes` for each index
+     requested, wanted or not.
+
+     The regular indexes are a single strided slice, like the 12Z step of
+     every day of an hourly dimension. The irregular ones are grouped in runs
+     of constant stride, merged when requesting the gap between them costs
+     less than another request. Periodic patterns, like some months of every
+     year, are compiled to a strided slice for each month, instead of a run
+     for each year.
+
+     Returns the list of slices, with its stops after the last index.
+    """
+    indexes = np.asarray(indexes, dtype='int64')
+    plans = [ _consecutiveRuns(indexes, cellBytes, requestBytes), [ _mergedRun(indexes) ] ]
+    for step in candidateSteps(indexes):
+        plan = []
+        for residue in np.unique(indexes % step):
+            classIndexes = indexes[indexes % step == residue]
+            for run in _consecutiveRuns((classIndexes - residue) // step, cellBytes, requestBytes):
+                plan.append(slice(int(run.start * step + residue), int((run.stop - 1) * step + residue + 1), (run.step or 1) * step))
+        plans.append(plan)
+    plans = [ [ _normalizedRun(run) for run in plan ] for plan in plans ]
+    return sorted(min(plans, key=lambda plan: runsCost(plan, cellBytes, requestBytes)), key=lambda run: run.start)
+
+
+def runsCost(runs, cellBytes=1, requestBytes=0):
+    """
+     Returns the cost of the requests of a list of slices, see `indexRuns`.
+    """
+    return sum( requestBytes + len(range(run.start, run.stop, run.step or 1)) * cellBytes for run in runs )
+
+
+def candidateSteps(indexes):
+    """
+     Returns the most frequent differences between the indexes and its next
+     CANDIDATE_STEPS_LAG indexes, the periods of the patterns of the indexes.
+     A period is found at least once for most of the indexes.
+    """
+    lags = [ indexes[lag:] - indexes[:-lag] for lag in range(1, min(CANDIDATE_STEPS_LAG, indexes.size - 1) + 1) ]
+    if not lags:
+        return []
+    differences, counts = np.unique(np.concatenate(lags), return_counts=True)
+    order = np.argsort(-counts, kind='stable')
+    return [ int(step) for step, count in zip(differences[order], counts[order])
+             if step > 1 and count >= indexes.size // 2 ][:MAX_CANDIDATE_STEPS]
+
+
+def _consecutiveRuns(indexes, cellBytes, requestBytes):
+    """
+     Splits the indexes in atoms, the maximal runs of constant stride of three
+     or more indexes and the single indexes between them, and finds the
+     consecutive atoms merged in each request with the least cost, by dynamic
+     programming. A merged request uses the greatest common divisor of its
+     strides, the indexes in between are requested too.
+    """
+    n = indexes.size
+    mergedRun = _mergedRun(indexes)
+    if (len(range(mergedRun.start, mergedRun.stop, mergedRun.step)) - n) * cellBytes <= requestBytes:
+        # Splitting saves less than the cost of another request
+        return [ mergedRun ]
+    # Python integers, faster than numpy scalars in the loops
+    values = indexes.tolist()
+    diffs = [ b - a for a, b in zip(values[:-1], values[1:]) ]
+    atoms = []
+    i = 0
+    while i < n:
+        j = i
+        if i + 1 < n:
+            while j + 1 < n and diffs[j] == diffs[i]:
+                j += 1
+        if j - i < 2:
+            j = i
+        atoms.append((i, j, diffs[i] if j > i else 0))
+        i = j + 1
+
+    bestCost = [0] + [ math.inf ] * len(atoms)
+    bestStart = [0] * len(atoms)
+    for last in range(len(atoms)):
+        step = 0
+        lastValue, lastPosition = values[atoms[last][1]], atoms[last][1]
+        for first in range(last, max(-1, last - MAX_MERGED_ATOMS), -1):
+            step = math.gcd(step, atoms[first][2])
+            if first < last:
+                step = math.gcd(step, values[atoms[first + 1][0]] - values[atoms[first][1]])
+            count = lastPosition - atoms[first][0] + 1
+            requested = (lastValue - values[atoms[first][0]]) // step + 1 if step else 1
+            cost = bestCost[first] + requestBytes + requested * cellBytes
+            if cost < bestCost[last + 1]:
+                bestCost[last + 1], bestStart[last] = cost, first
+            # The wasted indexes only grow merging more atoms
+            if (requested - count) * cellBytes > requestBytes:
+                break
+
+    runs = []
+    last = len(atoms) - 1
+    while last >= 0:
+        first = bestStart[last]
+        runs.append(_mergedRun(indexes[atoms[first][0]:atoms[last][1] + 1]))
+        last = first - 1
+    return runs[::-1]
+
+
+def _mergedRun(indexes):
+    step = int(np.gcd.reduce(np.diff(indexes))) if indexes.size > 1 else 1
+    return slice(int(indexes[0]), int(indexes[-1]) + 1, step)
+
+
+def _normalizedRun(run):
+    # The step of a run of a single index or contiguous indexes is not needed in the request
+    if run.step == 1 or run.stop - run.start <= 1:
+        return slice(run.start, run.stop)
+    return run
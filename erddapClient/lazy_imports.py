@@ -0,0 +1,33 @@
+import importlib
+import threading
+
+
+class LazyModule:
+    """
+     Module placeholder, the module is imported when one of its attributes is
+     accessed for the first time. Used for the heavy dependencies (pandas, numpy,
+     xarray, netCDF4, requests), so importing erddapClient doesn't import them.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+    def __repr__(self):
+        return "<LazyModule '{}' ({})>".format(self._name, 'not imported' if self._module is None else 'imported')
+
+
+def lazyImport(name):
+    """
+     Returns a `LazyModule` of the module name.
+    """
+    return LazyModule(name)
@@ -1,10 +1,19 @@
 import re
+import ast
+import io
+import sys
+import time
+import tokenize
+from operator import itemgetter
 import datetime as dt
-from dateutil.parser import parse 
-from netCDF4 import date2num, num2date
 from erddapClient.erddap_constants import ERDDAP_Metadata_Rows, ERDDAP_Search_Results_Rows, ERDDAP_TIME_UNITS, ERDDAP_DATETIME_FORMAT
+from erddapClient.lazy_imports import lazyImport
 from collections import OrderedDict
-import pandas as pd
+
+dateutil_parser = lazyImport('dateutil.parser')
+netCDF4 = lazyImport('netCDF4')
+np = lazyImport('numpy')
+pd = lazyImport('pandas')
 
 def parseDictMetadata(dmetadata):
     """
@@ -12,34 +21,30 @@ def parseDictMetadata(dmetadata):
      This function receives a python dictionary created with the metadata response from a erddap dataset,
      It parses this dictionary and creates a new dictionary with the dimension variables, the data variables
      and the global metadata.
+     The rows are parsed in a single pass, and the variables, attributes names and data types
+     strings are interned, so they are shared between the metadata of many datasets.
     """
     _dimensions=OrderedDict()
     _variables=OrderedDict()
     _global=OrderedDict()
 
-    inforows = dmetadata['table']['rows']
-    for row in inforows:
-        drow = dict(zip(dmetadata['table']['columnNames'],row))
-        if row[ERDDAP_Metadata_Rows.VARIABLE_NAME] == 'NC_GLOBAL':
-            _global[row[ERDDAP_Metadata_Rows.ATTRIBUTE_NAME]] = \
-                castMetadataAttribute(row[ERDDAP_Metadata_Rows.DATA_TYPE], row[ERDDAP_Metadata_Rows.VALUE])
-        else:
-            if row[ERDDAP_Metadata_Rows.ROW_TYPE] == 'dimension':
-                _dimensions[row[ERDDAP_Metadata_Rows.VARIABLE_NAME]] = parseDimensionValue(row[ERDDAP_Metadata_Rows.VALUE])
-                _dimensions[row[ERDDAP_Metadata_Rows.VARIABLE_NAME]]['_dataType'] = row[ERDDAP_Metadata_Rows.DATA_TYPE]
-            elif row[ERDDAP_Metadata_Rows.ROW_TYPE] == 'variable':
-                _variables[row[ERDDAP_Metadata_Rows.VARIABLE_NAME]] = {}
-                _variables[row[ERDDAP_Metadata_Rows.VARIABLE_NAME]]['_dataType'] = row[ERDDAP_Metadata_Rows.DATA_TYPE]
-            else: # Attributes
-                if row[ERDDAP_Metadata_Rows.VARIABLE_NAME] in _dimensions:
-                    # Dimension atts
-                    _dimensions[row[ERDDAP_Metadata_Rows.VARIABLE_NAME]][row[ERDDAP_Metadata_Rows.ATTRIBUTE_NAME]] = \
-                        castMetadataAttribute(row[ERDDAP_Metadata_Rows.DATA_TYPE], row[ERDDAP_Metadata_Rows.VALUE])
-                else: 
-                    # Variable atts
-                    _variables[row[ERDDAP_Metadata_Rows.VARIABLE_NAME]][row[ERDDAP_Metadata_Rows.ATTRIBUTE_NAME]] = \
-                        castMetadataAttribute(row[ERDDAP_Metadata_Rows.DATA_TYPE], row[ERDDAP_Metadata_Rows.VALUE])
-    # .
+    _intern = sys.intern
+    rowFields = itemgetter(ERDDAP_Metadata_Rows.ROW_TYPE, ERDDAP_Metadata_Rows.VARIABLE_NAME, 
+                           ERDDAP_Metadata_Rows.ATTRIBUTE_NAME, ERDDAP_Metadata_Rows.DATA_TYPE, 
+                           ERDDAP_Metadata_Rows.VALUE)
+    for row in dmetadata['table']['rows']:
+        rowType, variableName, attributeName, dataType, value = rowFields(row)
+        if variableName == 'NC_GLOBAL':
+            _global[_intern(attributeName)] = castMetadataAttribute(dataType, value)
+        elif rowType == 'dimension':
+            _dimensions[_intern(variableName)] = parseDimensionValue(value)
+            _dimensions[variableName]['_dataType'] = _intern(dataType)
+        elif rowType == 'variable':
+            _variables[_intern(variableName)] = { '_dataType' : _intern(dataType) }
+        else: # Attributes
+            # Dimension atts or Variable atts
+            variableAttributes = _dimensions[variableName] if variableName in _dimensions else _variables[variableName]
+            variableAttributes[_intern(attributeName)] = castMetadataAttribute(dataType, value)
     
     return { 'global' : _global, 'dimensions' : _dimensions, 'variables' : _variables }
 
@@ -64,24 +69,17 @@ def castMetadataAttribute(data_type, valuestr):
     This method will try to cast valuestr to the data_type specified.
     valuestr can be a tuple of values separated with a comma.
     """
-    if data_type != 'String' and ',' in valuestr:
-        _lvaluestr = valuestr.split(',')
-    elif data_type == 'String':
+    if data_type == 'String':
         return valuestr
-    else:
-        _lvaluestr = [valuestr]
 
-    if data_type in ['float', 'double']:
-        _castedvalue =  [ float(v) for v in _lvaluestr ]
-    elif data_type in ['short', 'int', 'byte', 'char', 'short', 'long']:
-        _castedvalue =  [ int(v) for v in _lvaluestr ]
-    else:
-        _castedvalue =  [ v for v in _lvaluestr ]
+    castFunction = METADATA_CAST_FUNCTIONS.get(data_type, str)
+    if ',' in valuestr:
+        return tuple( castFunction(v) for v in valuestr.split(',') )
+    return castFunction(valuestr)
 
-    if len(_castedvalue) == 1:
-        return _castedvalue[0]
-    else:
-        return tuple(_castedvalue)
+METADATA_CAST_FUNCTIONS = { 'float' : float, 'double' : float, 
+                            'short' : int, 'int' : int, 'byte' : int, 'char' : int, 'long' : int,
+                            'ushort' : int, 'uint' : int, 'ubyte' : int, 'ulong' : int }
 
 def parseTimeRangeAttributes(attItems):
     for dimName, dimAtts in attItems:
@@ -89,7 +87,7 @@ def parseTimeRangeAttributes(attItems):
             dimAtts['actual_range'] = castTimeRangeAttribute(dimAtts['actual_range'], dimAtts['units'])
 
 def castTimeRangeAttribute(rangenumeric, units):
-    return ( num2date(rangenumeric[0], units), num2date(rangenumeric[1], units) )
+    return ( netCDF4.num2date(rangenumeric[0], units), netCDF4.num2date(rangenumeric[1], units) )
 
 def boolify(s):
     if s == 'true':
@@ -145,6 +143,198 @@ def parseConstraintValue(value):
     else:
         return str(value)
 
+QUERY_EXPRESSION_OPERATORS = { ast.Eq : '=', ast.NotEq : '!=', ast.Lt : '<', ast.LtE : '<=', ast.Gt : '>', ast.GtE : '>=' }
+QUERY_EXPRESSION_FLIPPED_OPERATORS = { '=' : '=', '!=' : '!=', '<' : '>', '<=' : '>=', '>' : '<', '>=' : '<=' }
+
+def parseQueryExpression(expression, variables={}):
+    """
+     This function parses a pandas-style query expression, like:
+       "sst > 20 and time >= '2020-01-01' and station in ['A','B']"
+     and splits it in the predicates that ERDDAP can evaluate as constraints
+     and the predicates that must be evaluated locally.
+
+     Only the top level "and" predicates are pushed to the server, predicates 
+     that compare a variable against a literal value with (==, !=, <, <=, >, >=)
+     are converted to regular constraints, and "in" lists are converted to a 
+     regex constraint =~"(a|b|c)". Anything else (or, not, arithmetic, functions, 
+     etc.) is kept to be evaluated locally.
+
+     Names that are keys of the `variables` dictionary are replaced by its values,
+     any other name is considered a dataset variable.
+
+     Returns a tuple with the list of constraint dictionaries, and the list 
+     of the predicates source strings that ERDDAP can't evaluate.
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as e:
+        raise Exception("Malformed query expression: {} ({})".format(expression, e))
+
+    if isinstance(tree.body, ast.BoolOp) and isinstance(tree.body.op, ast.And):
+        predicates = tree.body.values
+    else:
+        predicates = [tree.body]
+
+    source = expression.strip()
+    if hasattr(ast, 'get_source_segment'):
+        predicatesSource = [ ast.get_source_segment(source, predicate) for predicate in predicates ]
+    else:
+        # Python < 3.8, the nodes don't have its end offsets
+        predicatesSource = splitTopLevelAnd(source) if len(predicates) > 1 else [ source ]
+
+    constraints = []
+    localPredicates = []
+    for predicate, predicateSource in zip(predicates, predicatesSource):
+        predicateConstraints, pushedEntirely = parseQueryPredicate(predicate, variables)
+        constraints.extend(predicateConstraints)
+        if not pushedEntirely:
+            localPredicates.append(predicateSource)
+
+    return constraints, localPredicates
+
+
+def splitTopLevelAnd(source):
+    """
+     Splits the source of an expression in the operands of its top level "and"
+     operators, the ones out of parentheses, brackets and braces.
+    """
+    lineOffsets = [0]
+    for line in source.splitlines(True):
+        lineOffsets.append(lineOffsets[-1] + len(line))
+    offset = lambda position: lineOffsets[position[0] - 1] + position[1]
+
+    parts = []
+    partStart = 0
+    depth = 0
+    for token in tokenize.generate_tokens(io.StringIO(source).readline):
+        if token.type == tokenize.OP and token.string in ('(', '[', '{'):
+            depth += 1
+        elif token.type == tokenize.OP and token.string in (')', ']', '}'):
+            depth -= 1
+        elif token.type == tokenize.NAME and token.string == 'and' and depth == 0:
+            parts.append(source[partStart:offset(token.start)].strip())
+            partStart = offset(token.end)
+    parts.append(source[partStart:].strip())
+    return parts
+
+
+def parseQueryPredicate(predicate, variables={}):
+    """
+     Converts a single comparison node of a query expression to ERDDAP constraints.
+     Returns the list of constraints dictionaries, and True if the whole
+     predicate was converted.
+    """
+
+    def operandValue(node):
+        if isinstance(node, ast.Name):
+            if node.id in variables:
+                return True, variables[node.id]
+            return False, None
+        try:
+            return True, ast.literal_eval(node)
+        except ValueError:
+            return False, None
+
+    def isScalar(value):
+        return isinstance(value, (str, int, float, dt.datetime)) and not isinstance(value, bool)
+
+    if not isinstance(predicate, ast.Compare):
+        return [], False
+
+    constraints = []
+    pushedEntirely = True
+    operands = [predicate.left] + predicate.comparators
+    for op, left, right in zip(predicate.ops, operands[:-1], operands[1:]):
+        leftIsVariable = isinstance(left, ast.Name) and left.id not in variables
+        rightIsVariable = isinstance(right, ast.Name) and right.id not in variables
+
+        if leftIsVariable == rightIsVariable:
+            pushedEntirely = False
+            continue
+
+        variableName = left.id if leftIsVariable else right.id
+        isValue, value = operandValue(right if leftIsVariable else left)
+        if not isValue:
+            pushedEntirely = False
+            continue
+
+        if type(op) in QUERY_EXPRESSION_OPERATORS and isScalar(value):
+            operator = QUERY_EXPRESSION_OPERATORS[type(op)]
+            if not leftIsVariable:
+                operator = QUERY_EXPRESSION_FLIPPED_OPERATORS[operator]
+            constraints.append({ variableName + operator : value })
+        elif isinstance(op, ast.In) and leftIsVariable and isinstance(value, (list, tuple, set)) \
+             and len(value) > 0 and all(isScalar(v) and not isinstance(v, dt.datetime) for v in value):
+            constraints.append({ variableName + '=~' : valuesToRegex(value) })
+        else:
+            pushedEntirely = False
+
+    return constraints, pushedEntirely
+
+
+def valuesToRegex(values):
+    """
+     Returns a regex that matches any of the values, for use in ERDDAP =~ constraints.
+     valuesToRegex(['A','B']) returns '(A|B)'
+    """
+    return '({})'.format('|'.join(re.escape(str(v)) for v in values))
+
+
+def parseISO8601Duration(duration):
+    """
+     Returns the number of seconds of a ISO 8601 duration string, like the
+     ones used in the ACDD attribute time_coverage_resolution, i.e. "PT1H", "P1D".
+     Months and years are approximated with its average length.
+     Returns None if the string is not a valid duration.
+    """
+    match = match_iso8601_duration(duration) if isinstance(duration, str) else None
+    if match is None or not any(match.groups()):
+        return None
+    seconds = 0.0
+    for group, unitSeconds in zip(match.groups(), ISO8601_DURATION_SECONDS):
+        if group:
+            seconds += float(group) * unitSeconds
+    return seconds
+
+
+def parseRelativeTime(value, minTime=None, maxTime=None, nowTime=None):
+    """
+     Returns the seconds since 1970 of an ERDDAP relative time constraint value,
+     like "now-7days", "max(time)-1day" or "min(time)+6hours", resolved against
+     the `minTime` and `maxTime` of the time variable (its actual_range) and
+     `nowTime`, by default the current time. Months and years are approximated
+     with its average length. Returns None if the value is not a relative time,
+     or its reference is not known.
+    """
+    match = match_relative_time(value.strip('"')) if isinstance(value, str) else None
+    if match is None:
+        return None
+    reference, sign, amount, unit = match.groups()
+    if reference == 'now':
+        referenceTime = time.time() if nowTime is None else nowTime
+    else:
+        referenceTime = maxTime if reference.startswith('max') else minTime
+    if referenceTime is None:
+        return None
+    if amount is None:
+        return referenceTime
+    offset = float(amount) * RELATIVE_TIME_UNITS_SECONDS[unit.rstrip('s') if unit != 'millis' else unit]
+    return referenceTime + offset if sign == '+' else referenceTime - offset
+
+
+def timeIntervalString(seconds):
+    """
+     Returns the ERDDAP time interval string used in orderByClosest, i.e. "1hour", 
+     "15minutes", with the largest unit that fits the seconds. The interval is 
+     rounded up to a whole number of that unit.
+    """
+    for unit, unitSeconds in reversed(ERDDAP_TIME_INTERVAL_UNITS):
+        if seconds >= unitSeconds:
+            break
+    nunits = max(1, int(-(-seconds // unitSeconds)))
+    return "{}{}".format(nunits, unit if nunits > 1 else unit[:-1])
+
+
 def parseConstraintDateTime(dtvalue):
     if isinstance(dtvalue,dt.datetime):
         return parseConstraintPyDatetime(dtvalue)
@@ -242,16 +432,28 @@ def get_value_from_opendap_extended_slice_element(sliceElement):
 def iso8601STRtoDT(iso8601string):
     # return dt.datetime.strptime(iso8601string, ERDDAP_DATETIME_FORMAT)
     # Using dateutil parse method
-    return parse(iso8601string)
+    return dateutil_parser.parse(iso8601string)
 
 def iso8601STRtoNum(iso8601string):
-    return date2num(iso8601STRtoDT(iso8601string),ERDDAP_TIME_UNITS)
+    return netCDF4.date2num(iso8601STRtoDT(iso8601string),ERDDAP_TIME_UNITS)
 
 def numtodate(numdate):
-    return num2date(numdate, ERDDAP_TIME_UNITS)
+    return netCDF4.num2date(numdate, ERDDAP_TIME_UNITS)
 
 def dttonum(pdt):
-    return date2num(pdt, ERDDAP_TIME_UNITS)
+    return netCDF4.date2num(pdt, ERDDAP_TIME_UNITS)
+
+def datesToNumArray(values):
+    """
+     Returns a float array of seconds since 1970 from an array of numbers,
+     datetimes, numpy datetime64 or ISO 8601 strings.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in 'iuf':
+        return values.astype('float64')
+    dates = pd.DatetimeIndex(pd.to_datetime(values.ravel(), utc=True))
+    seconds = np.asarray((dates - pd.Timestamp(0, tz='UTC')) / pd.Timedelta(seconds=1), dtype='float64')
+    return seconds.reshape(values.shape)
 
 # ERDDAP Server URL
 ERDDAP_SERVERURL=r'^http.*erddap\/(\w*\.html)$'
@@ -290,14 +492,25 @@ FLOAT_NUMBER_REGEX = r'^[+-]?(?:[0-9]*)?\.[0-9]+$'
 # Intenger
 INT_NUMBER_REGEX = r'^[+-]?[0-9]+$'
 LAST_KEYWORD_REGEX = r'^last(?:[+-](?:[0-9]+)(\.[0-9]+)?)?$'
+# ISO 8601 durations, P1Y2M10DT2H30M10S
+ISO8601_DURATION_REGEX = r'^P(?:(\d+(?:\.\d+)?)Y)?(?:(\d+(?:\.\d+)?)M)?(?:(\d+(?:\.\d+)?)W)?(?:(\d+(?:\.\d+)?)D)?(?:T(?:(\d+(?:\.\d+)?)H)?(?:(\d+(?:\.\d+)?)M)?(?:(\d+(?:\.\d+)?)S)?)?$'
+ISO8601_DURATION_SECONDS = [ 31557600, 2629800, 604800, 86400, 3600, 60, 1 ]
+# Relative time constraints, now-7days, max(time)-1day
+RELATIVE_TIME_REGEX = r'^(now|max\(\w+\)|min\(\w+\))(?:([+-])(\d+(?:\.\d+)?)(millis|seconds?|minutes?|hours?|days?|months?|years?))?$'
+RELATIVE_TIME_UNITS_SECONDS = { 'millis' : 0.001, 'second' : 1, 'minute' : 60, 'hour' : 3600, 'day' : 86400,
+                                'month' : 2629800, 'year' : 31557600 }
+# Time interval units for orderByClosest, orderByMean, etc.
+ERDDAP_TIME_INTERVAL_UNITS = [ ('seconds', 1), ('minutes', 60), ('hours', 3600), ('days', 86400) ]
 
 
 match_timeoper = re.compile(CONSTRAINT_TIME_OPERATIONS_REGEX).match   
 match_iso8601 = re.compile(DATE_ISO8601_REGEX).match
 match_varoper = re.compile(CONSTRAINT_VAR_OPERATIONS_REGEX).match   
 match_float = re.compile(FLOAT_NUMBER_REGEX).match
+match_relative_time = re.compile(RELATIVE_TIME_REGEX).match
 match_int = re.compile(INT_NUMBER_REGEX).match
 match_last_keyword = re.compile(LAST_KEYWORD_REGEX).match
+match_iso8601_duration = re.compile(ISO8601_DURATION_REGEX).match
 
 # https://stackoverflow.com/questions/41129921/validate-an-iso-8601-datetime-string-in-python
 # https://stackoverflow.com/questions/12756159/regex-and-iso8601-formatted-datetime
@@ -342,146 +555,180 @@ def parseNumericVersion(string_version):
     return numversion
 
 
+# status.html parser, the patterns are compiled once and each line of the
+# status text is matched against the patterns of its line type.
+STATUS_PRE_REGEX = re.compile(r'<pre>(.*)</pre>', re.DOTALL)
+STATUS_COUNT_MEDIAN_REGEX = re.compile(r'\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?')
+STATUS_RESPONSE_TIMES_REGEX = re.compile(r'(Response|TaskThread) (Failed|Succeeded)\s*Time \((since [^)]*)\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?')
+STATUS_THREADS_REGEX = re.compile(r'Number of threads: Tomcat-waiting=(\d*), inotify=(\d*), other=(\d*)')
+STATUS_MEMORY_REGEX = re.compile(r'MemoryInUse=\s*(\d*) MB \(highWaterMark=\s*(\d*) MB\) \(Xmx ~=\s*(\d*) MB\)')
+STATUS_FAILED2LOAD_REGEX = re.compile(r'n Datasets Failed To Load \(in the last major LoadDatasets\)\s*=\s*(\d*)$')
+STATUS_SCALAR_LINES = [ ('Current time is', 'current-time'),
+                        ('Startup was at', 'startup-time'),
+                        ('nGridDatasets', 'ngriddatasets'),
+                        ('nTableDatasets', 'ntabledatasets'),
+                        ('nTotalDatasets', 'ntotaldatasets'),
+                        ('Unique users (since startup)', 'nunique_users_since_startup') ]
+STATUS_RESPONSE_TIMES_KEYS = {
+    ('Response', 'Failed', 'since last major LoadDatasets')    : ('nresponsefailed_since_lastmld', 'nresponsefailed_time_since_lastmld'),
+    ('Response', 'Failed', 'since last Daily Report')          : ('nresponsefailed_since_lastdr', 'nresponsefailed_time_since_lastdr'),
+    ('Response', 'Failed', 'since startup')                    : ('nresponsefailed_since_startup', 'nresponsefailed_time_since_startup'),
+    ('Response', 'Succeeded', 'since last major LoadDatasets') : ('nresponsesucceeded_since_lastmld', 'responsesucceeded_time_since_lastmld'),
+    ('Response', 'Succeeded', 'since last Daily Report')       : ('nresponsesucceeded_since_lastdr', 'responsesucceeded_time_since_lastdr'),
+    ('Response', 'Succeeded', 'since startup')                 : ('nresponsesucceeded_since_startup', 'responsesucceeded_time_since_startup'),
+    ('TaskThread', 'Failed', 'since last Daily Report')        : ('ntaskthreadfailed_since_lastdr', 'taskthreadfailed_time_since_lastdr'),
+    ('TaskThread', 'Failed', 'since startup')                  : ('ntaskthreadfailed_since_startup', 'taskthreadfailed_time_since_startup'),
+    ('TaskThread', 'Succeeded', 'since last Daily Report')     : ('ntaskthreadsucceeded_since_lastdr', 'taskthreadsucceeded_time_since_lastdr'),
+    ('TaskThread', 'Succeeded', 'since startup')               : ('ntaskthreadsucceeded_since_startup', 'taskthreadsucceeded_time_since_startup'),
+}
+STATUS_TIME_DISTRIBUTIONS = OrderedDict([
+    ('Major LoadDatasets Times Distribution (since last Daily Report):', 'major_loaddatasets_timedistribution_since_lastdr'),
+    ('Major LoadDatasets Times Distribution (since startup):', 'major_loaddatasets_timedistribution_since_startup'),
+    ('Minor LoadDatasets Times Distribution (since last Daily Report):', 'minor_loaddatasets_timedistribution_since_lastdr'),
+    ('Minor LoadDatasets Times Distribution (since startup):', 'minor_loaddatasets_timedistribution_since_startup'),
+    ('Response Failed Time Distribution (since last major LoadDatasets):', 'response_failed_timedistribution_since_lastmld'),
+    ('Response Failed Time Distribution (since last Daily Report):', 'response_failed_timedistribution_since_lastdr'),
+    ('Response Failed Time Distribution (since startup):', 'response_failed_timedistribution_since_startup'),
+    ('Response Succeeded Time Distribution (since last major LoadDatasets):', 'response_succeeded_timedistribution_since_lastmld'),
+    ('Response Succeeded Time Distribution (since last Daily Report):', 'response_succeeded_timedistribution_since_lastdr'),
+    ('Response Succeeded Time Distribution (since startup):', 'response_succeeded_timedistribution_since_startup'),
+    ('TaskThread Failed Time Distribution (since last Daily Report):', 'taskthread_failed_timedistribution_since_lastdr'),
+    ('TaskThread Failed Time Distribution (since startup):', 'taskthread_failed_timedistribution_since_startup'),
+    ('TaskThread Succeeded Time Distribution (since last Daily Report):', 'taskthread_succeeded_timedistribution_since_lastdr'),
+    ('TaskThread Succeeded Time Distribution (since startup):', 'taskthread_succeeded_timedistribution_since_startup'),
+])
+
+
+def _statusInt(value):
+    if value:
+        valdigits = ''.join(filter(str.isdigit, value))
+        if valdigits:
+            return int(valdigits)
+    return None
+
+
+def _statusLineValue(line, prefix):
+    value = line[len(prefix):].strip()
+    return value[1:].lstrip() if value.startswith('=') else value
+
+
 def parseERDDAPStatusPage(htmlcode, numversion):
     """
     This function expecto to get the html code of the status.html page, in the parameter `htmlcode`.
-    This string is parsed using regular expressions to extract the metrics.  Will get the scalar 
-    values and tables in pandas dataframe, all the data is returned in a OrderedDict.
+    The status text is tokenized in a single pass over its lines, to extract the metrics. Will get
+    the scalar values and tables in pandas dataframe, all the data is returned in a OrderedDict.
     """
-
-    # Helper functions
-    def tryresearchi(sregex, text, group, options=re.MULTILINE):
-        return forceint(tryresearch(sregex,text,group,options))
-
-    def tryresearch(sregex, text, group, options=re.MULTILINE):
-        match = re.search(sregex, text, options)
-        if match:
-            try:
-                return match.group(group)
-            except: 
-                return ""
-        else:
-            return ""
-
-    def forceint(val):
-        if val:
-            valdigits = filter(str.isdigit, val)
-            if valdigits:
-                return int(''.join(valdigits))
-            else:
-                return None
-        else: 
-            return None
-    ####
-    
     parsedStatus = OrderedDict()
-    pre = re.search(r'(?<=<pre>)(.*)(?=<\/pre>)', htmlcode, re.DOTALL)
+    pre = STATUS_PRE_REGEX.search(htmlcode)
     if pre is None:
         return parsedStatus
-    statusText = pre.group(1)
-    parsedStatus['current-time'] = iso8601STRtoDT(tryresearch(r'^Current time is\s*(.*)', statusText, 1))
-    parsedStatus['startup-time'] = iso8601STRtoDT(tryresearch(r'^Startup was at\s*(.*)$', statusText, 1))
-    parsedStatus['ngriddatasets'] = tryresearchi(r'^nGridDatasets\s*=\s*(.*)$', statusText, 1)
-    parsedStatus['ntabledatasets'] = tryresearchi(r'^nTableDatasets\s*=\s*(.*)$', statusText, 1)
-    parsedStatus['ntotaldatasets'] = tryresearchi(r'^nTotalDatasets\s*=\s*(.*)$', statusText, 1)
-    parsedStatus['ndatasetsfailed2load_sincelast_mld'] = tryresearchi(r'^n Datasets Failed To Load \(in the last major LoadDatasets\)\s*=\s*(\d*)$', statusText,1) 
+
+    scalars = {}
+    failed2load = []
+    timeseriesRows = []
+    distributions = OrderedDict()
+    section, sectionRows = None, None
+
+    for line in pre.group(1).split('\n'):
+
+        if section is not None:
+            # Inside a table, the tables end with a blank line or the next table title
+            if section == 'failed2load':
+                failed2load.append(line.split('(end)')[0])
+                if '(end)' in line:
+                    section = None
+                continue
+            if section == 'timeseries-header':
+                if line.lstrip().startswith('timestamp'):
+                    section, sectionRows = 'timeseries', timeseriesRows
+                continue
+            if line.strip() == '':
+                if sectionRows:
+                    section = None
+                continue
+            if line not in STATUS_TIME_DISTRIBUTIONS:
+                # Skip the ---- line under the time series column names
+                if sectionRows or set(line.strip()) - set('-'):
+                    sectionRows.append(line)
+                continue
+
+        if line in STATUS_TIME_DISTRIBUTIONS:
+            section = STATUS_TIME_DISTRIBUTIONS[line]
+            sectionRows = distributions[section] = []
+            continue
+        if line.startswith('Major LoadDatasets Time Series'):
+            section = 'timeseries-header'
+            continue
+
+        match = STATUS_RESPONSE_TIMES_REGEX.match(line)
+        if match:
+            for key, value in zip(STATUS_RESPONSE_TIMES_KEYS.get(match.group(1, 2, 3), []), match.group(4, 5)):
+                scalars.setdefault(key, _statusInt(value))
+            continue
+        match = STATUS_FAILED2LOAD_REGEX.match(line)
+        if match:
+            scalars.setdefault('ndatasetsfailed2load_sincelast_mld', _statusInt(match.group(1)))
+            section = 'failed2load'
+            continue
+        match = STATUS_THREADS_REGEX.match(line)
+        if match:
+            for key, value in zip(['nthreads_tomwait', 'nthreads_inotify', 'nthreads_other'], match.groups()):
+                scalars.setdefault(key, _statusInt(value))
+            continue
+        match = STATUS_MEMORY_REGEX.match(line)
+        if match:
+            for key, value in zip(['memoryinuse', 'highwatermark', 'xmx'], match.groups()):
+                scalars.setdefault(key, _statusInt(value))
+            continue
+        for prefix, key in STATUS_SCALAR_LINES:
+            if line.startswith(prefix):
+                scalars.setdefault(key, _statusLineValue(line, prefix))
+                break
+
+    parsedStatus['current-time'] = iso8601STRtoDT(scalars['current-time']) if scalars.get('current-time') else None
+    parsedStatus['startup-time'] = iso8601STRtoDT(scalars['startup-time']) if scalars.get('startup-time') else None
+    parsedStatus['ngriddatasets'] = _statusInt(scalars.get('ngriddatasets'))
+    parsedStatus['ntabledatasets'] = _statusInt(scalars.get('ntabledatasets'))
+    parsedStatus['ntotaldatasets'] = _statusInt(scalars.get('ntotaldatasets'))
+    parsedStatus['ndatasetsfailed2load_sincelast_mld'] = scalars.get('ndatasetsfailed2load_sincelast_mld')
 
     # Dataset names that failes to load
-    _datasets_failes2load = tryresearch(r'^n Datasets Failed To Load \(in the last major LoadDatasets\) = \d*\n(.*)\(end\)',statusText,1, re.DOTALL | re.MULTILINE)
-    _datasets_failes2load = _datasets_failes2load.replace('\n','').strip().split(',')
-    _datasets_failes2load = [ dst.strip() for dst in _datasets_failes2load if dst != '' ]
-    parsedStatus['datasetsfailed2load_sincelast_mld'] = _datasets_failes2load
+    _datasets_failes2load = ''.join(failed2load).strip().split(',')
+    parsedStatus['datasetsfailed2load_sincelast_mld'] = [ dst.strip() for dst in _datasets_failes2load if dst != '' ]
 
     if numversion >= 2.12:
-        parsedStatus['nunique_users_since_startup'] = tryresearchi(r'^Unique users \(since startup\)\s*n =\s*(.*)$', statusText, 1)
-
-    parsedStatus['nresponsefailed_since_lastmld'] = tryresearchi(r'Response Failed\s*Time \(since last major LoadDatasets\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', statusText, 1)
-    parsedStatus['nresponsefailed_time_since_lastmld'] = tryresearchi(r'Response Failed\s*Time \(since last major LoadDatasets\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', statusText, 2)
-    parsedStatus['nresponsefailed_since_lastdr'] = tryresearchi(r'Response Failed\s*Time \(since last Daily Report\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', statusText, 1)
-    parsedStatus['nresponsefailed_time_since_lastdr'] = tryresearchi(r'Response Failed\s*Time \(since last Daily Report\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', statusText, 2)
-    parsedStatus['nresponsefailed_since_startup'] = tryresearchi(r'Response Failed\s*Time \(since startup\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', statusText, 1)
-    parsedStatus['nresponsefailed_time_since_startup'] = tryresearchi(r'Response Failed\s*Time \(since startup\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', statusText, 2)    
-
-    parsedStatus['nresponsesucceeded_since_lastmld'] = tryresearchi(r'Response Succeeded\s*Time \(since last major LoadDatasets\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', statusText, 1)
-    parsedStatus['responsesucceeded_time_since_lastmld'] = tryresearchi(r'Response Succeeded\s*Time \(since last major LoadDatasets\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', statusText, 2)    
-    parsedStatus['nresponsesucceeded_since_lastdr'] = tryresearchi(r'Response Succeeded\s*Time \(since last Daily Report\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', statusText, 1)
-    parsedStatus['responsesucceeded_time_since_lastdr'] = tryresearchi(r'Response Succeeded\s*Time \(since last Daily Report\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', statusText, 2)  
-    parsedStatus['nresponsesucceeded_since_startup'] = tryresearchi(r'Response Succeeded\s*Time \(since startup\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', statusText, 1)
-    parsedStatus['responsesucceeded_time_since_startup'] = tryresearchi(r'Response Succeeded\s*Time \(since startup\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', statusText, 2)            
-
-    parsedStatus['ntaskthreadfailed_since_lastdr'] = tryresearchi(r'TaskThread Failed\s* Time \(since last Daily Report\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', statusText, 1)
-    parsedStatus['taskthreadfailed_time_since_lastdr'] = tryresearchi(r'TaskThread Failed\s* Time \(since last Daily Report\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', statusText, 2)
-    parsedStatus['ntaskthreadfailed_since_startup'] = tryresearchi(r'TaskThread Failed\s* Time \(since startup\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', statusText, 1)
-    parsedStatus['taskthreadfailed_time_since_startup'] = tryresearchi(r'TaskThread Failed\s* Time \(since startup\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', statusText, 2)
-
-    parsedStatus['ntaskthreadsucceeded_since_lastdr'] = tryresearchi(r'TaskThread Succeeded Time \(since last Daily Report\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', statusText, 1)
-    parsedStatus['taskthreadsucceeded_time_since_lastdr'] = tryresearchi(r'TaskThread Succeeded Time \(since last Daily Report\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', statusText, 2)
-    parsedStatus['ntaskthreadsucceeded_since_startup'] = tryresearchi(r'TaskThread Succeeded Time \(since startup\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', statusText, 1)
-    parsedStatus['taskthreadsucceeded_time_since_startup'] = tryresearchi(r'TaskThread Succeeded Time \(since startup\)\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', statusText, 2)
-
-    parsedStatus['nthreads_tomwait'] = tryresearchi(r'^Number of threads: Tomcat-waiting=(\d*), inotify=(\d*), other=(\d*)',statusText,1)
-    parsedStatus['nthreads_inotify'] = tryresearchi(r'^Number of threads: Tomcat-waiting=(\d*), inotify=(\d*), other=(\d*)',statusText,2)
-    parsedStatus['nthreads_other'] = tryresearchi(r'^Number of threads: Tomcat-waiting=(\d*), inotify=(\d*), other=(\d*)',statusText,3)
-
-    parsedStatus['memoryinuse'] = tryresearchi(r'^MemoryInUse=\s*(\d*) MB \(highWaterMark=\s*(\d*) MB\) \(Xmx ~=\s*(\d*) MB\)', statusText,1)
-    parsedStatus['highwatermark'] = tryresearchi(r'^MemoryInUse=\s*(\d*) MB \(highWaterMark=\s*(\d*) MB\) \(Xmx ~=\s*(\d*) MB\)', statusText,2)
-    parsedStatus['xmx'] = tryresearchi(r'^MemoryInUse=\s*(\d*) MB \(highWaterMark=\s*(\d*) MB\) \(Xmx ~=\s*(\d*) MB\)', statusText,3)
+        parsedStatus['nunique_users_since_startup'] = _statusInt(scalars.get('nunique_users_since_startup'))
+
+    for keys in STATUS_RESPONSE_TIMES_KEYS.values():
+        for key in keys:
+            parsedStatus[key] = scalars.get(key)
+    for key in ['nthreads_tomwait', 'nthreads_inotify', 'nthreads_other', 'memoryinuse', 'highwatermark', 'xmx']:
+        parsedStatus[key] = scalars.get(key)
 
     # Major LoadDatasets Time Series
-    if numversion >= 2.12:
-        _major_loaddatasets_timeseries = tryresearch(r'Major LoadDatasets Time Series.*Open\n\s*timestamp.*Files\n(?:-|\s)*\n((.|\n)*)(?:Major LoadDatasets Times Distribution \(since last Daily Report\))', statusText,1)
-    else:
-        _major_loaddatasets_timeseries = tryresearch(r'Major LoadDatasets Time Series.*Memory \(MB\)\n\s*timestamp.*highWater\n((.|\n)*)(?:Major LoadDatasets Times Distribution \(since last Daily Report\))', statusText,1)
-    # Remove characters from timeseries text table : (,),% 
-    _major_loaddatasets_timeseries = _major_loaddatasets_timeseries.replace('(','').replace(')','').replace('&#37;','').split('\n')
-    
-    _major_loaddatasets_timeseries = [ row.split() for row in _major_loaddatasets_timeseries if row != '' ]
-    _major_loaddatasets_timeseries = [ [ iso8601STRtoDT(col) if idx==0 else forceint(col) for idx, col in enumerate(row) ] for row in _major_loaddatasets_timeseries ]
     if numversion >= 2.12:
         mldts_columns = ['timestamp', 'mld_time', 'DL_ntry', 'DL_nfail', 'DL_ntotal', 'R_nsuccess','R_ns_median', 'R_nfailed','R_nf_median','R_memfail','R_toomany','NT_tomwait','NT_notify','NT_other','M_inuse','open_files_percent']
     elif numversion >= 2.10:
         mldts_columns = ['timestamp', 'mld_time', 'DL_ntry', 'DL_nfail', 'DL_ntotal', 'R_nsuccess','R_ns_median', 'R_nfailed','R_nf_median','R_memfail','NT_tomwait','NT_notify','NT_other','M_inuse','M_highwater']
     else:
         mldts_columns = ['timestamp', 'mld_time', 'DL_ntry', 'DL_nfail', 'DL_ntotal', 'R_nsuccess','R_ns_median', 'R_nfailed','R_nf_median','NT_tomwait','NT_notify','NT_other','M_inuse','M_highwater']
-
-    _major_loaddatasets_timeseries_df = pd.DataFrame(_major_loaddatasets_timeseries, 
-                                                     columns=mldts_columns)
+    # Remove characters from timeseries text table : (,),% 
+    _major_loaddatasets_timeseries = [ row.replace('(','').replace(')','').replace('&#37;','').split() for row in timeseriesRows ]
+    _major_loaddatasets_timeseries = [ [ iso8601STRtoDT(col) if idx==0 else _statusInt(col) for idx, col in enumerate(row) ]
+                                       for row in _major_loaddatasets_timeseries if len(row) == len(mldts_columns) ]
+    _major_loaddatasets_timeseries_df = pd.DataFrame(_major_loaddatasets_timeseries, columns=mldts_columns)
     _major_loaddatasets_timeseries_df.set_index('timestamp',inplace=True)
     parsedStatus['major_loaddatasets_timeseries'] = _major_loaddatasets_timeseries_df
 
-    # Timedistributions Loop
-    td_items = [
-        { 'key' : 'major_loaddatasets_timedistribution_since_lastdr'   , 'regex' : r'Major LoadDatasets Times Distribution \(since last Daily Report\):\n((.|\n)*)Major LoadDatasets Times Distribution \(since startup\):', 'group' : 1 },
-        { 'key' : 'major_loaddatasets_timedistribution_since_startup'  , 'regex' : r'Major LoadDatasets Times Distribution \(since startup\):\n((.|\n)*)Minor LoadDatasets Times Distribution \(since last Daily Report\):', 'group' : 1 },
-        { 'key' : 'minor_loaddatasets_timedistribution_since_lastdr'   , 'regex' : r'Minor LoadDatasets Times Distribution \(since last Daily Report\):\n((.|\n)*)Minor LoadDatasets Times Distribution \(since startup\):', 'group' : 1 },
-        { 'key' : 'minor_loaddatasets_timedistribution_since_startup'  , 'regex' : r'Minor LoadDatasets Times Distribution \(since startup\):\n((.|\n)*)Response Failed Time Distribution \(since last major LoadDatasets\):', 'group' : 1 },
-        { 'key' : 'response_failed_timedistribution_since_lastmld'     , 'regex' : r'Response Failed Time Distribution \(since last major LoadDatasets\):\n((.|\n)*)Response Failed Time Distribution \(since last Daily Report\):', 'group' : 1 },
-        { 'key' : 'response_failed_timedistribution_since_lastdr'      , 'regex' : r'Response Failed Time Distribution \(since last Daily Report\):\n((.|\n)*)Response Failed Time Distribution \(since startup\):', 'group' : 1 },
-        { 'key' : 'response_failed_timedistribution_since_startup'     , 'regex' : r'Response Failed Time Distribution \(since startup\):\n((.|\n)*)Response Succeeded Time Distribution \(since last major LoadDatasets\):', 'group' : 1 },
-        { 'key' : 'response_succeeded_timedistribution_since_lastmld'  , 'regex' : r'Response Succeeded Time Distribution \(since last major LoadDatasets\):\n((.|\n)*)Response Succeeded Time Distribution \(since last Daily Report\):', 'group' : 1 },
-        { 'key' : 'response_succeeded_timedistribution_since_lastdr'   , 'regex' : r'Response Succeeded Time Distribution \(since last Daily Report\):\n((.|\n)*)Response Succeeded Time Distribution \(since startup\):', 'group' : 1 },
-        { 'key' : 'response_succeeded_timedistribution_since_startup'  , 'regex' : r'Response Succeeded Time Distribution \(since startup\):\n((.|\n)*)TaskThread Failed Time Distribution \(since last Daily Report\):', 'group' : 1 },
-        { 'key' : 'taskthread_failed_timedistribution_since_lastdr'    , 'regex' : r'TaskThread Failed Time Distribution \(since last Daily Report\):\n((.|\n)*)TaskThread Failed Time Distribution \(since startup\):', 'group' : 1 },
-        { 'key' : 'taskthread_failed_timedistribution_since_startup'   , 'regex' : r'TaskThread Failed Time Distribution \(since startup\):\n((.|\n)*)TaskThread Succeeded Time Distribution \(since last Daily Report\):', 'group' : 1 },
-        { 'key' : 'taskthread_succeeded_timedistribution_since_lastdr' , 'regex' : r'TaskThread Succeeded Time Distribution \(since last Daily Report\):\n((.|\n)*)TaskThread Succeeded Time Distribution \(since startup\):', 'group' : 1 },
-        { 'key' : 'taskthread_succeeded_timedistribution_since_startup', 'regex' : r'TaskThread Succeeded Time Distribution \(since startup\):\n((.|\n)*)SgtMap topography ', 'group' : 1 },
-    ]
-
-    for idx, td_item in enumerate(td_items):
-        _td_item = tryresearch(td_item['regex'], statusText, 1)
-        _td_item = _td_item.replace('&lt;','<').replace('&gt;','>').split('\n')
-        _ntime__td_item = _td_item[0]
-        parsedStatus[ 'n_' + td_item['key']] = tryresearchi(r'\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', _ntime__td_item, 1)
-        parsedStatus[ 'nmedian_' + td_item['key']] = tryresearchi(r'\s*n =\s*(\d*)(?:,\s*median ~=\s*(\d*) ms)?', _ntime__td_item, 2)
-
-        _td_item = _td_item[1:]
-        _td_item = [ row.split(':') for row in _td_item if row != ''] 
-        _td_item = [ [ col if idx==0 else forceint(col) for idx, col in enumerate(row) ] for row in _td_item ]
-        _td_item_df = pd.DataFrame(_td_item, columns=['time_distribution', 'n'])
-        parsedStatus[td_item['key']] = _td_item_df
-
-    return parsedStatus
+    # Time distributions, the first row of the table has the count and median
+    for td_key in STATUS_TIME_DISTRIBUTIONS.values():
+        _td_item = distributions.get(td_key, [])
+        _nmatch = STATUS_COUNT_MEDIAN_REGEX.match(_td_item[0]) if _td_item else None
+        parsedStatus[ 'n_' + td_key] = _statusInt(_nmatch.group(1)) if _nmatch else None
+        parsedStatus[ 'nmedian_' + td_key] = _statusInt(_nmatch.group(2)) if _nmatch else None
 
+        _td_item = [ row.replace('&lt;','<').replace('&gt;','>').split(':') for row in _td_item[1:] ]
+        _td_item = [ [ row[0], _statusInt(row[1]) ] for row in _td_item if len(row) == 2 ]
+        parsedStatus[td_key] = pd.DataFrame(_td_item, columns=['time_distribution', 'n'])
 
-    
-    
\ No newline at end of file
+    return parsedStatus
@@ -0,0 +1,182 @@
+from erddapClient.lazy_imports import lazyImport
+import heapq
+
+np = lazyImport('numpy')
+
+
+def polygonRings(geom):
+    """
+     Returns the list of rings of a polygon geometry, as arrays of (longitude, latitude)
+     vertices. The geometry can be an array of vertices, a list of polygons vertices,
+     a GeoJSON like dictionary of a Polygon or MultiPolygon, or any object with the
+     __geo_interface__ property (shapely geometries). The holes are additional rings,
+     the points inside an even number of rings are outside the polygon.
+    """
+    if hasattr(geom, '__geo_interface__'):
+        geom = geom.__geo_interface__
+    if isinstance(geom, dict):
+        if geom.get('type') == 'Feature':
+            return polygonRings(geom['geometry'])
+        if geom.get('type') == 'Polygon':
+            return [ np.asarray(ring, dtype='float64')[:, :2] for ring in geom['coordinates'] ]
+        if geom.get('type') == 'MultiPolygon':
+            return [ np.asarray(ring, dtype='float64')[:, :2] for polygon in geom['coordinates'] for ring in polygon ]
+        raise Exception("Geometry type {} is not a Polygon or MultiPolygon".format(geom.get('type')))
+
+    vertices = np.asarray(geom, dtype='object')
+    if vertices.ndim == 2 and vertices.shape[1] == 2 and all(np.ndim(v) == 0 for v in vertices.ravel()):
+        rings = [ np.asarray(geom, dtype='float64') ]
+    else:
+        rings = [ ring for polygon in geom for ring in polygonRings(polygon) ]
+    for ring in rings:
+        if ring.ndim != 2 or ring.shape[0] < 3:
+            raise Exception("A polygon ring needs at least 3 (longitude, latitude) vertices")
+    return rings
+
+
+def rasterizePolygon(rings, lonValues, latValues):
+    """
+     Returns the boolean mask, with shape (latitude, longitude), of the grid
+     cells with its center inside the polygon rings. The even-odd rule is
+     evaluated with a scanline per latitude: the crossings of all the rings
+     edges with every latitude are computed at once, and each crossing toggles
+     the cells east of it.
+    """
+    lonValues = np.asarray(lonValues, dtype='float64')
+    latValues = np.asarray(latValues, dtype='float64')
+    lonOrder = np.argsort(lonValues, kind='stable')
+    sortedLon = lonValues[lonOrder]
+
+    edgesStart = np.concatenate([ ring for ring in rings ])
+    edgesEnd = np.concatenate([ np.roll(ring, -1, axis=0) for ring in rings ])
+    x1, y1 = edgesStart[:, 0], edgesStart[:, 1]
+    x2, y2 = edgesEnd[:, 0], edgesEnd[:, 1]
+
+    # Crossings of the edges with the latitudes, half open to count the vertices once
+    lat = latValues[:, None]
+    crosses = (y1 <= lat) != (y2 <= lat)
+    rowsIdx, edgesIdx = np.nonzero(crosses)
+    crossingLon = x1[edgesIdx] + (latValues[rowsIdx] - y1[edgesIdx]) * \
+                  (x2[edgesIdx] - x1[edgesIdx]) / (y2[edgesIdx] - y1[edgesIdx])
+
+    toggles = np.zeros((latValues.size, lonValues.size + 1), dtype='int32')
+    np.add.at(toggles, (rowsIdx, np.searchsorted(sortedLon, crossingLon, side='right')), 1)
+    sortedMask = (np.cumsum(toggles[:, :-1], axis=1) % 2).astype(bool)
+
+    mask = np.empty_like(sortedMask)
+    mask[:, lonOrder] = sortedMask
+    return mask
+
+
+def seamShift(mask):
+    """
+     Returns the number of columns to roll a mask, of a longitude dimension that
+     covers the 360 degrees, to make its True cells contiguous: the end of the
+     biggest gap of empty columns. Returns 0 if the first or last columns are
+     empty, the mask doesn't cross the longitude boundary.
+    """
+    occupied = mask.any(axis=0)
+    if not occupied[0] or not occupied[-1] or occupied.all():
+        return 0
+    emptyChanges = np.flatnonzero(np.diff(np.concatenate([[0], (~occupied).astype('int8'), [0]])))
+    gapStarts, gapStops = emptyChanges[::2], emptyChanges[1::2]
+    return int(gapStops[np.argmax(gapStops - gapStarts)])
+
+
+def polygonTiles(mask, maxWaste=0.25, maxTiles=32, minTileCells=4096):
+    """
+     Splits the True cells of a 2D mask in rectangular tiles. Starting from the
+     bounding box of the cells, the tile with most wasted cells (False cells
+     inside the tile) is split in two, along the row or column that minimizes
+     the area of the two parts bounding boxes, until the wasted fraction of
+     every tile is under `maxWaste` or there are `maxTiles` tiles. The tiles
+     smaller than `minTileCells` are not split, the cost of another request is
+     bigger than the wasted cells.
+
+     Returns the list of tiles as (rowStart, rowStop, colStart, colStop) tuples,
+     the stops are exclusive.
+    """
+    tiles = []
+    box = _boundingBox(mask, 0, mask.shape[0], 0, mask.shape[1])
+    if box is None:
+        return tiles
+    heap = [ _tileEntry(mask, box) ]
+    while heap:
+        negWasted, area, tile = heapq.heappop(heap)
+        if -negWasted <= maxWaste * area or area <= minTileCells or len(heap) + len(tiles) + 1 >= maxTiles:
+            tiles.append(tile)
+            continue
+        parts = _splitTile(mask, tile)
+        if parts is None:
+            tiles.append(tile)
+            continue
+        for part in parts:
+            heapq.heappush(heap, _tileEntry(mask, part))
+    return sorted(tiles)
+
+
+def _tileEntry(mask, tile):
+    r0, r1, c0, c1 = tile
+    area = (r1 - r0) * (c1 - c0)
+    wasted = area - int(mask[r0:r1, c0:c1].sum())
+    # heapq pops the smallest, the tiles with more wasted cells first
+    return (-wasted, area, tile)
+
+
+def _boundingBox(mask, r0, r1, c0, c1):
+    tileMask = mask[r0:r1, c0:c1]
+    rows = np.flatnonzero(tileMask.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(tileMask.any(axis=0))
+    return (r0 + int(rows[0]), r0 + int(rows[-1]) + 1, c0 + int(cols[0]), c0 + int(cols[-1]) + 1)
+
+
+def _splitAreas(tileMask):
+    """
+     Returns the sum of the bounding boxes areas of the two parts of the mask,
+     split before each row (index 1 to rows - 1).
+    """
+    nRows, nCols = tileMask.shape
+    occupied = tileMask.any(axis=1)
+    firstCol = np.where(occupied, tileMask.argmax(axis=1), nCols)
+    lastCol = np.where(occupied, nCols - 1 - tileMask[:, ::-1].argmax(axis=1), -1)
+    rowsIdx = np.arange(nRows)
+
+    def partAreas(firstCol, lastCol, occupied, rowsIdx):
+        # Bounding box area of the rows [0, k] for each k
+        minCol = np.minimum.accumulate(firstCol)
+        maxCol = np.maximum.accumulate(lastCol)
+        firstRow = np.where(occupied, rowsIdx, nRows)
+        minRow = np.minimum.accumulate(firstRow)
+        maxRow = np.maximum.accumulate(np.where(occupied, rowsIdx, -1))
+        return np.where(maxRow >= 0, (maxRow - minRow + 1) * (maxCol - minCol + 1), 0)
+
+    topAreas = partAreas(firstCol, lastCol, occupied, rowsIdx)
+    bottomAreas = partAreas(firstCol[::-1], lastCol[::-1], occupied[::-1], rowsIdx)[::-1]
+    return topAreas[:-1] + bottomAreas[1:]
+
+
+def _splitTile(mask, tile):
+    r0, r1, c0, c1 = tile
+    tileMask = mask[r0:r1, c0:c1]
+    candidates = []
+    if r1 - r0 > 1:
+        areas = _splitAreas(tileMask)
+        k = int(areas.argmin())
+        candidates.append((areas[k], ((r0, r0 + k + 1, c0, c1), (r0 + k + 1, r1, c0, c1))))
+    if c1 - c0 > 1:
+        areas = _splitAreas(tileMask.T)
+        k = int(areas.argmin())
+        candidates.append((areas[k], ((r0, r1, c0, c0 + k + 1), (r0, r1, c0 + k + 1, c1))))
+    if not candidates:
+        return None
+    area, parts = min(candidates, key=lambda candidate: candidate[0])
+    if area >= (r1 - r0) * (c1 - c0):
+        # No cut reduces the area (a ring around a hole), cut the longer side by the middle
+        if r1 - r0 >= c1 - c0:
+            parts = ((r0, (r0 + r1) // 2, c0, c1), ((r0 + r1) // 2, r1, c0, c1))
+        else:
+            parts = ((r0, r1, c0, (c0 + c1) // 2), (r0, r1, (c0 + c1) // 2, c1))
+    parts = [ _boundingBox(mask, *part) for part in parts ]
+    return [ part for part in parts if part is not None ]
@@ -0,0 +1,71 @@
+from erddapClient.lazy_imports import lazyImport
+
+np = lazyImport('numpy')
+
+
+REDUCE_OPERATIONS = ['count', 'sum', 'mean', 'var', 'std', 'min', 'max']
+
+
+class RunningStatistics:
+    """
+     Running count, mean, sum of squared deviations, min and max of arrays
+     reduced along an axis, updated chunk by chunk. The statistics of each chunk
+     are merged with the pairwise update of Chan et al., the generalization of
+     Welford's algorithm, numerically stable for long series. NaN values are ignored.
+    """
+
+    def __init__(self):
+        self.count = None
+        self.mean = None
+        self.m2 = None
+        self.min = None
+        self.max = None
+
+    def update(self, values, axis=0):
+        values = np.asarray(values, dtype='float64')
+        valid = ~np.isnan(values)
+        chunkCount = valid.sum(axis=axis)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            chunkMean = np.where(chunkCount > 0, np.where(valid, values, 0.0).sum(axis=axis) / chunkCount, 0.0)
+            deviations = np.where(valid, values - np.expand_dims(chunkMean, axis), 0.0)
+        chunkM2 = (deviations * deviations).sum(axis=axis)
+        chunkMin = np.where(valid, values, np.inf).min(axis=axis)
+        chunkMax = np.where(valid, values, -np.inf).max(axis=axis)
+
+        if self.count is None:
+            self.count, self.mean, self.m2 = chunkCount, chunkMean, chunkM2
+            self.min, self.max = chunkMin, chunkMax
+            return self
+        totalCount = self.count + chunkCount
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = chunkMean - self.mean
+            chunkWeight = np.where(totalCount > 0, chunkCount / totalCount, 0.0)
+            self.mean = self.mean + delta * chunkWeight
+            self.m2 = self.m2 + chunkM2 + delta * delta * self.count * chunkWeight
+        self.count = totalCount
+        self.min = np.minimum(self.min, chunkMin)
+        self.max = np.maximum(self.max, chunkMax)
+        return self
+
+    def result(self, operation, ddof=0):
+        """
+         Returns the array of a reduction operation: count, sum, mean, var, std,
+         min or max. The cells without values are NaN, except for count.
+        """
+        if operation not in REDUCE_OPERATIONS:
+            raise Exception("Invalid reduce operation {}, valid operations: {}".format(operation, ", ".join(REDUCE_OPERATIONS)))
+        if operation == 'count':
+            return self.count
+        empty = self.count == 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if operation == 'sum':
+                values = self.mean * self.count
+            elif operation == 'mean':
+                values = self.mean
+            elif operation in ('var', 'std'):
+                values = np.where(self.count > ddof, self.m2 / (self.count - ddof), np.nan)
+                if operation == 'std':
+                    values = np.sqrt(values)
+            else:
+                values = self.min if operation == 'min' else self.max
+        return np.where(empty, np.nan, values)
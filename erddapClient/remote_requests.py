@@ -1,8 +1,15 @@
+from erddapClient.lazy_imports import lazyImport
 from functools import lru_cache
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 import os
 import re
 
+requests = lazyImport('requests')
+
+
+DEFAULT_WORKERS = 8
+
 
 def getMessageError(response):
     """
@@ -26,3 +33,98 @@ def urlread(url, auth=None, **kwargs):
         print ("ERDDAP Error: \"{}\"".format(getMessageError(response.text)))
         response.raise_for_status()
 
+
+
+def urlreadIfModified(url, validators={}, auth=None, **kwargs):
+    """
+     Makes a conditional request, using the ETag and Last-Modified validators 
+     of a previous response. Returns None if the server responds the content 
+     didn't change (304), otherwise returns the response. This request is not cached.
+    """
+    headers = dict(kwargs.pop('headers', {}))
+    if 'ETag' in validators:
+        headers['If-None-Match'] = validators['ETag']
+    if 'Last-Modified' in validators:
+        headers['If-Modified-Since'] = validators['Last-Modified']
+    response = requests.get(url, auth=auth, headers=headers, **kwargs)
+    if response.status_code == 304:
+        return None
+    elif response.status_code == 200:
+        return response
+    else:
+        print ("ERDDAP Error: \"{}\"".format(getMessageError(response.text)))
+        response.raise_for_status()
+
+
+def responseValidators(response):
+    """
+     Returns a dictionary with the ETag and Last-Modified headers of a response.
+    """
+    return { k : response.headers[k] for k in ['ETag', 'Last-Modified'] if k in response.headers }
+
+
+def urlstream(url, auth=None, **kwargs):
+    """
+     Makes a streamed request, the response content is not downloaded until 
+     it's read, using response.iter_content or response.raw. This request is 
+     not cached.
+    """
+    response = requests.get(url, auth=auth, stream=True, **kwargs)
+    if response.status_code == 200:
+        response.raw.decode_content = True
+        return response
+    else:
+        print ("ERDDAP Error: \"{}\"".format(getMessageError(response.text)))
+        response.raise_for_status()
+
+
+def mapConcurrently(function, items, workers=DEFAULT_WORKERS):
+    """
+     Calls function for each element of items using a pool of threads, and 
+     returns the list of results in the same order of items.
+     The first exception raised by a call is raised again.
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [ function(item) for item in items ]
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as executor:
+        return list(executor.map(function, items))
+
+
+def mapPrefetched(function, items, prefetch=1):
+    """
+     Generator of the results of function for each element of items, in the
+     same order, the next `prefetch` calls run concurrently in background threads
+     while the caller consumes the current result. At most prefetch + 1 results
+     are kept.
+    """
+    items = iter(items)
+    end = object()
+    if prefetch < 1:
+        for item in items:
+            yield function(item)
+        return
+    with ThreadPoolExecutor(max_workers=prefetch) as executor:
+        pending = [ executor.submit(function, item) for item in islice(items, prefetch) ]
+        while pending:
+            future = pending.pop(0)
+            nextItem = next(items, end)
+            if nextItem is not end:
+                pending.append(executor.submit(function, nextItem))
+            yield future.result()
+
+
+def isEmptyResultError(error):
+    """
+     Returns True if the exception is the ERDDAP http error for a query that 
+     produced no matching results (status code 404).
+    """
+    return isinstance(error, requests.exceptions.HTTPError) and \
+           error.response is not None and error.response.status_code == 404
+
+
+def isTimeoutError(error):
+    """
+     Returns True if the exception is a connection or read timeout of a request.
+    """
+    return isinstance(error, requests.exceptions.Timeout)
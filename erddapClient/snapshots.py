@@ -0,0 +1,124 @@
+from erddapClient.erddap_constants import ERDDAP_Metadata_Rows
+from erddapClient.lazy_imports import lazyImport
+import hashlib
+import json
+import os
+
+np = lazyImport('numpy')
+
+
+SNAPSHOT_DIR = os.environ.get('ERDDAP_SNAPSHOT_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'erddapClient', 'snapshots'))
+MANIFEST_FILENAME = 'manifest.json'
+METADATA_FILENAME = 'metadata.json'
+OVERVIEWS_DIRNAME = 'overviews'
+TOKEN_ATTRIBUTES = ['date_created', 'history', 'time_coverage_end']
+
+
+def snapshotPath(snapshotDir, erddapurl, datasetid):
+    """
+     Returns the directory of the snapshot of a dataset, the server url is hashed
+     to use it as a directory name.
+    """
+    serverKey = hashlib.sha1(erddapurl.rstrip('/').encode('utf-8')).hexdigest()[:16]
+    return os.path.join(snapshotDir or SNAPSHOT_DIR, serverKey, datasetid)
+
+
+def metadataToken(rawMetadata):
+    """
+     Returns the staleness token of the dataset info json response, a hash of
+     the global attributes that change when the dataset is updated.
+    """
+    globalAttributes = { row[ERDDAP_Metadata_Rows.ATTRIBUTE_NAME] : row[ERDDAP_Metadata_Rows.VALUE]
+                         for row in rawMetadata['table']['rows']
+                         if row[ERDDAP_Metadata_Rows.VARIABLE_NAME] == 'NC_GLOBAL' and
+                            row[ERDDAP_Metadata_Rows.ATTRIBUTE_NAME] in TOKEN_ATTRIBUTES }
+    return attributesToken(globalAttributes)
+
+
+def attributesToken(globalAttributes):
+    """
+     Returns the staleness token of a dictionary of global attributes.
+    """
+    tokenSource = "\n".join( "{}={}".format(attName, globalAttributes.get(attName, '')) for attName in TOKEN_ATTRIBUTES )
+    return hashlib.sha1(tokenSource.encode('utf-8')).hexdigest()
+
+
+def writeSnapshot(path, manifest, rawMetadata, arrays={}):
+    """
+     Writes the snapshot files: the info json response, a .npy file for each
+     array, and the manifest. The manifest is written last, so a snapshot
+     without manifest is incomplete and ignored by readSnapshot.
+    """
+    os.makedirs(path, exist_ok=True)
+    manifestPath = os.path.join(path, MANIFEST_FILENAME)
+    if os.path.exists(manifestPath):
+        os.remove(manifestPath)
+    manifest = dict(manifest, arrays=list(arrays.keys()))
+
+    _writeReplace(os.path.join(path, METADATA_FILENAME), lambda f: f.write(json.dumps(rawMetadata).encode('utf-8')))
+    for arrayName, arrayValues in arrays.items():
+        _writeReplace(os.path.join(path, arrayName + '.npy'), lambda f: np.save(f, np.asarray(arrayValues), allow_pickle=False))
+    _writeReplace(manifestPath, lambda f: f.write(json.dumps(manifest).encode('utf-8')))
+
+
+def readSnapshot(path):
+    """
+     Reads a snapshot, returns a tuple with the manifest, the info json response
+     and a dictionary with the arrays, memory mapped. Returns None if the snapshot
+     doesn't exist.
+    """
+    manifestPath = os.path.join(path, MANIFEST_FILENAME)
+    if not os.path.exists(manifestPath):
+        return None
+    with open(manifestPath) as f:
+        manifest = json.load(f)
+    with open(os.path.join(path, METADATA_FILENAME)) as f:
+        rawMetadata = json.load(f)
+    arrays = { arrayName : np.load(os.path.join(path, arrayName + '.npy'), mmap_mode='r')
+               for arrayName in manifest['arrays'] }
+    return manifest, rawMetadata, arrays
+
+
+def overviewsPath(snapshotDir, erddapurl, datasetid, key):
+    """
+     Returns the directory of the overviews pyramid of a dataset subset, next to
+     the dataset snapshot, `key` identifies the variables and subset.
+    """
+    return os.path.join(snapshotPath(snapshotDir, erddapurl, datasetid), OVERVIEWS_DIRNAME, key)
+
+
+def writeOverviewLevel(path, strides, arrays):
+    """
+     Writes the variables arrays of an overview level, a .npz file named by the
+     strides of each dimension.
+    """
+    os.makedirs(path, exist_ok=True)
+    levelName = 'x'.join( str(stride) for stride in strides ) + '.npz'
+    _writeReplace(os.path.join(path, levelName), lambda f: np.savez(f, **arrays))
+
+
+def listOverviewLevels(path):
+    """
+     Returns the list of strides tuples of the overview levels written in a
+     pyramid directory.
+    """
+    if not os.path.isdir(path):
+        return []
+    return [ tuple( int(stride) for stride in fileName[:-len('.npz')].split('x') )
+             for fileName in os.listdir(path) if fileName.endswith('.npz') ]
+
+
+def readOverviewLevel(path, strides):
+    """
+     Reads the variables arrays of an overview level, returns a dictionary.
+    """
+    levelName = 'x'.join( str(stride) for stride in strides ) + '.npz'
+    with np.load(os.path.join(path, levelName), allow_pickle=False) as levelFile:
+        return { arrayName : levelFile[arrayName] for arrayName in levelFile.files }
+
+
+def _writeReplace(filePath, write):
+    tmpPath = filePath + '.tmp'
+    with open(tmpPath, 'wb') as f:
+        write(f)
+    os.replace(tmpPath, filePath)
@@ -0,0 +1,65 @@
+import math
+import random
+import threading
+
+
+class TransportSelector:
+    """
+     Chooses the transport of the griddap subsets requests (OPeNDAP, .nc read
+     in memory, or .dods decoding) by the measured request times. The times are
+     kept as an exponentially weighted moving average per server, transport, and
+     size class of the subset (powers of 4 bytes). Each candidate transport is
+     measured once in a size class, then the fastest is used, and with a small
+     probability another candidate is measured again, to follow the changes of
+     the server and network.
+    """
+
+    def __init__(self, alpha=0.3, explore=0.05, seed=None):
+        """
+         `alpha` : Weight of the last measure in the moving average.
+
+         `explore` : Probability of measuring a transport that is not the fastest.
+
+         `seed` : Optional seed of the exploration random choices.
+        """
+        self.alpha = alpha
+        self.explore = explore
+        self.estimates = {}
+        """ Dictionary with (server url, size class) keys, and the dictionaries of transports and [seconds, samples] """
+        self.__lock = threading.Lock()
+        self.__random = random.Random(seed)
+
+    def sizeClass(self, nBytes):
+        return int(math.log(max(nBytes, 1), 4))
+
+    def choose(self, serverURL, nBytes, transports):
+        """
+         Returns the transport to request a subset of `nBytes` estimated bytes.
+         `transports` is the list of candidates, in order of preference before
+         they are measured.
+        """
+        with self.__lock:
+            estimates = self.estimates.get((serverURL, self.sizeClass(nBytes)), {})
+            unmeasured = [ transport for transport in transports if transport not in estimates ]
+            if unmeasured:
+                return unmeasured[0]
+            fastest = min(transports, key=lambda transport: estimates[transport][0])
+            others = [ transport for transport in transports if transport != fastest ]
+            if others and self.__random.random() < self.explore:
+                return self.__random.choice(others)
+            return fastest
+
+    def record(self, serverURL, nBytes, transport, seconds):
+        """
+         Adds the measured time of a request to the moving average of the transport.
+        """
+        with self.__lock:
+            estimates = self.estimates.setdefault((serverURL, self.sizeClass(nBytes)), {})
+            if transport in estimates:
+                average, samples = estimates[transport]
+                estimates[transport] = [ self.alpha * seconds + (1 - self.alpha) * average, samples + 1 ]
+            else:
+                estimates[transport] = [ seconds, 1 ]
+
+
+DEFAULT_SELECTOR = TransportSelector()
@@ -126,4 +126,242 @@ def test_tabledap_time_range_attribute():
     time_actual_range = remote.variables['time']['actual_range']
     print(time_actual_range)
     assert time_actual_range[0] == dt.datetime(1970,2,26,20)
-    assert time_actual_range[1] == dt.datetime(2021,4,6,21,35)
\ No newline at end of file
+    assert time_actual_range[1] == dt.datetime(2021,4,6,21,35)
+
+def test_request_url_query_expression():
+    url = 'https://coastwatch.pfeg.noaa.gov/erddap'
+    datasetid = 'cwwcNDBCMet'
+    remote = ERDDAP_Tabledap(url, datasetid)
+    (
+    remote.setResultVariables(['station','time','atmp'])
+          .query("atmp >= 15 and time >= '2020-12-24' and station in ['41001','41002'] and (wspd > 10 or atmp > 25)")
+    )
+    queryurl_test = remote.getDataRequestURL()
+    print(queryurl_test)
+    assert queryurl_test == 'https://coastwatch.pfeg.noaa.gov/erddap/tabledap/cwwcNDBCMet.csvp?station%2Ctime%2Catmp&atmp%3E=15&time%3E=2020-12-24&station=~%22(41001%7C41002)%22'
+    assert remote.localFilters[0][0] == '(wspd > 10 or atmp > 25)'
+
+
+def test_pack_values_in_batches():
+    url = 'https://coastwatch.pfeg.noaa.gov/erddap'
+    datasetid = 'cwwcNDBCMet'
+    remote = ERDDAP_Tabledap(url, datasetid)
+    remote.setResultVariables(['station','time','atmp'])
+    stations = [ '{:05d}'.format(i) for i in range(500) ]
+    batches = remote._packValuesInBatches('station', stations, 1000)
+
+    assert sum(batches, []) == stations
+    for batch in batches:
+        assert len(remote._getDataRequestURLWithConstraint({ 'station=~' : '(' + '|'.join(batch) + ')' })) <= 1000
+
+    # The urls lengths are measured without changing lastRequestURL
+    requestURL = remote.getDataRequestURL()
+    remote._packValuesInBatches('station', stations, 1000)
+    assert remote.lastRequestURL == requestURL
+
+
+def test_get_dataframe_for_values(monkeypatch):
+    import re
+    import threading
+    import requests
+    from urllib.parse import unquote
+    import erddapClient.erddap_tabledap
+    remote = ERDDAP_Tabledap('https://coastwatch.pfeg.noaa.gov/erddap', 'cwwcNDBCMet')
+    remote.setResultVariables(['station','time','atmp'])
+    remote.query("(station == name or atmp > 25)", name='00007')
+    stations = [ '{:05d}'.format(i) for i in range(500) ]
+
+    # The first two batches are requested at the same time, the stations over 99 don't have data
+    bothRequested = threading.Barrier(2, timeout=10)
+    requestedBatches = []
+    def fakeUrlread(url, auth=None, **kwargs):
+        batch = re.search(r'station=~"\((.*?)\)"', unquote(url)).group(1).split('|')
+        with lock:
+            requestedBatches.append(batch)
+            nRequested = len(requestedBatches)
+        if nRequested <= 2:
+            bothRequested.wait()
+        rows = [ '{},2020-01-01T00:00:00Z,{}'.format(station, int(station) % 30) for station in batch if int(station) < 100 ]
+        if not rows:
+            response = requests.Response()
+            response.status_code = 404
+            raise requests.exceptions.HTTPError(response=response)
+        class FakeResponse:
+            text = 'station,time (UTC),atmp (degree_C)\n' + '\n'.join(rows) + '\n'
+        return FakeResponse()
+    lock = threading.Lock()
+    monkeypatch.setattr(erddapClient.erddap_tabledap, 'urlread', fakeUrlread)
+
+    df = remote.getDataFrameForValues('station', stations, maxURLLength=1000, workers=4, dtype={'station' : str})
+    assert len(requestedBatches) > 2
+    assert sorted(sum(requestedBatches, [])) == stations
+    # Local filter with a string value
+    assert list(df['station']) == ['00007', '00026', '00027', '00028', '00029', '00056', '00057', '00058', '00059', '00086', '00087', '00088', '00089']
+
+    remote.clearConstraints()
+    with pytest.raises(Exception):
+        remote.getDataFrameForValues('station', stations[200:], maxURLLength=1000)
+
+
+def test_preview_relative_time_constraints(monkeypatch):
+    import time
+    import erddapClient.erddap_dataset
+    from urllib.parse import unquote
+    from erddapClient.parse_utils import parseRelativeTime
+    rawMetadata = { 'table' : { 'columnNames' : ['Row Type', 'Variable Name', 'Attribute Name', 'Data Type', 'Value'],
+                                'rows' : [ ['attribute', 'NC_GLOBAL', 'cdm_timeseries_variables', 'String', 'station'],
+                                           ['variable', 'station', '', 'String', ''],
+                                           ['variable', 'time', '', 'double', ''],
+                                           ['attribute', 'time', '_CoordinateAxisType', 'String', 'Time'],
+                                           ['attribute', 'time', 'actual_range', 'double', '0.0, 864000.0'],
+                                           ['attribute', 'time', 'units', 'String', 'seconds since 1970-01-01T00:00:00Z'] ] } }
+    requestedURLs = []
+    class FakeResponse:
+        text = 'station,time (UTC)\nA,1970-01-01T00:00:00Z\n'
+    monkeypatch.setattr(erddapClient.erddap_dataset, 'urlread', lambda url, auth=None, **kwargs: requestedURLs.append(unquote(url)) or FakeResponse())
+
+    assert parseRelativeTime('max(time)-1day', 0.0, 864000.0) == 777600.0
+    assert parseRelativeTime('"min(time)+2hours"', 0.0, 864000.0) == 7200.0
+    assert parseRelativeTime('now-7days', nowTime=1e9) == 1e9 - 7 * 86400
+    assert parseRelativeTime('max(time)-1day') is None
+    assert parseRelativeTime('2020-01-01') is None
+
+    remote = ERDDAP_Tabledap('https://coastwatch.pfeg.noaa.gov/erddap', 'relativeTime')
+    remote.loadMetadata(rawMetadata=rawMetadata)
+    remote.setResultVariables(['station', 'time'])
+    remote.addConstraint('time>=max(time)-1day')
+    assert remote._timeRange() == (777600.0, 864000.0)
+    remote.preview(targetRows=24)
+    assert requestedURLs[-1].endswith('&orderByClosest("station,time/1hour")')
+
+    # Relative to the current time
+    remote.clearConstraints()
+    remote.addConstraint('time>=now-7days')
+    timeRange = remote._timeRange()
+    assert abs(timeRange[0] - (time.time() - 7 * 86400)) < 60 and timeRange[1] == 864000.0
+
+    # Without the actual_range the range is unknown, the data is not decimated
+    del remote.variables['time']['actual_range']
+    remote.clearConstraints()
+    remote.addConstraint('time>=max(time)-1day')
+    assert remote._timeRange() is None
+    remote.preview(targetRows=24)
+    assert 'orderByClosest' not in requestedURLs[-1]
+
+    # A single bound isn't a range, both bounds are
+    remote.clearConstraints()
+    remote.addConstraint('time>=2020-01-01T00:00:00Z')
+    assert remote._timeRange() is None
+    remote.preview(targetRows=24)
+    assert 'orderByClosest' not in requestedURLs[-1]
+    remote.addConstraint('time<=2020-01-02T00:00:00Z')
+    assert remote._timeRange() == (1577836800.0, 1577923200.0)
+    remote.preview(targetRows=24)
+    assert requestedURLs[-1].endswith('&orderByClosest("station,time/1hour")')
+
+
+def test_export_parquet_resume(tmp_path, monkeypatch):
+    import io
+    import requests
+    import erddapClient.erddap_tabledap
+    pq = pytest.importorskip('pyarrow.parquet')
+    from urllib.parse import unquote
+    remote = ERDDAP_Tabledap('https://coastwatch.pfeg.noaa.gov/erddap', 'cwwcNDBCMet')
+    remote.loadMetadata(rawMetadata={ 'table' : { 'columnNames' : ['Row Type', 'Variable Name', 'Attribute Name', 'Data Type', 'Value'],
+                                                  'rows' : [ ['variable', 'station', '', 'String', ''],
+                                                             ['variable', 'atmp', '', 'float', ''] ] } })
+    # The partition variable is not a result variable
+    remote.setResultVariables(['atmp'])
+
+    requestedStations = []
+    failStation = ['B/C']
+    class FakeStream:
+        def __init__(self, text):
+            self.raw = io.BytesIO(text.encode('utf-8'))
+        def __enter__(self):
+            return self
+        def __exit__(self, *args):
+            pass
+    def fakeUrlstream(url, auth=None, **kwargs):
+        station = unquote(url).split('station="')[1].split('"')[0]
+        requestedStations.append(station)
+        if station in failStation:
+            raise requests.exceptions.ConnectionError("Connection reset")
+        if station == 'D':
+            response = requests.Response()
+            response.status_code = 404
+            raise requests.exceptions.HTTPError(response=response)
+        return FakeStream('atmp (degree_C)\n' + ''.join( '{}\n'.format(v) for v in range(5) ))
+    monkeypatch.setattr(erddapClient.erddap_tabledap, 'urlstream', fakeUrlstream)
+
+    path = str(tmp_path / 'export')
+    with pytest.raises(Exception):
+        remote.exportParquet(path, timePartition=None, partitionVariable='station', partitionValues=['A', 'B/C', 'D'], chunksize=2)
+    assert requestedStations == ['A', 'B/C']
+
+    # Resumes from the failed partition
+    failStation.clear()
+    completed = remote.exportParquet(path, timePartition=None, partitionVariable='station', partitionValues=['A', 'B/C', 'D'], chunksize=2)
+    assert requestedStations == ['A', 'B/C', 'B/C', 'D']
+    assert completed == ['station=A', 'station=B%2FC', 'station=D']
+    partitionPath = tmp_path / 'export' / 'station=B%2FC'
+    assert sorted(p.name for p in partitionPath.iterdir()) == ['part-00000.parquet', 'part-00001.parquet', 'part-00002.parquet']
+    table = pq.read_table(str(partitionPath))
+    assert table.column_names == ['atmp'] and table.column('atmp').to_pylist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert list((tmp_path / 'export' / 'station=D').iterdir()) == []
+
+
+def test_subset_index(monkeypatch):
+    import numpy as np
+    import erddapClient.erddap_tabledap
+    remote = ERDDAP_Tabledap('https://coastwatch.pfeg.noaa.gov/erddap', 'cwwcNDBCMet')
+    remote.loadMetadata(rawMetadata={ 'table' : { 'columnNames' : ['Row Type', 'Variable Name', 'Attribute Name', 'Data Type', 'Value'],
+                                                  'rows' : [ ['attribute', 'NC_GLOBAL', 'subsetVariables', 'String', 'station, latitude'],
+                                                             ['variable', 'station', '', 'String', ''],
+                                                             ['variable', 'latitude', '', 'float', ''],
+                                                             ['variable', 'atmp', '', 'float', ''] ] } })
+    requestedURLs = []
+    def fakeUrlread(url, auth=None, **kwargs):
+        requestedURLs.append(url)
+        class FakeResponse:
+            text = 'station,latitude (degrees_north)\n41001,34.7\n41002,31.8\n42001,25.9\n42002,25.9\n'
+        return FakeResponse()
+    fakeUrlread.__wrapped__ = fakeUrlread
+    monkeypatch.setattr(erddapClient.erddap_tabledap, 'urlread', fakeUrlread)
+
+    # Not validated before the index is loaded
+    remote.addConstraint({'station=' : '99999'})
+    remote.clearConstraints()
+
+    subsetIndex = remote.loadSubsetIndex()
+    assert requestedURLs == ['https://coastwatch.pfeg.noaa.gov/erddap/tabledap/cwwcNDBCMet.csvp?station%2Clatitude&distinct()']
+    assert list(subsetIndex.columns) == ['station', 'latitude']
+    # Cached until the TTL expires
+    remote.loadSubsetIndex()
+    assert len(requestedURLs) == 1
+
+    assert list(remote.subsetLookup(latitude=25.9)['station']) == ['42001', '42002']
+    assert list(remote.subsetLookup(station=['41001', '42002'])['latitude']) == [34.7, 25.9]
+    assert remote.subsetValues('station', latitude=25.9) == ['42001', '42002']
+    assert remote.subsetValues('latitude') == [25.9, 31.8, 34.7]
+    with pytest.raises(Exception):
+        remote.subsetLookup(atmp=20)
+    with pytest.raises(Exception):
+        remote.subsetValues('atmp')
+
+    # Numbers, numeric strings and numpy scalars are validated by value
+    remote.addConstraint({'latitude=' : 25.9})
+    remote.addConstraint({'latitude=' : '25.9'})
+    remote.addConstraint({'latitude=' : np.float32(25.9)})
+    remote.addConstraint({'station=' : '41001'})
+    remote.addConstraint({'station=~' : '4100[12]'})
+    remote.addConstraint({'latitude>=' : 99})
+    remote.clearConstraints()
+    latitudeIndex = remote.loadSubsetIndex()
+    latitudeIndex['latitude'] = [34, 31, 25, 25]
+    remote.addConstraint({'latitude=' : np.int64(25)})
+    for constraint in [ {'latitude=' : '10.5'}, {'latitude=' : np.int64(10)}, {'station=' : '99999'}, {'station=~' : '5.*'} ]:
+        with pytest.raises(Exception):
+            remote.addConstraint(constraint)
+    # Values that aren't numbers are left to the server
+    remote.addConstraint({'latitude=' : 'NaN?'})
@@ -101,4 +101,532 @@ def test_griddap_setSubsetI_query():
     assert url == 'https://coastwatch.pfeg.noaa.gov/erddap/griddap/hycom_gom310D?temperature[1900:1900][0:0][0:3:277][158:3:413],salinity[1900:1900][0:0][0:3:277][158:3:413]'
     assert urlNi == 'https://coastwatch.pfeg.noaa.gov/erddap/griddap/hycom_gom310D?temperature[1900:1900][0:0][0:3:277][158:3:413],salinity[1900:1900][0:0][0:3:277][158:3:413]'
 
-    
\ No newline at end of file
+    
+
+def test_griddap_snapshot(tmp_path, monkeypatch):
+    import erddapClient.erddap_dataset
+    rawMetadata = { 'table' : { 'columnNames' : ['Row Type', 'Variable Name', 'Attribute Name', 'Data Type', 'Value'],
+                                'rows' : [ ['attribute', 'NC_GLOBAL', 'date_created', 'String', '2021-01-01'],
+                                           ['dimension', 'latitude', '', 'float', 'nValues=3, evenlySpaced=true, averageSpacing=1.0'],
+                                           ['attribute', 'latitude', 'actual_range', 'float', '10.0, 12.0'],
+                                           ['dimension', 'longitude', '', 'float', 'nValues=2, evenlySpaced=true, averageSpacing=1.0'],
+                                           ['attribute', 'longitude', 'actual_range', 'float', '-90.0, -89.0'],
+                                           ['variable', 'sst', '', 'float', 'latitude, longitude'] ] } }
+
+    class FakeResponse:
+        text = "latitude (degrees_north),longitude (degrees_east)\n10.0,-90.0\n11.0,-89.0\n12.0,\n"
+        def json(self):
+            return rawMetadata
+    monkeypatch.setattr(erddapClient.erddap_dataset, 'urlread', lambda url, auth=None, **kwargs: FakeResponse())
+
+    remote = ERDDAP_Griddap('https://coastwatch.pfeg.noaa.gov/erddap', 'snapshotTest')
+    remote.saveSnapshot(str(tmp_path))
+
+    # The snapshot is loaded without any request
+    monkeypatch.setattr(erddapClient.erddap_dataset, 'urlread', None)
+    remote = ERDDAP_Griddap('https://coastwatch.pfeg.noaa.gov/erddap', 'snapshotTest')
+    assert remote.loadSnapshot(str(tmp_path), revalidate=False)
+    assert list(remote.dimensions.keys()) == ['latitude', 'longitude']
+    assert list(remote.dimensions['latitude'].data) == [10.0, 11.0, 12.0]
+    assert remote.dimensions['longitude'].size == 2
+    assert remote.info['date_created'] == '2021-01-01'
+    assert not ERDDAP_Griddap('https://coastwatch.pfeg.noaa.gov/erddap', 'otherDataset').loadSnapshot(str(tmp_path))
+
+
+def fakeGriddap(monkeypatch, longitudes=[-94.0, -93.0, -92.0, -91.0, -90.0], variables=['sst']):
+    """
+    Returns a griddap object of a 4 latitudes by N longitudes grid, with the info,
+    dimensions and .nc subsets responses made locally, and the list of the
+    requested subsets. The values of each variable are the ones of the first
+    variable plus 100 times its position.
+    """
+    import erddapClient.erddap_dataset, erddapClient.erddap_griddap
+    import netCDF4
+    import numpy as np
+    from urllib.parse import unquote
+    rawMetadata = { 'table' : { 'columnNames' : ['Row Type', 'Variable Name', 'Attribute Name', 'Data Type', 'Value'],
+                                'rows' : [ ['dimension', 'latitude', '', 'float', 'nValues=4, evenlySpaced=true, averageSpacing=1.0'],
+                                           ['attribute', 'latitude', 'actual_range', 'float', '10.0, 13.0'],
+                                           ['dimension', 'longitude', '', 'float', 'nValues={}, evenlySpaced=true'.format(len(longitudes))],
+                                           ['attribute', 'longitude', 'actual_range', 'float', '{}, {}'.format(longitudes[0], longitudes[-1])],
+                                           ['variable', 'sst', '', 'float', 'latitude, longitude'],
+                                           ['attribute', 'sst', 'units', 'String', 'degree_C'] ] +
+                                         [ row for varName in variables[1:] for row in [ ['variable', varName, '', 'float', 'latitude, longitude'] ] ] } }
+    grid = np.arange(4 * len(longitudes), dtype='float32').reshape(4, len(longitudes))
+    latitudes = ['10.0', '11.0', '12.0', '13.0'] + [''] * (len(longitudes) - 4)
+
+    class FakeResponse:
+        text = "latitude,longitude\n" + "".join( "{},{}\n".format(lat, lon) for lat, lon in zip(latitudes, longitudes) )
+        def json(self):
+            return rawMetadata
+    monkeypatch.setattr(erddapClient.erddap_dataset, 'urlread', lambda url, auth=None, **kwargs: FakeResponse())
+
+    requestedSubsets = []
+    def fakeSubsetRead(url, auth=None, **kwargs):
+        items = unquote(url).split('?')[1].split(',')
+        latSlice, lonSlice = [ [ int(i) for i in s.split(':') ] for s in items[0].split('[', 1)[1].strip(']').split('][') ]
+        requestedSubsets.append((latSlice, lonSlice))
+        # [start:stop] or [start:stride:stop]
+        values = grid[latSlice[0]:latSlice[-1] + 1:latSlice[1] if len(latSlice) == 3 else 1,
+                      lonSlice[0]:lonSlice[-1] + 1:lonSlice[1] if len(lonSlice) == 3 else 1]
+        itemsValues = [ (item.split('[')[0], values + 100 * variables.index(item.split('[')[0])) for item in items ]
+        # The subsets are requested from several threads, netCDF4 is not thread safe
+        with erddapClient.erddap_griddap.NETCDF_LOCK:
+            ncDataset = netCDF4.Dataset('subset.nc', 'w', memory=1024)
+            ncDataset.createDimension('latitude', values.shape[0])
+            ncDataset.createDimension('longitude', values.shape[1])
+            for varName, varValues in itemsValues:
+                ncDataset.createVariable(varName, 'f4', ('latitude', 'longitude'))[:] = varValues
+            content = ncDataset.close().tobytes()
+        if '.dods?' in url:
+            # DAP2 grids: the Float32 array and the maps
+            dds = "Dataset {\n" + "".join( ("  GRID {{\n    ARRAY:\n      Float32 {2}[latitude = {0}][longitude = {1}];\n    MAPS:\n"
+                                            "      Float32 latitude[latitude = {0}];\n      Float32 longitude[longitude = {1}];\n  }} {2};\n").format(values.shape[0], values.shape[1], varName)
+                                           for varName, _ in itemsValues ) + "} fakeGrid;\n"
+            content = dds.encode('utf-8') + b'\nData:\n' + b''.join( np.array([array.size, array.size], '>u4').tobytes() + array.astype('>f4').tobytes()
+                                                                      for _, varValues in itemsValues
+                                                                      for array in [varValues, np.zeros(values.shape[0]), np.zeros(values.shape[1])] )
+        class SubsetResponse:
+            pass
+        SubsetResponse.content = content
+        return SubsetResponse()
+    fakeSubsetRead.__wrapped__ = fakeSubsetRead
+    monkeypatch.setattr(erddapClient.erddap_griddap, 'urlread', fakeSubsetRead)
+
+    return ERDDAP_Griddap('https://coastwatch.pfeg.noaa.gov/erddap', 'fakeGrid'), requestedSubsets
+
+
+def test_griddap_matchup(monkeypatch):
+    import numpy as np
+    from erddapClient.erddap_griddap import boundingSubsets
+    remote, requestedSubsets = fakeGriddap(monkeypatch)
+
+    matched = remote.matchup(['sst'], latitude=[10.1, 12.9, 11.2, 30.0, 10.0], longitude=[-94.0, -90.2, -92.6, -92.0, -94.2])
+    assert list(matched['sst'].values[:3]) == [0.0, 19.0, 6.0]
+    assert np.isnan(matched['sst'].values[3:]).all()
+    assert list(matched['latitude_index'].values) == [0, 3, 1, -1, 0]
+    assert list(matched['longitude_index'].values) == [0, 4, 1, 2, -1]
+    assert matched['sst'].attrs['units'] == 'degree_C'
+    assert matched.attrs['subset_requests'] == len(requestedSubsets) == 1
+
+    # Neighborhood window, the values outside the grid are NaN
+    matched = remote.matchup(['sst'], window={'longitude' : 1}, latitude=13.0, longitude=[-94.0, -92.0])
+    assert matched['sst'].dims == ('obs', 'longitude_offset')
+    assert np.isnan(matched['sst'].values[0, 0])
+    assert list(matched['sst'].values[0, 1:]) == [15.0, 16.0]
+    assert list(matched['sst'].values[1]) == [16.0, 17.0, 18.0]
+
+    # The subsets are split to fit the size budget
+    cells = np.array([[0, 0, 3, 3], [0, 1, 3, 4]])
+    subsets = boundingSubsets(cells, np.array([0, 0]), np.array([4, 5]), 4, 8)
+    assert sorted(sorted(positions.tolist()) for _, _, positions in subsets) == [[0, 1], [2, 3]]
+    with pytest.raises(Exception):
+        remote.matchup(['sst'], latitude=[10.0])
+
+
+def test_griddap_subset_polygon(monkeypatch):
+    import numpy as np
+    from erddapClient.polygon_utils import polygonRings, rasterizePolygon, polygonTiles
+    remote, requestedSubsets = fakeGriddap(monkeypatch)
+
+    # L shaped polygon, the first latitude row and the last longitude column
+    lShape = [(-94.5, 9.5), (-89.5, 9.5), (-89.5, 13.5), (-90.5, 13.5), (-90.5, 10.5), (-94.5, 10.5)]
+    subset = remote.setResultVariables(['sst']).setSubsetPolygon(lShape, minTileCells=0).getxArray()
+    assert subset['polygon_mask'].values.sum() == 8
+    assert list(subset['sst'].values[0]) == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert list(subset['sst'].values[1:, 4]) == [9.0, 14.0, 19.0]
+    assert np.isnan(subset['sst'].values[1:, :4]).all()
+    assert sorted(requestedSubsets) == [([0, 0], [0, 4]), ([1, 3], [4, 4])]
+    assert subset.attrs['tile_requests'] == 2
+
+    # The holes are rings of the polygon
+    square = {'type' : 'Polygon', 'coordinates' : [ [(0, 0), (10, 0), (10, 10), (0, 10)], [(3, 3), (7, 3), (7, 7), (3, 7)] ]}
+    mask = rasterizePolygon(polygonRings(square), np.arange(0.5, 10), np.arange(0.5, 10))
+    assert mask.sum() == 100 - 16 and not mask[3:7, 3:7].any()
+    tiles = polygonTiles(mask, maxWaste=0.0, minTileCells=0)
+    assert sum((r1 - r0) * (c1 - c0) for r0, r1, c0, c1 in tiles) == 84
+    with pytest.raises(Exception):
+        remote.setSubsetPolygon([(0.0, 0.0), (1.0, 0.0), (1.0, 1.0)])
+
+
+def test_griddap_subset_polygon_other_dimensions(monkeypatch):
+    import erddapClient.erddap_dataset, erddapClient.erddap_griddap
+    import netCDF4
+    import numpy as np
+    from urllib.parse import unquote
+    rawMetadata = { 'table' : { 'columnNames' : ['Row Type', 'Variable Name', 'Attribute Name', 'Data Type', 'Value'],
+                                'rows' : [ ['dimension', 'time', '', 'double', 'nValues=2, evenlySpaced=true'],
+                                           ['attribute', 'time', '_CoordinateAxisType', 'String', 'Time'],
+                                           ['attribute', 'time', 'actual_range', 'double', '1.6094592E9, 1.6095456E9'],
+                                           ['attribute', 'time', 'units', 'String', 'seconds since 1970-01-01T00:00:00Z'],
+                                           ['dimension', 'latitude', '', 'float', 'nValues=4, evenlySpaced=true, averageSpacing=1.0'],
+                                           ['attribute', 'latitude', 'actual_range', 'float', '10.0, 13.0'],
+                                           ['dimension', 'longitude', '', 'float', 'nValues=5, evenlySpaced=true'],
+                                           ['attribute', 'longitude', 'actual_range', 'float', '-94.0, -90.0'],
+                                           ['variable', 'sst', '', 'float', 'time, latitude, longitude'] ] } }
+    grid = np.arange(2 * 4 * 5, dtype='float32').reshape(2, 4, 5)
+    dimensionsCSV = ("time,latitude,longitude\n2021-01-01T00:00:00Z,10.0,-94.0\n2021-01-02T00:00:00Z,11.0,-93.0\n"
+                     ",12.0,-92.0\n,13.0,-91.0\n,,-90.0\n")
+
+    class FakeResponse:
+        text = dimensionsCSV
+        def json(self):
+            return rawMetadata
+    monkeypatch.setattr(erddapClient.erddap_dataset, 'urlread', lambda url, auth=None, **kwargs: FakeResponse())
+
+    requestedSubsets = []
+    def fakeSubsetRead(url, auth=None, **kwargs):
+        slices = [ [ int(i) for i in s.split(':') ] for s in unquote(url).split('sst[')[1].strip(']').split('][') ]
+        requestedSubsets.append(slices)
+        values = grid[tuple( slice(s[0], s[-1] + 1) for s in slices )]
+        with erddapClient.erddap_griddap.NETCDF_LOCK:
+            ncDataset = netCDF4.Dataset('subset.nc', 'w', memory=1024)
+            for dimName, size in zip(['time', 'latitude', 'longitude'], values.shape):
+                ncDataset.createDimension(dimName, size)
+            ncDataset.createVariable('sst', 'f4', ('time', 'latitude', 'longitude'))[:] = values
+            content = ncDataset.close().tobytes()
+        class SubsetResponse:
+            pass
+        SubsetResponse.content = content
+        return SubsetResponse()
+    fakeSubsetRead.__wrapped__ = fakeSubsetRead
+    monkeypatch.setattr(erddapClient.erddap_griddap, 'urlread', fakeSubsetRead)
+
+    # The time dimension is not constrained, it's requested whole
+    remote = ERDDAP_Griddap('https://coastwatch.pfeg.noaa.gov/erddap', 'fakeGrid3D')
+    lShape = [(-94.5, 9.5), (-89.5, 9.5), (-89.5, 13.5), (-90.5, 13.5), (-90.5, 10.5), (-94.5, 10.5)]
+    remote.setResultVariables(['sst']).setSubsetPolygon(lShape, minTileCells=0)
+    assert remote.positional_indexes['time'] == slice(0, 2)
+    subset = remote.getxArray()
+    assert subset['sst'].shape == (2, 4, 5)
+    assert list(subset['sst'].values[1, 0]) == [20.0, 21.0, 22.0, 23.0, 24.0]
+    assert list(subset['sst'].values[1, 1:, 4]) == [29.0, 34.0, 39.0]
+    assert np.isnan(subset['sst'].values[:, 1:, :4]).all()
+    assert all( slices[0] == [0, 1] for slices in requestedSubsets )
+
+    # A constrained time dimension
+    subset = remote.setSubsetPolygon(lShape, minTileCells=0, time='2021-01-02T00:00:00Z').getxArray()
+    assert subset['sst'].shape == (1, 4, 5)
+    assert list(subset['sst'].values[0, 0]) == [20.0, 21.0, 22.0, 23.0, 24.0]
+
+
+def test_griddap_wrapped_longitude_subset(monkeypatch):
+    import numpy as np
+    remote, requestedSubsets = fakeGriddap(monkeypatch, longitudes=[-157.5, -112.5, -67.5, -22.5, 22.5, 67.5, 112.5, 157.5])
+
+    # From 100 to -140 degrees, crossing the antimeridian, two requests are stitched
+    subset = remote.setResultVariables(['sst']).setSubset(latitude=slice(10.0, 11.0), longitude=slice(100, -140)).getxArray()
+    assert list(subset['longitude'].values) == [112.5, 157.5, 202.5]
+    assert list(subset['sst'].values[1]) == [14.0, 15.0, 8.0]
+    assert sorted(requestedSubsets) == [([0, 1], [0, 0]), ([0, 1], [6, 7])]
+    with pytest.raises(Exception):
+        remote.getDataRequestURL()
+
+    # Polygon crossing the antimeridian, in the 0 to 360 convention
+    subset = remote.setSubsetPolygon([(140.0, 9.5), (210.0, 9.5), (210.0, 10.5), (140.0, 10.5)], minTileCells=0).getxArray()
+    assert list(subset['longitude'].values) == [157.5, 202.5]
+    assert list(subset['sst'].values[0]) == [7.0, 0.0]
+
+
+def test_griddap_overview(tmp_path, monkeypatch):
+    import numpy as np
+    from erddapClient.erddap_griddap import overviewStrides
+    remote, requestedSubsets = fakeGriddap(monkeypatch, longitudes=[ float(lon) for lon in range(-100, -80) ])
+
+    # The strides are set in the positional indexes, applied by the server
+    remote.setResultVariables(['sst']).setSubset(latitude=slice(10.0, 13.0)).setOverview(maxCells=20)
+    assert remote.positional_indexes['latitude'] == slice(0, 4, 2)
+    assert remote.positional_indexes['longitude'] == slice(0, 20, 2)
+    assert remote._convertPositionalIndexes2DapQuery() == "[0:2:3][0:2:19]"
+    remote.setOverview(targetShape={ 'longitude' : 5 })
+    assert remote.positional_indexes['latitude'] == slice(0, 4, 2)
+    assert remote.positional_indexes['longitude'] == slice(0, 20, 4)
+
+    # The overview size doesn't depend on the native resolution
+    assert overviewStrides({ 'time' : 1, 'latitude' : 4320, 'longitude' : 8640 }, 10**6, ['latitude', 'longitude']) == \
+           { 'time' : 1, 'latitude' : 7, 'longitude' : 7 }
+    assert overviewStrides({ 'time' : 1, 'latitude' : 720, 'longitude' : 1440 }, 10**6, ['latitude', 'longitude']) == \
+           { 'time' : 1, 'latitude' : 2, 'longitude' : 2 }
+    assert overviewStrides({ 'latitude' : 720, 'longitude' : 1440 }, 10**6, ['latitude', 'longitude'], powerOfTwo=True) == \
+           { 'latitude' : 2, 'longitude' : 2 }
+
+    # Without pyramid
+    requestedSubsets.clear()
+    preview = remote.overview(maxCells=20, pyramid=False)
+    assert preview['sst'].shape == (2, 10)
+    assert list(preview['longitude'].values[:3]) == [-100.0, -98.0, -96.0]
+    assert preview['sst'].values[1, 1] == 42.0
+    assert len(requestedSubsets) == 1
+
+    # The pyramid levels are kept, a coarser overview is made from a finer level
+    requestedSubsets.clear()
+    fine = remote.overview(maxCells=80, pyramidDir=str(tmp_path))
+    assert fine['sst'].shape == (4, 20) and len(requestedSubsets) == 1
+    coarse = remote.overview(maxCells=20, pyramidDir=str(tmp_path))
+    assert len(requestedSubsets) == 1
+    assert coarse['sst'].shape == (2, 10)
+    np.testing.assert_array_equal(coarse['sst'].values, preview['sst'].values)
+    assert list(coarse['latitude'].values) == [10.0, 12.0]
+
+    # Other subsets have its own pyramid
+    remote.overview(maxCells=20, pyramidDir=str(tmp_path), longitude=slice(-95.0, -85.0))
+    assert requestedSubsets[-1] == ([0, 2, 3], [5, 2, 15])
+
+
+def test_griddap_reduce(monkeypatch):
+    import numpy as np
+    from erddapClient.erddap_griddap import timeGroupKeys
+    from erddapClient.reductions import RunningStatistics
+    remote, requestedSubsets = fakeGriddap(monkeypatch, longitudes=[ float(lon) for lon in range(-100, -80) ])
+    grid = np.arange(80, dtype='float64').reshape(4, 20)
+
+    # Reduced in chunks of 3 longitudes, 2 latitudes * 3 longitudes * 8 bytes
+    remote.setResultVariables(['sst']).setSubset(latitude=slice(11.0, 12.0))
+    reduced = remote.reduce('longitude', ops=['mean', 'std', 'min', 'max', 'count'], chunkBytes=48)
+    assert reduced.attrs['chunk_requests'] == len(requestedSubsets) == 7
+    assert reduced['sst_mean'].dims == ('latitude',)
+    np.testing.assert_allclose(reduced['sst_mean'].values, grid[1:3].mean(axis=1))
+    np.testing.assert_allclose(reduced['sst_std'].values, grid[1:3].std(axis=1))
+    assert list(reduced['sst_min'].values) == [20.0, 40.0]
+    assert list(reduced['sst_max'].values) == [39.0, 59.0]
+    assert list(reduced['sst_count'].values) == [20, 20]
+    assert reduced['sst_mean'].attrs['cell_methods'] == 'longitude: mean'
+    with pytest.raises(Exception):
+        remote.reduce('longitude', ops=['median'])
+    with pytest.raises(Exception):
+        remote.reduce('longitude', groupby='month')
+
+    # The running statistics match the statistics of the whole array, the NaN are ignored
+    values = np.random.default_rng(0).normal(1e6, 2.0, size=(50, 3))
+    values[::7, 0] = np.nan
+    values[:, 2] = np.nan
+    statistics = RunningStatistics()
+    for chunkStart in range(0, 50, 8):
+        statistics.update(values[chunkStart:chunkStart + 8], axis=0)
+    np.testing.assert_allclose(statistics.result('mean')[:2], np.nanmean(values[:, :2], axis=0))
+    np.testing.assert_allclose(statistics.result('var', ddof=1)[:2], np.nanvar(values[:, :2], axis=0, ddof=1), rtol=1e-9)
+    assert list(statistics.result('count')) == [42, 50, 0]
+    assert np.isnan(statistics.result('mean')[2]) and np.isnan(statistics.result('max')[2])
+
+    times = np.array(['2020-01-15', '2020-02-15', '2020-07-01', '2021-12-31'], dtype='datetime64[s]').astype('int64')
+    assert list(timeGroupKeys(times, 'month')) == [1, 2, 7, 12]
+    assert list(timeGroupKeys(times, 'season')) == ['DJF', 'DJF', 'JJA', 'DJF']
+    assert list(timeGroupKeys(times, 'year')) == [2020, 2020, 2020, 2021]
+
+
+def test_griddap_follower(monkeypatch):
+    import erddapClient.erddap_dataset, erddapClient.erddap_griddap
+    import netCDF4
+    import numpy as np
+    from urllib.parse import unquote
+    from erddapClient import ERDDAP_GriddapFollower
+    times = [ '2021-01-0{}T00:00:00Z'.format(day) for day in range(1, 4) ]
+    rawMetadata = { 'table' : { 'columnNames' : ['Row Type', 'Variable Name', 'Attribute Name', 'Data Type', 'Value'],
+                                'rows' : [ ['dimension', 'time', '', 'double', 'nValues=3, evenlySpaced=true'],
+                                           ['attribute', 'time', '_CoordinateAxisType', 'String', 'Time'],
+                                           ['attribute', 'time', 'actual_range', 'double', '1.6094592E9, 1.6096320E9'],
+                                           ['attribute', 'time', 'units', 'String', 'seconds since 1970-01-01T00:00:00Z'],
+                                           ['dimension', 'latitude', '', 'float', 'nValues=2, evenlySpaced=true'],
+                                           ['attribute', 'latitude', 'actual_range', 'float', '10.0, 11.0'],
+                                           ['variable', 'sst', '', 'float', 'time, latitude'] ] } }
+
+    class FakeResponse:
+        def __init__(self, text=''):
+            self.text = text
+        def json(self):
+            return rawMetadata
+    dimensionsCSV = lambda: "time,latitude\n" + "".join( "{},{}\n".format(t, lat) for t, lat in zip(times, ['10.0', '11.0'] + [''] * len(times)) )
+    monkeypatch.setattr(erddapClient.erddap_dataset, 'urlread', lambda url, auth=None, **kwargs: FakeResponse(dimensionsCSV()))
+
+    requests = []
+    def fakeRead(url, auth=None, **kwargs):
+        url = unquote(url)
+        requests.append(url)
+        if '.csvp?time[' in url:
+            start = int(url.split('time[')[1].split(':')[0])
+            return FakeResponse("time (UTC)\n" + "\n".join(times[start:]) + "\n")
+        timeSlice = [ int(i) for i in url.split('sst[')[1].split(']')[0].split(':') ]
+        with erddapClient.erddap_griddap.NETCDF_LOCK:
+            ncDataset = netCDF4.Dataset('subset.nc', 'w', memory=1024)
+            ncDataset.createDimension('time', timeSlice[-1] - timeSlice[0] + 1)
+            ncDataset.createDimension('latitude', 2)
+            ncDataset.createVariable('sst', 'f4', ('time', 'latitude'))[:] = np.arange(timeSlice[0], timeSlice[-1] + 1)[:, None] * np.ones(2)
+            content = ncDataset.close().tobytes()
+        response = FakeResponse()
+        response.content = content
+        return response
+    fakeRead.__wrapped__ = fakeRead
+    monkeypatch.setattr(erddapClient.erddap_griddap, 'urlread', fakeRead)
+
+    remote = ERDDAP_Griddap('https://coastwatch.pfeg.noaa.gov/erddap', 'nrtGrid')
+    emitted = []
+    follower = ERDDAP_GriddapFollower(remote, ['sst'], callback=emitted.append, maxSteps=2)
+    assert follower.poll() == []
+    assert requests[-1].endswith('time[2:last]')
+
+    # Only the tail of the time dimension and the new steps are requested
+    times.extend([ '2021-01-0{}T00:00:00Z'.format(day) for day in range(4, 9) ])
+    requests.clear()
+    newSteps = follower.poll()
+    assert requests[0].endswith('time[2:last]') and len(requests) == 4
+    assert [ stepsData.sizes['time'] for stepsData in newSteps ] == [2, 2, 1]
+    assert len(emitted) == 3
+    assert list(newSteps[0]['sst'].values[:, 0]) == [3.0, 4.0]
+    assert str(newSteps[-1]['time'].values[-1])[:10] == '2021-01-08'
+    assert remote.dimensions['time'].size == 8
+    assert remote.dimensions['time'].closestIdx('2021-01-08T00:00:00Z') == 7
+
+    # A changed tail reloads the dimensions values
+    times[:] = [ t.replace('2021', '2022') for t in times ]
+    assert remote.updateTimeDimension() == 0
+    assert remote.dimensions['time'].timeData[0].year == 2022
+
+
+def test_griddap_export(tmp_path, monkeypatch):
+    import json
+    import numpy as np
+    import xarray as xr
+    import erddapClient.erddap_griddap
+    remote, requestedSubsets = fakeGriddap(monkeypatch)
+    grid = np.arange(20, dtype='float64').reshape(4, 5)
+    remote.setResultVariables(['sst']).setSubset(latitude=slice(10.0, 13.0), longitude=slice(-93.0, -91.0))
+    path = str(tmp_path / 'export.nc')
+
+    # Without time dimension the chunks are along the first dimension, a latitude per chunk,
+    # the export fails in the third chunk
+    fetchSubset = erddapClient.erddap_griddap.ERDDAP_Griddap._fetchSubset
+    def failingFetch(self, variables, positionalIndexes):
+        if positionalIndexes['latitude'].start == 2:
+            raise IOError("Connection reset")
+        return fetchSubset(self, variables, positionalIndexes)
+    monkeypatch.setattr(erddapClient.erddap_griddap.ERDDAP_Griddap, '_fetchSubset', failingFetch)
+    with pytest.raises(IOError):
+        remote.exportNetCDF(path, chunkBytes=24, prefetch=1)
+    with open(path + '.checkpoint.json') as f:
+        assert json.load(f)['completed'] == ['0:1', '1:2']
+
+    # The export resumes from the third chunk
+    monkeypatch.setattr(erddapClient.erddap_griddap.ERDDAP_Griddap, '_fetchSubset', fetchSubset)
+    requestedSubsets.clear()
+    assert remote.exportNetCDF(path, chunkBytes=24) == ['0:1', '1:2', '2:3', '3:4']
+    assert len(requestedSubsets) == 2
+    with xr.open_dataset(path) as exported:
+        np.testing.assert_array_equal(exported['sst'].values, grid[:, 1:4])
+        assert list(exported['longitude'].values) == [-93.0, -92.0, -91.0]
+        assert exported['sst'].attrs['units'] == 'degree_C'
+
+    # Other subsets can't be written to the same file
+    remote.setSubset(latitude=slice(10.0, 13.0))
+    with pytest.raises(Exception):
+        remote.exportNetCDF(path, chunkBytes=24)
+
+    pytest.importorskip('zarr')
+    zarrPath = str(tmp_path / 'export.zarr')
+    assert len(remote.exportZarr(zarrPath, chunkBytes=40)) == 4
+    np.testing.assert_array_equal(xr.open_zarr(zarrPath)['sst'].values, grid)
+
+
+def test_griddap_transports(monkeypatch):
+    import numpy as np
+    from erddapClient.transport_selector import TransportSelector
+    remote, requestedSubsets = fakeGriddap(monkeypatch)
+    remote.setResultVariables(['sst']).setSubset(latitude=slice(11.0, 12.0), longitude=slice(-93.0, -90.0))
+    ncSubset = remote.getxArray(transport='nc')
+    dodsSubset = remote.getxArray(transport='dods')
+    assert ncSubset.attrs['transport'] == 'nc' and dodsSubset.attrs['transport'] == 'dods'
+    np.testing.assert_array_equal(dodsSubset['sst'].values, ncSubset['sst'].values)
+    assert list(dodsSubset['sst'].values[0]) == [6.0, 7.0, 8.0, 9.0]
+    assert list(dodsSubset['longitude'].values) == [-93.0, -92.0, -91.0, -90.0]
+    with pytest.raises(Exception):
+        remote.getxArray(transport='ftp')
+
+    # Each transport is measured once, then the fastest is used
+    selector = TransportSelector(explore=0.0)
+    remote.transportSelector = selector
+    remote.transport = 'auto'
+    assert remote.matchup(['sst'], latitude=[11.0], longitude=[-92.0])['sst'].values[0] == 7.0
+    assert remote.matchup(['sst'], latitude=[11.0], longitude=[-92.0])['sst'].values[0] == 7.0
+    assert sorted(selector.estimates[(remote.erddapurl, selector.sizeClass(4))].keys()) == ['dods', 'nc']
+    selector.record(remote.erddapurl, 4, 'nc', 10.0)
+    selector.record(remote.erddapurl, 4, 'dods', 0.1)
+    assert selector.choose(remote.erddapurl, 4, ['nc', 'dods']) == 'dods'
+    assert selector.choose(remote.erddapurl, 10**6, ['nc', 'dods']) == 'nc'
+    selector.record(remote.erddapurl, 4, 'dods', 100.0)
+    assert selector.choose(remote.erddapurl, 4, ['nc', 'dods']) == 'nc'
+
+
+def test_griddap_sparse_indexes(monkeypatch):
+    import numpy as np
+    from erddapClient.index_utils import indexRuns
+    remote, requestedSubsets = fakeGriddap(monkeypatch, longitudes=[-157.5, -112.5, -67.5, -22.5, 22.5, 67.5, 112.5, 157.5])
+
+    # A regular pattern is a single strided request
+    remote.setResultVariables(['sst']).setSubsetI(latitude=slice(0, 4), longitude=[1, 3, 5, 7])
+    assert remote.positional_indexes['longitude'] == slice(1, 8, 2)
+    assert remote.getDataRequestURL(useSafeURL=False).endswith('sst[0:3][1:2:7]')
+    subset = remote.getxArray(transport='nc')
+    assert list(subset['sst'].values[1]) == [9.0, 11.0, 13.0, 15.0]
+
+    # Runs requested concurrently, reassembled in the order of the indexes
+    remote.REQUEST_OVERHEAD_BYTES = 20
+    subset = remote.setSubsetI(latitude=np.array([False, True, False, True]), longitude=[7, 0, 1, 6, 7]).getxArray()
+    assert subset.attrs['sparse_requests'] == 2
+    assert sorted(requestedSubsets[-2:]) == [([1, 2, 3], [0, 1]), ([1, 2, 3], [6, 7])]
+    assert list(subset['longitude'].values) == [157.5, -157.5, -112.5, 112.5, 157.5]
+    assert list(subset['latitude'].values) == [11.0, 13.0]
+    assert list(subset['sst'].values[1]) == [31.0, 24.0, 25.0, 30.0, 31.0]
+
+    # The values keep the dtype of the responses
+    import erddapClient.erddap_griddap
+    fetchSubset = erddapClient.erddap_griddap.ERDDAP_Griddap._fetchSubset
+    def float32Fetch(self, variables, positionalIndexes, **kwargs):
+        return { varName : values.astype('float32') for varName, values in fetchSubset(self, variables, positionalIndexes, **kwargs).items() }
+    monkeypatch.setattr(erddapClient.erddap_griddap.ERDDAP_Griddap, '_fetchSubset', float32Fetch)
+    subset = remote.getxArray()
+    assert subset['sst'].dtype == np.float32
+    assert list(subset['sst'].values[0]) == [15.0, 8.0, 9.0, 14.0, 15.0]
+    with pytest.raises(Exception):
+        remote.getDataRequestURL()
+    with pytest.raises(Exception):
+        remote.setSubsetI(longitude=[0, 8])
+    with pytest.raises(Exception):
+        remote.setSubsetI(latitude=[True, False])
+
+    # 365 noon steps of an hourly dimension, and the first three months of 30 years
+    assert indexRuns(np.arange(12, 365 * 24, 24), 4e6, 256 * 1024) == [slice(12, 365 * 24 - 11, 24)]
+    months = np.array([ year * 12 + month for year in range(30) for month in (0, 1, 2) ])
+    assert indexRuns(months, 4e6, 256 * 1024) == [slice(0, 349, 12), slice(1, 350, 12), slice(2, 351, 12)]
+    assert indexRuns(np.array([0, 1, 2, 3, 5, 8, 12, 20]), 4, 256 * 1024) == [slice(0, 21)]
+    assert indexRuns(np.array([0, 5, 6, 7]), 4e6, 1) == [slice(0, 1), slice(5, 8)]
+
+
+def test_griddap_variables_per_request(monkeypatch):
+    import numpy as np
+    remote, requestedSubsets = fakeGriddap(monkeypatch, variables=['sst', 'chl', 'sss', 'u', 'v'])
+    remote.setResultVariables(['sst', 'chl', 'sss', 'u', 'v']).setSubset(latitude=slice(11.0, 12.0), longitude=slice(-93.0, -90.0))
+    single = remote.getxArray(transport='nc')
+    assert len(requestedSubsets) == 1
+
+    # A request for each variable, merged in a single dataset
+    split = remote.getxArray(variablesPerRequest=1)
+    assert split.attrs['variable_requests'] == 5 and split.attrs['transport'] == 'dods'
+    assert len(requestedSubsets) == 6
+    assert list(split.data_vars) == ['sst', 'chl', 'sss', 'u', 'v']
+    assert list(split['v'].values[0]) == [406.0, 407.0, 408.0, 409.0]
+    for varName in single.data_vars:
+        np.testing.assert_array_equal(split[varName].values, single[varName].values)
+    assert list(split['longitude'].values) == [-93.0, -92.0, -91.0, -90.0]
+
+    # Groups of variables, the variables not listed are requested alone
+    assert remote._variablesGroups(['sst', 'chl', 'sss', 'u', 'v'], 2) == [['sst', 'chl'], ['sss', 'u'], ['v']]
+    assert remote._variablesGroups(['sst', 'chl', 'sss', 'u', 'v'], [['u', 'v'], ['sst']]) == [['u', 'v'], ['sst'], ['chl'], ['sss']]
+    remote.variablesPerRequest = [['u', 'v']]
+    grouped = remote.getxArray(transport='nc')
+    # The groups are decoded in parallel, not read under the netCDF lock
+    assert grouped.attrs['variable_requests'] == 4 and grouped.attrs['transport'] == 'dods'
+    np.testing.assert_array_equal(grouped['u'].values, single['u'].values)
+
+    # The property is used by the other subsets requests
+    matched = remote.matchup(['sst', 'u', 'v'], latitude=[11.0], longitude=[-92.0])
+    assert [ matched[varName].values[0] for varName in ['sst', 'u', 'v'] ] == [7.0, 307.0, 407.0]
+    assert len(requestedSubsets) == 6 + 4 + 2
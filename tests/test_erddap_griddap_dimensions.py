@@ -43,3 +43,26 @@ def test_griddap_dimensions():
     # Test raise Exception if index its out of bounds
     with pytest.raises(Exception):
         dimNumIndexing = dstDims.subsetI(time=slice(1900), depth=45, latitude=slice(0,385), longitude=slice(0,541))
+
+
+def test_griddap_longitude_dimension():
+    import numpy as np
+    import pandas as pd
+    from erddapClient.erddap_griddap_dimensions import ERDDAP_Griddap_dimensions, ERDDAP_Griddap_dimension
+    lonValues = np.arange(-179.5, 180.0, 1.0)
+    dimensions = ERDDAP_Griddap_dimensions()
+    dimensions['longitude'] = ERDDAP_Griddap_dimension('longitude', pd.Series(np.arange(lonValues.size), index=lonValues),
+                                                       metadata={ 'actual_range' : (-179.5, 179.5) })
+    longitude = dimensions['longitude']
+    assert longitude.isGlobalLongitude
+    # 0 to 360 longitudes are converted, the values in the boundary gap are the closest edge
+    assert longitude.closestIdx(190.5) == longitude.closestIdx(-169.5) == 10
+    assert longitude.closestIdx(179.9) == 359 and longitude.closestIdx(-180.0) == 0
+    assert list(longitude.closestIdxArray([190.5, -179.9, 359.5, np.nan])) == [10, 0, 179, -1]
+
+    assert dimensions.subset(longitude=slice(-9.9, 9.9))['longitude'] == slice(170, 190)
+    assert dimensions.subset(longitude=slice(350.1, 9.9))['longitude'] == slice(170, 190)
+    # Crossing the antimeridian, the stop beyond the dimension size
+    assert dimensions.subset(longitude=slice(170.1, -170.1))['longitude'] == slice(350, 370)
+    assert dimensions.subset(longitude=slice(0.1, 359.9))['longitude'] == slice(180, 540)
+    assert dimensions.subset(longitude=slice(0.2, 360.2))['longitude'] == slice(180, 540)
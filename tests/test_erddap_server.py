@@ -32,3 +32,268 @@ def test_parsestatus():
     remotev202 = ERDDAP_Server('http://erddap-goldcopy.dataexplorer.oceanobservatories.org/erddap') 
     assert remotev202.statusValues != None
     
+
+
+def test_search_results_lazy_datasets():
+    from erddapClient.erddap_server import ERDDAP_SearchResults
+    url = 'https://coastwatch.pfeg.noaa.gov/erddap'
+    searchRows = [ [ url + '/griddap/erdTAgeomday', '', '', '', '', '', '', 'Geostrophic currents', 'summary', '', '', '', '', '', '', 'NOAA', 'erdTAgeomday' ],
+                   [ '', '', url + '/tabledap/cwwcNDBCMet', '', '', '', '', 'NDBC Buoy Data', 'summary', '', '', '', '', '', '', 'NOAA', 'cwwcNDBCMet' ] ]
+    searchResults = ERDDAP_SearchResults(url, searchRows)
+
+    assert len(searchResults) == 2
+    assert all(searchResult._dataset is None for searchResult in searchResults.results)
+    assert searchResults[0].datasetid == 'erdTAgeomday' and type(searchResults[0]).__name__ == 'ERDDAP_Griddap'
+    assert searchResults[1].datasetid == 'cwwcNDBCMet' and type(searchResults[1]).__name__ == 'ERDDAP_Tabledap'
+
+
+def test_status_poller(monkeypatch):
+    import erddapClient.erddap_server
+    from erddapClient.erddap_status import ERDDAP_StatusPoller
+    statusPage = ("<html><body><pre>Current time is 2021-05-07T17:02:34-07:00\n"
+                  "Startup was at  2021-04-28T10:10:50-07:00\n"
+                  "nGridDatasets  = 1368\n"
+                  "nTableDatasets = 353\n"
+                  "nTotalDatasets = 1721\n"
+                  "Response Failed    Time (since startup)                 n =    {failed},  median ~=       18 ms\n"
+                  "Response Succeeded Time (since startup)                 n =  1203362,  median ~=        5 ms\n"
+                  "MemoryInUse=  3551 MB (highWaterMark= 10177 MB) (Xmx ~= 11500 MB)\n"
+                  "\n"
+                  "Response Failed Time Distribution (since startup):\n"
+                  "    n =    {failed},  median ~=       18 ms\n"
+                  "    0 ms:            5385\n"
+                  "    &lt;= 5 ms:           64\n"
+                  "\n"
+                  "</pre></body></html>")
+    failedResponses = iter([30510, 30570])
+
+    class FakeResponse:
+        def __init__(self, text):
+            self.text = text
+    def fakeurlread(url, auth=None, **kwargs):
+        if url.endswith('/version'):
+            return FakeResponse('ERDDAP_version=2.11\n')
+        return FakeResponse(statusPage.replace('{failed}', str(next(failedResponses))))
+    fakeurlread.__wrapped__ = fakeurlread
+    monkeypatch.setattr(erddapClient.erddap_server, 'urlread', fakeurlread)
+
+    url = 'https://coastwatch.pfeg.noaa.gov/erddap'
+    poller = ERDDAP_StatusPoller([url])
+    sample = poller.poll()
+    assert sample[url]['up'] == 1
+    assert sample[url]['ntotaldatasets'] == 1721
+    assert sample[url]['nresponsefailed_time_since_startup'] == 18
+    assert sample[url]['n_response_failed_timedistribution_since_startup'] == 30510
+    poller.poll()
+    assert poller.delta(url, 'nresponsefailed_since_startup') == 60
+    assert poller.rate(url, 'nresponsefailed_since_startup') > 0
+
+    metrics = poller.prometheus()
+    assert '# TYPE erddap_nresponsefailed_since_startup gauge' in metrics
+    assert 'erddap_nresponsefailed_since_startup{server="https://coastwatch.pfeg.noaa.gov/erddap"} 30570' in metrics
+    assert 'erddap_nresponsefailed_since_startup_rate{server="https://coastwatch.pfeg.noaa.gov/erddap"}' in metrics
+    assert 'erddap_up{server="https://coastwatch.pfeg.noaa.gov/erddap"} 1' in metrics
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_iter_search_pages(monkeypatch, ordered):
+    import re
+    import time
+    import threading
+    import requests
+    import erddapClient.erddap_server
+    url = 'https://coastwatch.pfeg.noaa.gov/erddap'
+    def searchRow(datasetid):
+        return [ url + '/griddap/' + datasetid, '', '', '', '', '', '', datasetid, 'summary', '', '', '', '', '', '', 'NOAA', datasetid ]
+    # Two full pages, a short page and the "no matching results" pages, dsB is in two pages
+    pages = { 1 : ['dsA', 'dsB', 'dsC'], 2 : ['dsD', 'dsB', 'dsE'], 3 : ['dsF', 'dsG'] }
+    requestedPages = []
+    lock = threading.Lock()
+
+    class FakeResponse:
+        def __init__(self, rows):
+            self.rows = rows
+        def json(self):
+            return { 'table' : { 'rows' : self.rows } }
+    def fakeurlread(url, auth=None, **kwargs):
+        page = int(re.search(r'[?&]page=(\d+)', url).group(1))
+        with lock:
+            requestedPages.append(page)
+        if page == 2:
+            # The third page arrives first
+            time.sleep(0.2)
+        if page not in pages:
+            response = requests.Response()
+            response.status_code = 404
+            raise requests.exceptions.HTTPError(response=response)
+        return FakeResponse([ searchRow(datasetid) for datasetid in pages[page] ])
+    monkeypatch.setattr(erddapClient.erddap_server, 'urlread', fakeurlread)
+
+    remote = ERDDAP_Server(url)
+    datasetids = [ result.datasetid for result in remote.iterSearch(workers=2, ordered=ordered, searchFor='sst', itemsPerPage=3) ]
+    if ordered:
+        assert datasetids == ['dsA', 'dsB', 'dsC', 'dsD', 'dsE', 'dsF', 'dsG']
+    else:
+        assert datasetids == ['dsA', 'dsB', 'dsC', 'dsF', 'dsG', 'dsD', 'dsE']
+    # No pages are requested after the short page arrives
+    assert requestedPages[0] == 1 and sorted(requestedPages) == ([1, 2, 3, 4] if ordered else [1, 2, 3])
+
+    requestedPages.clear()
+    pages = { 1 : ['dsA', 'dsB', 'dsC'] }
+    datasetids = [ result.datasetid for result in remote.iterAdvancedSearch(workers=2, ordered=ordered, searchFor='sst', itemsPerPage=3) ]
+    assert datasetids == ['dsA', 'dsB', 'dsC']
+    assert sorted(requestedPages) == [1, 2, 3]
+
+
+def test_local_catalog(monkeypatch):
+    import erddapClient.erddap_catalog
+    from erddapClient import ERDDAP_LocalCatalog
+    url = 'https://coastwatch.pfeg.noaa.gov/erddap'
+    allDatasets = ("datasetID,institution,title,summary,minLongitude (degrees_east),maxLongitude (degrees_east),minLatitude (degrees_north),maxLatitude (degrees_north),"
+                   "minAltitude (m),maxAltitude (m),minTime (UTC),maxTime (UTC),griddap,tabledap\n"
+                   "allDatasets,NOAA,* The List of All Active Datasets in this ERDDAP *,summary,,,,,,,,,,{url}/tabledap/allDatasets\n"
+                   "sstPacific,NOAA,Sea Surface Temperature Pacific,Daily sea surface temperature,120,250,-30,30,,,2000-01-01T00:00:00Z,2010-01-01T00:00:00Z,{url}/griddap/sstPacific,\n"
+                   "sstGulf,NOAA,Sea surface temperature Gulf of Mexico,Monthly composite,-98,-80,18,31,,,2015-01-01T00:00:00Z,2020-01-01T00:00:00Z,{url}/griddap/sstGulf,\n"
+                   "buoysHawaii,NDBC,NDBC Buoys,Standard meteorological data,-170,-150,15,25,0,10,2005-01-01T00:00:00Z,2021-01-01T00:00:00Z,,{url}/tabledap/buoysHawaii\n"
+                   "chlorophyll,NASA,Chlorophyll-a concentration,Fiji,175,179,-20,-15,,,,,{url}/griddap/chlorophyll,\n").format(url=url)
+    responses = []
+    requestsValidators = []
+    class FakeResponse:
+        def __init__(self, text, headers={}):
+            self.text = text
+            self.content = text.encode('utf-8')
+            self.headers = headers
+    def fakeurlreadIfModified(url, validators={}, auth=None, **kwargs):
+        requestsValidators.append(dict(validators))
+        return responses.pop(0)
+    monkeypatch.setattr(erddapClient.erddap_catalog, 'urlreadIfModified', fakeurlreadIfModified)
+
+    responses.append(FakeResponse(allDatasets, { 'ETag' : '"v1"' }))
+    catalog = ERDDAP_LocalCatalog(ERDDAP_Server(url))
+    assert len(catalog) == 4
+
+    # Text search, prefixes, phrases and exclusions
+    assert catalog.datasetIDs('sea') == ['sstPacific', 'sstGulf']
+    assert catalog.datasetIDs('temp SEA') == ['sstPacific', 'sstGulf']
+    assert catalog.datasetIDs('"temperature gulf"') == ['sstGulf']
+    assert catalog.datasetIDs('sea -gulf') == ['sstPacific']
+    assert catalog.datasetIDs('sea -"temperature pacific"') == ['sstGulf']
+    assert catalog.datasetIDs('protocol=tabledap') == ['buoysHawaii']
+    assert catalog.datasetIDs(institution='NOAA') == ['sstPacific', 'sstGulf']
+    assert catalog.datasetIDs('datasetID=sst') == ['sstPacific', 'sstGulf']
+    assert catalog.datasetIDs('chloro', protocol='griddap') == ['chlorophyll']
+
+    # Ranges, the datasets without range values don't match
+    assert catalog.datasetIDs(minTime='2012-01-01') == ['sstGulf', 'buoysHawaii']
+    assert catalog.datasetIDs(minTime=dt.datetime(2001,1,1), maxTime='2004-12-31T00:00:00Z') == ['sstPacific']
+    assert catalog.datasetIDs(maxLat=-16) == ['sstPacific', 'chlorophyll']
+    assert catalog.datasetIDs(minLat=20, maxLat=25) == ['sstPacific', 'sstGulf', 'buoysHawaii']
+    assert catalog.datasetIDs(minAltitude=5) == ['buoysHawaii']
+
+    # Longitude ranges in both conventions, and crossing the antimeridian
+    assert catalog.datasetIDs(minLon=-100, maxLon=-90) == ['sstGulf']
+    assert catalog.datasetIDs(minLon=200, maxLon=205) == ['sstPacific', 'buoysHawaii']
+    assert catalog.datasetIDs(minLon=-145, maxLon=-140) == ['sstPacific']
+    assert catalog.datasetIDs(minLon=178, maxLon=-175) == ['sstPacific', 'chlorophyll']
+    assert catalog.datasetIDs(minLon=300, maxLon=10) == []
+    assert catalog.datasetIDs(minLon=100, maxLon=-168) == ['sstPacific', 'buoysHawaii', 'chlorophyll']
+
+    searchResults = catalog.search('buoys')
+    assert len(searchResults) == 1 and searchResults[0].datasetid == 'buoysHawaii'
+
+    # Not modified (304), same content, and a changed catalog
+    responses.append(None)
+    assert catalog.refresh() is False
+    assert requestsValidators[-1] == { 'ETag' : '"v1"' }
+    responses.append(FakeResponse(allDatasets, { 'ETag' : '"v2"' }))
+    assert catalog.refresh() is False
+    responses.append(FakeResponse('\n'.join(allDatasets.splitlines()[:-1]) + '\n', { 'ETag' : '"v3"' }))
+    assert requestsValidators[-1] == { 'ETag' : '"v1"' }
+    assert catalog.refresh() is True
+    assert requestsValidators[-1] == { 'ETag' : '"v2"' }
+    assert len(catalog) == 3
+    assert catalog.datasetIDs(minLon=178, maxLon=-175) == ['sstPacific']
+
+
+def test_federation_timeouts(monkeypatch):
+    import time
+    import threading
+    import requests
+    import erddapClient.erddap_server
+    from erddapClient import ERDDAP_Federation
+    from erddapClient.erddap_server import ERDDAP_SearchResults
+    def searchRows(url, datasetids):
+        return [ [ url + '/griddap/' + datasetid, '', '', '', '', '', '', datasetid, 'summary', '', '', '', '', '', '', 'NOAA', datasetid ] for datasetid in datasetids ]
+
+    # The requests of a real server object get the timeout
+    requestsKwargs = []
+    class FakeResponse:
+        def __init__(self, rows):
+            self.rows = rows
+        def json(self):
+            return { 'table' : { 'rows' : self.rows } }
+    def fakeurlread(url, auth=None, **kwargs):
+        requestsKwargs.append(kwargs)
+        return FakeResponse(searchRows('https://erddap.example.org/erddap', ['dsA', 'dsB']))
+    monkeypatch.setattr(erddapClient.erddap_server, 'urlread', fakeurlread)
+
+    release = threading.Event()
+    class HangingServer(ERDDAP_Server):
+        def search(self, request_kwargs={}, **filters):
+            # Ignores the request timeout
+            release.wait(10)
+            return ERDDAP_SearchResults(self.serverURL, searchRows(self.serverURL, ['dsH']))
+    class SlowServer(ERDDAP_Server):
+        def search(self, request_kwargs={}, **filters):
+            time.sleep(request_kwargs['timeout'] / 2)
+            raise requests.exceptions.ReadTimeout("Read timed out")
+    class FailingServer(ERDDAP_Server):
+        def search(self, request_kwargs={}, **filters):
+            raise ValueError("Unexpected response")
+    class EmptyServer(ERDDAP_Server):
+        def search(self, request_kwargs={}, **filters):
+            response = requests.Response()
+            response.status_code = 404
+            raise requests.exceptions.HTTPError(response=response)
+
+    federation = ERDDAP_Federation([ HangingServer('https://hanging.example.org/erddap'),
+                                     SlowServer('https://slow.example.org/erddap'),
+                                     FailingServer('https://failing.example.org/erddap'),
+                                     EmptyServer('https://empty.example.org/erddap'),
+                                     'https://erddap.example.org/erddap' ], timeout=0.5)
+    try:
+        startTime = time.time()
+        searchResults = federation.search(searchFor='sst')
+        assert time.time() - startTime < 2
+    finally:
+        release.set()
+    assert requestsKwargs == [ { 'timeout' : 0.5 } ]
+    assert [ searchResult.datasetid for searchResult in searchResults ] == ['dsA', 'dsB']
+    assert sorted(federation.lastTimeouts) == ['https://hanging.example.org/erddap', 'https://slow.example.org/erddap']
+    assert list(federation.lastErrors) == ['https://failing.example.org/erddap', 'https://slow.example.org/erddap', 'https://hanging.example.org/erddap']
+    assert isinstance(federation.lastErrors['https://failing.example.org/erddap'], ValueError)
+    assert 'hanging.example.org' in str(federation.lastErrors['https://hanging.example.org/erddap'])
+
+
+def test_federation_merge_ranked():
+    from erddapClient import ERDDAP_Federation
+    from erddapClient.erddap_server import ERDDAP_SearchResults
+    serversRanks = { 'https://first.example.org/erddap' : ['dsA', 'dsB', 'dsC'],
+                     'https://second.example.org/erddap' : ['dsC', 'dsD'] }
+    class FakeServer(ERDDAP_Server):
+        def search(self, request_kwargs={}, **filters):
+            return ERDDAP_SearchResults(self.serverURL, [ [ self.serverURL + '/griddap/' + datasetid, '', '', '', '', '', '', datasetid, 'summary',
+                                                            '', '', '', '', '', '', 'NOAA', datasetid ] for datasetid in serversRanks[self.serverURL] ])
+
+    # dsC is the first result of the second server, but it's taken from the first one, at its rank there
+    federation = ERDDAP_Federation([ FakeServer(url) for url in serversRanks ])
+    searchResults = federation.search(searchFor='sst')
+    assert [ (searchResult.datasetid, searchResult.url) for searchResult in searchResults ] == \
+           [ ('dsA', 'https://first.example.org/erddap'), ('dsB', 'https://first.example.org/erddap'),
+             ('dsD', 'https://second.example.org/erddap'), ('dsC', 'https://first.example.org/erddap') ]
+    assert federation.lastMirrors == { 'dsC' : ['https://first.example.org/erddap', 'https://second.example.org/erddap'] }
+
+    # The servers order decides
+    federation = ERDDAP_Federation([ FakeServer(url) for url in reversed(list(serversRanks)) ])
+    assert [ searchResult.datasetid for searchResult in federation.search(searchFor='sst') ] == ['dsC', 'dsA', 'dsD', 'dsB']
+    assert federation.lastMirrors == { 'dsC' : ['https://second.example.org/erddap', 'https://first.example.org/erddap'] }
@@ -0,0 +1,41 @@
+import subprocess
+import sys
+
+HEAVY_MODULES = ['pandas', 'numpy', 'xarray', 'netCDF4', 'requests', 'dateutil.parser']
+
+
+def runPython(code):
+    return subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, check=True).stdout.split()
+
+
+def test_import_without_heavy_modules():
+    # Importing the package, building search and data request urls, don't import the heavy modules
+    loadedModules = runPython(
+        "import sys, time\n"
+        "startModules = set(sys.modules)\n"
+        "startTime = time.perf_counter()\n"
+        "from erddapClient import ERDDAP_Server, ERDDAP_Tabledap, ERDDAP_Griddap\n"
+        "importTime = time.perf_counter() - startTime\n"
+        "packages = [ m for m in set(sys.modules) - startModules if not m.startswith('erddapClient') and\n"
+        "             'site-packages' in (getattr(sys.modules[m], '__file__', None) or '') ]\n"
+        "ERDDAP_Server('https://coastwatch.pfeg.noaa.gov/erddap').getSearchURL(searchFor='sst')\n"
+        "remote = ERDDAP_Tabledap('https://coastwatch.pfeg.noaa.gov/erddap', 'cwwcNDBCMet')\n"
+        "remote.setResultVariables(['station', 'time', 'wtmp']).addConstraint('time>=max(time)-1day').query('wtmp > 20').getURL()\n"
+        "print(importTime, len(packages))\n"
+        "print(' '.join(m for m in {} if m in sys.modules))\n".format(HEAVY_MODULES))
+    importTime, importedPackages, loadedModules = float(loadedModules[0]), int(loadedModules[1]), loadedModules[2:]
+    assert loadedModules == []
+    # Only standard library modules are imported with the package
+    assert importedPackages == 0
+    assert importTime < 0.2
+
+
+def test_lazy_modules_import_on_use():
+    loadedModules = runPython(
+        "import sys\n"
+        "from erddapClient.parse_utils import iso8601STRtoNum\n"
+        "iso8601STRtoNum('2021-01-01T00:00:00Z')\n"
+        "print(' '.join(m for m in {} if m in sys.modules))\n".format(HEAVY_MODULES))
+    assert 'netCDF4' in loadedModules
+    assert 'dateutil.parser' in loadedModules
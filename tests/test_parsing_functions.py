@@ -1,5 +1,5 @@
 import pytest
-from erddapClient.parse_utils import parseDictMetadata, parseConstraintValue, validate_iso8601, validate_constraint_time_operations, validate_constraint_var_operations
+from erddapClient.parse_utils import parseDictMetadata, parseConstraintValue, validate_iso8601, validate_constraint_time_operations, validate_constraint_var_operations, parseQueryExpression, parseISO8601Duration, timeIntervalString
 
 
 def test_valid_iso8601dates():
@@ -41,3 +41,73 @@ def test_extended_var_constraint_functionality():
         print (testC)
         assert not validate_constraint_var_operations(testC) 
 
+
+
+def test_query_expression_pushdown():
+    constraints, localPredicates = parseQueryExpression("sst > 20 and time >= '2020-01-01' and station in ['A','B'] and 30 >= sst")
+    assert constraints == [{'sst>' : 20}, {'time>=' : '2020-01-01'}, {'station=~' : '(A|B)'}, {'sst<=' : 30}]
+    assert localPredicates == []
+
+    constraints, localPredicates = parseQueryExpression("sst > limit and (atmp > 25 or wspd > 10) and station not in ['A']", {'limit' : 15.5})
+    assert constraints == [{'sst>' : 15.5}]
+    assert localPredicates == ['atmp > 25 or wspd > 10', "station not in ['A']"]
+
+
+def test_query_expression_without_source_segments(monkeypatch):
+    import ast
+    # Python < 3.8
+    monkeypatch.delattr(ast, 'get_source_segment', raising=False)
+    constraints, localPredicates = parseQueryExpression("sst > limit and (atmp > 25 or\n wspd > 10) and station not in ['A', 'and']", {'limit' : 15.5})
+    assert constraints == [{'sst>' : 15.5}]
+    assert localPredicates == ['(atmp > 25 or\n wspd > 10)', "station not in ['A', 'and']"]
+    assert parseQueryExpression("atmp > 25 or wspd > 10")[1] == ['atmp > 25 or wspd > 10']
+
+
+def test_time_intervals():
+    assert parseISO8601Duration('PT1H') == 3600
+    assert parseISO8601Duration('P1DT30M') == 88200
+    assert parseISO8601Duration('1 hour') is None
+
+    assert timeIntervalString(3600) == '1hour'
+    assert timeIntervalString(5400) == '2hours'
+    assert timeIntervalString(600) == '10minutes'
+    assert timeIntervalString(3 * 86400) == '3days'
+
+def test_parse_dict_metadata():
+    rawMetadata = { 'table' : { 'columnNames' : ['Row Type', 'Variable Name', 'Attribute Name', 'Data Type', 'Value'],
+                                'rows' : [ ['attribute', 'NC_GLOBAL', 'title', 'String', 'Test dataset'],
+                                           ['attribute', 'NC_GLOBAL', 'Westernmost_Easting', 'double', '-98.0'],
+                                           ['dimension', 'depth', '', 'float', 'nValues=3, evenlySpaced=false'],
+                                           ['attribute', 'depth', 'actual_range', 'float', '0.0, 10.0'],
+                                           ['variable', 'temperature', '', 'float', 'depth'],
+                                           ['attribute', 'temperature', '_FillValue', 'short', '-32767'],
+                                           ['attribute', 'temperature', 'units', 'String', 'degC'] ] } }
+    metadata = parseDictMetadata(rawMetadata)
+    assert metadata['global'] == { 'title' : 'Test dataset', 'Westernmost_Easting' : -98.0 }
+    assert metadata['dimensions']['depth']['actual_range'] == (0.0, 10.0)
+    assert metadata['variables']['temperature'] == { '_dataType' : 'float', '_FillValue' : -32767, 'units' : 'degC' }
+
+
+def test_decode_dods():
+    import struct
+    import numpy as np
+    from erddapClient.dap_utils import parseDDS, decodeDods
+    dds = ("Dataset {\n  GRID {\n    ARRAY:\n      Int16 sst[time = 2][latitude = 3];\n    MAPS:\n"
+           "      Float64 time[time = 2];\n      Float32 latitude[latitude = 3];\n  } sst;\n"
+           "  Byte flag[flag = 3];\n  Float64 depth[depth = 1];\n} test;\n")
+    assert parseDDS(dds) == [ ('Int16', 'sst', (2, 3)), ('Float64', 'time', (2,)), ('Float32', 'latitude', (3,)),
+                              ('Byte', 'flag', (3,)), ('Float64', 'depth', (1,)) ]
+    content = dds.encode('utf-8') + b'\nData:\n' + \
+              struct.pack('>II6i', 6, 6, 1, -2, 3, 4, 5, -32767) + \
+              struct.pack('>II2d', 2, 2, 0.0, 86400.0) + \
+              struct.pack('>II3f', 3, 3, 10.0, 10.5, 11.0) + \
+              struct.pack('>II3Bx', 3, 3, 1, 2, 255) + \
+              struct.pack('>IId', 1, 1, 5.0)
+    arrays = decodeDods(content)
+    assert [ name for name, _ in arrays ] == ['sst', 'time', 'latitude', 'flag', 'depth']
+    assert arrays[0][1].dtype == np.int16 and arrays[0][1].tolist() == [[1, -2, 3], [4, 5, -32767]]
+    assert arrays[2][1].tolist() == [10.0, 10.5, 11.0]
+    assert arrays[3][1].tolist() == [1, 2, 255]
+    assert arrays[4][1].tolist() == [5.0]
+    with pytest.raises(Exception):
+        decodeDods(b'Error {\n    code=404;\n    message="Not Found";\n}\n')